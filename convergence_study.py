@@ -0,0 +1,234 @@
+import os
+import sys
+import numpy as np
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from run import load_config, build_simulator
+from utils.build_utils import parse_value, parse_test_function
+from utils.data_utils import write_json, get_color_map
+from utils.sim_utils import timer
+
+
+def coupled_bm_increments(seed, batch_index, shape, discretisation_interval, refinement_factor=1):
+    """
+    Draw Brownian increments on the finest time grid for one batch of paths and sum them onto a nested coarser grid.
+    Every level regenerates the same finest increments from (seed, batch_index) so that all levels are driven by the
+    same Brownian paths without having to share arrays between processes.
+
+    Parameters
+    ----------
+    seed : int
+        Seed shared by all levels.
+    batch_index : int
+        Index of the batch of paths.
+    shape : tuple
+        Shape (dim, paths, steps) of the finest increments.
+    discretisation_interval : float
+        Finest time step size.
+    refinement_factor : int
+        Number of finest steps per coarse step.
+    """
+    rng = np.random.default_rng([seed, batch_index])
+    bm_increments = rng.normal(0, np.sqrt(discretisation_interval), shape)
+    if refinement_factor == 1:
+        return bm_increments
+    dim, paths, steps = shape
+    return bm_increments.reshape(dim, paths, steps // refinement_factor, refinement_factor).sum(axis=-1)
+
+
+def simulate_level(config_path, simulator_name, discretisation_parameter, finest_discretisation_parameter, seed,
+                   time_values, component_index, batch_size):
+    """
+    Simulate one level of a convergence study and return one state component at the evaluation times. If
+    simulator_name is 'exact' the exact solution of the model is evaluated on the finest Brownian paths instead.
+
+    Parameters
+    ----------
+    config_path : str
+        Path to config file.
+    simulator_name : str
+        Simulator class name or 'exact'.
+    discretisation_parameter : int
+        Number of time points of this level.
+    finest_discretisation_parameter : int
+        Number of time points of the finest level.
+    seed : int
+        Seed shared by all levels.
+    time_values : np.ndarray
+        Evaluation times. Must lie on the coarsest time grid.
+    component_index : int
+        Index of the state component to return.
+    batch_size : int
+        Number of paths simulated at once.
+    """
+    exact = simulator_name == 'exact'
+    config = load_config(config_path)
+    simulator = build_simulator(config, simulator_name=None if exact else simulator_name,
+                                discretisation_parameter=discretisation_parameter, verbose=False)
+    final_time = simulator.final_time
+    finest_steps = finest_discretisation_parameter - 1
+    steps = discretisation_parameter - 1
+    time_indices = np.rint(np.asarray(time_values) / final_time * steps).astype(int)
+    samples = np.empty((len(time_values), simulator.number_of_paths))
+    for batch_index, start in enumerate(range(0, simulator.number_of_paths, batch_size)):
+        paths = min(batch_size, simulator.number_of_paths - start)
+        bm_increments = coupled_bm_increments(seed=seed, batch_index=batch_index,
+                                              shape=(simulator.dim, paths, finest_steps),
+                                              discretisation_interval=final_time / finest_steps,
+                                              refinement_factor=finest_steps // steps)
+        if exact:
+            brownian_motion = np.concatenate([np.zeros((simulator.dim, paths, 1)),
+                                              np.cumsum(bm_increments, axis=-1)], axis=-1)
+            states = simulator.model.exact_solution(initial_value=simulator.initial_value, time_values=time_values,
+                                                    brownian_motion=brownian_motion[..., time_indices])
+        else:
+            path_samples = np.zeros((simulator.dim, paths, discretisation_parameter))
+            path_samples[:, :, 0] = simulator.initial_value[:, None]
+            simulator.sim_paths(path_samples=path_samples, discretisation_interval=final_time / steps,
+                                bm_increments=bm_increments)
+            np.clip(path_samples, a_min=0, a_max=None, out=path_samples)  # Ensure non-negativity
+            states = path_samples[..., time_indices]
+        samples[:, start:start + paths] = states[component_index].T
+    return samples
+
+
+@timer
+def convergence_study(config_path):
+    """
+    Run a weak and strong convergence study. Each simulator in the [convergence] section of the config is run over a
+    ladder of nested discretisation parameters on shared Brownian paths. Errors are computed against the exact
+    solution where the model provides one and against the finest level otherwise, and convergence orders are fitted
+    by least squares in log-log space. Levels are simulated in parallel.
+
+    Parameters
+    ----------
+    config_path : str
+        Path to config file.
+    """
+    config = load_config(config_path)
+    directory = config.get("output", "output_directory")
+    os.makedirs(directory, exist_ok=True)
+    study_params = {key: parse_value(config.get("convergence", key)) for key in config.options("convergence")}
+    simulator_names = study_params.get('simulator_names', [config.get("run", "simulator_name")])
+    if isinstance(simulator_names, str):
+        simulator_names = [simulator_names]
+    discretisation_parameters = sorted(study_params['discretisation_parameters'])
+    finest_discretisation_parameter = discretisation_parameters[-1]
+    for discretisation_parameter in discretisation_parameters:
+        if (finest_discretisation_parameter - 1) % (discretisation_parameter - 1) != 0:
+            raise ValueError('Time grids must be nested i.e. discretisation_parameter - 1 must divide that of the '
+                             f'finest level. Provided: {discretisation_parameters}')
+    simulator = build_simulator(config, discretisation_parameter=finest_discretisation_parameter, verbose=False)
+    final_time = simulator.final_time
+    time_values = np.atleast_1d(np.asarray(study_params.get('time_values', final_time), dtype=float))
+    coarsest_steps = discretisation_parameters[0] - 1
+    if not np.allclose(np.rint(time_values / final_time * coarsest_steps) / coarsest_steps * final_time, time_values):
+        raise ValueError(f'Evaluation times must lie on the coarsest time grid. Provided: {time_values}')
+    test_function_expression = str(study_params.get('test_function', 'x'))
+    test_function = parse_test_function(test_function_expression)
+    component = study_params.get('component', str(simulator.state[0]))
+    component_index = list(simulator.state).index(component)
+    seed = simulator.seed if simulator.seed is not None else int(np.random.SeedSequence().entropy % 2 ** 63)
+    batch_size = study_params.get('batch_size', 1000)
+    has_exact_solution = hasattr(simulator.model, 'exact_solution')
+    # Simulate all levels in parallel
+    tasks = [(simulator_name, discretisation_parameter) for simulator_name in simulator_names
+             for discretisation_parameter in discretisation_parameters]
+    if has_exact_solution:
+        tasks.append(('exact', finest_discretisation_parameter))
+    print(f"Initiating convergence study of {simulator.model_name} model for {', '.join(simulator_names)} with "
+          f"{simulator.number_of_paths} paths and discretisation parameters {discretisation_parameters}.")
+    with ProcessPoolExecutor(max_workers=study_params.get('number_of_workers')) as executor:
+        futures = {task: executor.submit(simulate_level, config_path, task[0], task[1],
+                                         finest_discretisation_parameter, seed, time_values, component_index,
+                                         batch_size) for task in tasks}
+        samples = {task: future.result() for task, future in futures.items()}
+    # Compute errors and fit convergence orders
+    results = {}
+    for simulator_name in simulator_names:
+        if has_exact_solution:
+            reference = samples[('exact', finest_discretisation_parameter)]
+            levels = discretisation_parameters
+        else:
+            reference = samples[(simulator_name, finest_discretisation_parameter)]
+            levels = discretisation_parameters[:-1]
+        step_sizes = np.array([final_time / (level - 1) for level in levels])
+        test_function_reference = test_function(reference)
+        weak_errors, weak_standard_errors, strong_errors = [], [], []
+        for level in levels:
+            level_samples = samples[(simulator_name, level)]
+            test_function_difference = test_function(level_samples) - test_function_reference
+            weak_errors.append(np.abs(np.mean(test_function_difference, axis=1)))
+            weak_standard_errors.append(np.std(test_function_difference, axis=1) / np.sqrt(level_samples.shape[1]))
+            strong_errors.append(np.mean(np.abs(level_samples - reference), axis=1))
+        weak_errors, weak_standard_errors, strong_errors = (np.array(weak_errors).T, np.array(weak_standard_errors).T,
+                                                            np.array(strong_errors).T)
+        weak_orders = [np.polyfit(np.log(step_sizes), np.log(errors), 1)[0] if len(levels) > 1 else np.nan
+                       for errors in weak_errors]
+        strong_orders = [np.polyfit(np.log(step_sizes), np.log(errors), 1)[0] if len(levels) > 1 else np.nan
+                         for errors in strong_errors]
+        results[simulator_name] = {'discretisation_parameters': list(levels), 'step_sizes': step_sizes.tolist(),
+                                   'weak_errors': weak_errors.tolist(),
+                                   'weak_error_standard_errors': weak_standard_errors.tolist(),
+                                   'strong_errors': strong_errors.tolist(), 'weak_orders': weak_orders,
+                                   'strong_orders': strong_orders}
+        for time_value, weak_order, strong_order in zip(time_values, weak_orders, strong_orders):
+            print(f'{simulator_name} (t={time_value:.2g}): weak order {weak_order:.2f}, '
+                  f'strong order {strong_order:.2f}')
+    # Write outputs
+    convergence = {'model_name': simulator.model_name, 'model_params': simulator.model_params,
+                   'reference': 'exact' if has_exact_solution else 'finest_level',
+                   'test_function': test_function_expression, 'component': component,
+                   'time_values': time_values.tolist(), 'number_of_paths': simulator.number_of_paths, 'seed': seed,
+                   'results': results}
+    write_json(directory=directory, convergence=convergence)
+    plot_convergence(directory=directory, convergence=convergence)
+
+    return convergence
+
+
+def plot_convergence(directory, convergence, figsize=(14, 6)):
+    """
+    Plot weak and strong errors against step size at the last evaluation time.
+
+    Parameters
+    ----------
+    directory : str
+        Output directory to write to.
+    convergence : dict
+        Convergence study results.
+    figsize : tuple
+        Size of figure to be plotted.
+    """
+    results = convergence['results']
+    fig, ax = plt.subplots(1, 2, figsize=figsize)
+    colors = get_color_map(len(results))[0]
+    for index, (simulator_name, result) in enumerate(results.items()):
+        step_sizes = result['step_sizes']
+        ax[0].errorbar(step_sizes, result['weak_errors'][-1], yerr=result['weak_error_standard_errors'][-1],
+                       color=colors[index], marker='o', capsize=3,
+                       label=f'{simulator_name} (order {result["weak_orders"][-1]:.2f})')
+        ax[1].plot(step_sizes, result['strong_errors'][-1], color=colors[index], marker='o',
+                   label=f'{simulator_name} (order {result["strong_orders"][-1]:.2f})')
+    for axis, error_type in zip(ax, ['Weak', 'Strong']):
+        axis.set_xscale('log')
+        axis.set_yscale('log')
+        axis.set_xlabel('Step size')
+        axis.set_ylabel(f'{error_type} error')
+        axis.set_title(f'{error_type} convergence: {convergence["model_name"]}, '
+                       f'Time={convergence["time_values"][-1]:.2g}')
+        axis.grid(True, which='both', alpha=0.6)
+        axis.legend()
+    output_file = os.path.join(directory, "convergence.png")
+    plt.savefig(output_file, dpi=400)
+    print(f"{output_file} saved.")
+
+    plt.close()
+
+    return fig, ax
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise ValueError("Usage: python convergence_study.py <config_path>")
+    convergence_study(config_path=sys.argv[1])
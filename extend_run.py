@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import numpy as np
+from run import load_config, build_simulator
+from payoffs.payoff_engine import PayoffEngine
+from utils.analysis_utils import get_analysis_steps, run_analysis
+from utils.build_utils import parse_value
+from utils.cache_utils import NON_RESULT_PARAMS
+from utils.data_utils import read_json, write_json, write_npy, read_samples, open_sample_columns
+from utils.sim_utils import timer
+
+# Parameters changed by extending a run
+EXTENSION_PARAMS = ['number_of_paths', 'final_time', 'discretisation_parameter', 'chunk_size', 'rng_state',
+                    'extensions']
+
+
+def read_run_params(simulator, directory):
+    """
+    Read the params.json of the completed run in directory and check that it can be extended with simulator, i.e.
+    that it was simulated with the same configuration up to the number of paths and horizon, is complete and recorded
+    the state of its random number generator.
+
+    Parameters
+    ----------
+    simulator : Simulator
+        Simulator built from the config of the run.
+    directory : str
+        Output directory of the run.
+    """
+    params = read_json(os.path.join(directory, 'params.json'))
+    if not params:
+        raise FileNotFoundError(f"No simulation found in '{directory}'.")
+    if os.path.exists(os.path.join(directory, 'checkpoint.json')):
+        raise ValueError(f"Run in '{directory}' is incomplete. Complete it with run.py --resume before extending.")
+    if 'shard_index' in params or 'shard_count' in params:
+        raise ValueError(f"'{directory}' is a sharded run. Shards cannot be extended.")
+    if simulator.number_of_scenarios is not None:
+        raise ValueError('Scenario runs cannot be extended.')
+    if 'rng_state' not in params:
+        raise ValueError(f"Run in '{directory}' did not record its random number generator state, e.g. as it was "
+                         f"extracted from a cached run, and cannot be extended. Rerun with run.py.")
+    ignored_params = NON_RESULT_PARAMS + EXTENSION_PARAMS
+    config_params = json.loads(json.dumps({key: value for key, value in simulator.get_params().items()
+                                           if key not in ignored_params}, default=str))
+    run_params = json.loads(json.dumps({key: value for key, value in params.items() if key not in ignored_params},
+                                       default=str))
+    if config_params != run_params:
+        raise ValueError(f"Run in '{directory}' was simulated with a different configuration. Restore the original "
+                         f"config_file to extend it.")
+    return params
+
+
+def get_manifest_part(directory, params):
+    """
+    Manifest part holding the current samples of a run: its manifest without the summary entries, or the samples
+    written to directory itself.
+
+    Parameters
+    ----------
+    directory : str
+        Output directory of the run.
+    params : dict
+        Parameters of the run.
+    """
+    manifest = read_json(os.path.join(directory, 'manifest.json'))
+    if not manifest:
+        return {'directory': '.', 'number_of_paths': params['number_of_paths']}
+    return {key: value for key, value in manifest.items() if key in ['axis', 'parts', 'number_of_paths']}
+
+
+def get_part_directory(directory):
+    """
+    Create the first unused extension_<k> subdirectory of directory, so that leftovers of an overwritten run are never
+    read as part of the extension. Returns its name and path.
+
+    Parameters
+    ----------
+    directory : str
+        Output directory of the run.
+    """
+    part_index = 1
+    while os.path.exists(os.path.join(directory, f'extension_{part_index}')):
+        part_index += 1
+    part = f'extension_{part_index}'
+    os.makedirs(os.path.join(directory, part))
+    return part, os.path.join(directory, part)
+
+
+@timer
+def extend_paths(config_path, number_of_paths):
+    """
+    Append number_of_paths new independent paths to the completed run in the output directory of the config. The
+    paths are simulated to the current horizon of the run by continuing its random number generator stream from the
+    state recorded after its last path, and written to a new extension_<k> subdirectory. Existing samples are left in
+    place: manifest.json lists them and the new paths as one dataset, payoff sums are merged exactly and params.json
+    records the new number of paths and generator state.
+
+    Parameters
+    ----------
+    config_path : str
+        Path to config file of the run.
+    number_of_paths : int
+        Number of paths to append.
+    """
+    config = load_config(config_path)
+    directory = config.get("output", "output_directory")
+    params = read_json(os.path.join(directory, 'params.json'))
+    horizon = {key: params[key] for key in ['final_time', 'discretisation_parameter'] if key in params}
+    simulator = build_simulator(config, number_of_paths=number_of_paths, **horizon)
+    params = read_run_params(simulator=simulator, directory=directory)
+    simulator.load_leverage(directory)  # New paths use the leverage function calibrated by the run
+    extensions = params.get('extensions', [])
+    part, part_directory = get_part_directory(directory)
+    simulator.rng.bit_generator.state = params['rng_state']
+    print(f"Extending {simulator.simulator_name} simulation of {simulator.model_name} model in {directory} with "
+          f"{number_of_paths} paths.")
+    simulator.sim(directory=part_directory)
+    total_number_of_paths = params['number_of_paths'] + number_of_paths
+    if simulator.store_samples and simulator.write_samples:
+        write_json(directory=directory, manifest={
+            'number_of_paths': total_number_of_paths, 'output_state': simulator.output_state, 'axis': 'paths',
+            'parts': [get_manifest_part(directory=directory, params=params),
+                      {'directory': part, 'number_of_paths': number_of_paths}]})
+    if simulator.payoff_engine is not None:
+        payoffs = PayoffEngine.merge_results([read_json(os.path.join(directory, 'payoffs.json')),
+                                              read_json(os.path.join(part_directory, 'payoffs.json'))])
+        for label, result in payoffs.items():
+            print(f'{label} ({result["payoff_name"]}) price: {result["price"]:.4f} +- {result["standard_error"]:.4f}')
+        write_json(directory=directory, payoffs=payoffs)
+    part_params = read_json(os.path.join(part_directory, 'params.json'))
+    write_json(directory=directory, params=params | {
+        'number_of_paths': total_number_of_paths, 'rng_state': part_params['rng_state'],
+        'extensions': extensions + [{'directory': part, 'number_of_paths': number_of_paths}]})
+    print(f"{directory} extended to {total_number_of_paths} paths.")
+    return directory
+
+
+@timer
+def extend_horizon(config_path, final_time):
+    """
+    Continue every path of the completed run in the output directory of the config from its stored final state to
+    the later horizon final_time, on the time grid of the run, by continuing its random number generator stream. The
+    continuation is written to a new extension_<k> subdirectory and existing samples are left in place: manifest.json
+    joins them along the time axis and params.json records the new final time, discretisation parameter and
+    generator state. The continuation of stratified runs is drawn without stratification. Requires samples of the full
+    model state, and time-homogeneous Markov models without path dependent payoffs or importance sampling, whose
+    continuation depends only on the final state.
+
+    Parameters
+    ----------
+    config_path : str
+        Path to config file of the run.
+    final_time : float
+        New final time of the run.
+    """
+    config = load_config(config_path)
+    directory = config.get("output", "output_directory")
+    params = read_json(os.path.join(directory, 'params.json'))
+    simulator = build_simulator(config, **{key: params[key] for key in ['number_of_paths', 'final_time',
+                                                                        'discretisation_parameter'] if key in params})
+    params = read_run_params(simulator=simulator, directory=directory)
+    if not final_time > params['final_time']:
+        raise ValueError(f"final_time must exceed the final time of the run. Provided: final_time={final_time}, "
+                         f"run final_time={params['final_time']}")
+    if not simulator.store_samples or not simulator.write_samples or simulator.store_aggregates:
+        raise ValueError('Extending the horizon requires samples of the full model state. Set store_samples = True '
+                         'and store_aggregates = False in simulation in config_file.')
+    if simulator.payoff_engine is not None or simulator.importance_strikes is not None:
+        raise ValueError('Runs with payoffs or importance sampling cannot be extended to a later horizon, as both '
+                         'depend on the whole path. Extend the number of paths instead.')
+    if hasattr(simulator.model, 'hurst') or simulator.update_leverage is not None:
+        raise ValueError(f'{simulator.model_name} paths do not continue from their final state alone and cannot be '
+                         f'extended to a later horizon.')
+    discretisation_interval = params['final_time'] / (params['discretisation_parameter'] - 1)
+    number_of_steps = int(round((final_time - params['final_time']) / discretisation_interval))
+    if not np.isclose(number_of_steps * discretisation_interval, final_time - params['final_time']):
+        raise ValueError(f"final_time must lie on the time grid of the run, with step size "
+                         f"{discretisation_interval}. Provided: {final_time}")
+    extensions = params.get('extensions', [])
+    part, part_directory = get_part_directory(directory)
+    # Stratifying the continuation by path index would make its terminal increment comonotone with that of the run.
+    # Its increments are drawn independently instead, and the stratification of the run on W(final_time) remains a
+    # proportional stratification at the later horizon
+    simulator = build_simulator(config, number_of_paths=params['number_of_paths'],
+                                final_time=number_of_steps * discretisation_interval,
+                                discretisation_parameter=number_of_steps + 1,
+                                **({'sampling': 'pseudo_random'} if params.get('sampling') == 'stratified' else {}))
+    simulator.rng.bit_generator.state = params['rng_state']
+    print(f"Extending {simulator.simulator_name} simulation of {simulator.model_name} model in {directory} from "
+          f"final time {params['final_time']} to {final_time}.")
+    # Continue each chunk of paths from its final state
+    samples = read_samples(directory)
+    time_values = params['final_time'] + discretisation_interval * np.arange(1, number_of_steps + 1)
+    write_npy(directory=part_directory, time=time_values)
+    columns = open_sample_columns(directory=part_directory, state=simulator.output_state,
+                                  shape=(simulator.number_of_paths, number_of_steps))
+    chunk_size = simulator.chunk_size or simulator.number_of_paths
+    for start in range(0, simulator.number_of_paths, chunk_size):
+        stop = min(start + chunk_size, simulator.number_of_paths)
+        initial_state = np.array([samples[state_component][start:stop, -1]
+                                  for state_component in simulator.output_state], dtype=float)
+        path_samples = np.zeros((simulator.dim, stop - start, number_of_steps + 1))
+        simulator.sim_paths(path_samples=path_samples, discretisation_interval=discretisation_interval,
+                            initial_state=initial_state)
+        np.clip(path_samples, a_min=0, a_max=None, out=path_samples)  # Ensure non-negativity
+        for column, component_samples in zip(columns, path_samples):
+            column[start:stop] = component_samples[:, 1:]
+            column.flush()
+        if simulator.verbose and chunk_size < simulator.number_of_paths:
+            print(f'Path {stop}/{simulator.number_of_paths} simulated.')
+    rng_state = simulator.rng.bit_generator.state
+    simulator.write_params(directory=part_directory, rng_state=rng_state, start_time=params['final_time'])
+    write_json(directory=directory, manifest={
+        'number_of_paths': params['number_of_paths'], 'output_state': simulator.output_state, 'axis': 'time',
+        'parts': [get_manifest_part(directory=directory, params=params),
+                  {'directory': part, 'start_time': params['final_time']}]})
+    write_json(directory=directory, params=params | {
+        'final_time': final_time, 'discretisation_parameter': params['discretisation_parameter'] + number_of_steps,
+        'rng_state': rng_state, 'extensions': extensions + [{'directory': part, 'final_time': final_time}]})
+    print(f"{directory} extended to final time {final_time}.")
+    return directory
+
+
+def main(config_path, number_of_paths=None, final_time=None):
+    """
+    Extend a completed run with more paths or to a later horizon, then rerun the analysis steps of the config on the
+    extended samples.
+
+    Parameters
+    ----------
+    config_path : str
+        Path to config file of the run.
+    number_of_paths : int
+        Number of paths to append.
+    final_time : float
+        New final time of the run.
+    """
+    if (number_of_paths is None) == (final_time is None):
+        raise ValueError('Provide exactly one of number_of_paths and final_time.')
+    config = load_config(config_path)
+    analysis_params = None
+    if config.has_section("analysis"):
+        analysis_params = {key: parse_value(config.get("analysis", key)) for key in config.options("analysis")}
+        params = read_json(os.path.join(config.get("output", "output_directory"), 'params.json'))
+        # Validate steps before extending
+        get_analysis_steps(analysis_params, store_samples=params.get('store_samples', True))
+    if number_of_paths is not None:
+        directory = extend_paths(config_path=config_path, number_of_paths=number_of_paths)
+    else:
+        directory = extend_horizon(config_path=config_path, final_time=final_time)
+    if analysis_params is not None:
+        run_analysis(analysis_params=analysis_params, directories=[directory])
+
+
+if __name__ == "__main__":
+    usage = "Usage: python extend_run.py <config_path> (--paths <number_of_paths> | --final-time <final_time>)"
+    if len(sys.argv) != 4 or sys.argv[2] not in ('--paths', '--final-time'):
+        raise ValueError(usage)
+    if sys.argv[2] == '--paths':
+        main(config_path=sys.argv[1], number_of_paths=int(sys.argv[3]))
+    else:
+        main(config_path=sys.argv[1], final_time=float(sys.argv[3]))
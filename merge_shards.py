@@ -0,0 +1,28 @@
+import os
+import sys
+from utils.shard_utils import merge_shards
+
+
+def main(directory, shard_directories=None):
+    """
+    Merge the shards of a sharded run into one logical dataset without copying samples.
+
+    Parameters
+    ----------
+    directory : str
+        Output directory of the run, to which the merged manifest.json, payoffs.json and params.json are written.
+    shard_directories : list
+        Shard output directories. Defaults to the shard_<k> subdirectories of directory written by run.py.
+    """
+    if not shard_directories:
+        shard_directories = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                             if name.startswith('shard_') and os.path.isdir(os.path.join(directory, name))]
+    if not shard_directories:
+        raise FileNotFoundError(f"No shards found in '{directory}'.")
+    merge_shards(directory=directory, shard_directories=shard_directories)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise ValueError("Usage: python merge_shards.py <output_directory> [<shard_directory1> ...]")
+    main(directory=sys.argv[1], shard_directories=sys.argv[2:])
@@ -0,0 +1,137 @@
+import os
+import numpy as np
+from abc import abstractmethod
+from models.stochastic_model import StochasticModel
+
+
+class BasketModel(StochasticModel):
+    """
+    Base class for models of a basket of correlated assets. The correlation matrix of the driving Brownian motions is
+    Cholesky factored once at construction, and the diffusion term of each step is applied to all paths as one matrix
+    product with the factor through diffusion_dot, so the (dim, dim, paths) diffusion tensor is never formed. Models
+    define the aggregate quantities basket, best_price and worst_price which may be stored instead of the full state.
+    """
+    aggregate_state = ['basket', 'best_price', 'worst_price']
+
+    def __init__(self, state, model_params):
+        """
+        Parameters
+        ----------
+        state : list
+            Components of the state vector.
+        model_params : dict
+            Dictionary containing model parameters, including number_of_assets and correlation.
+        """
+        super().__init__(state=state, drift=self.drift, diffusion=self.diffusion, model_params=model_params)
+        if not hasattr(self, 'correlation'):
+            raise TypeError(f'{self.__class__.__name__} class cannot be instantiated without correlation. '
+                            'Please set in model_params in config_file.')
+        self.correlation_matrix = self.build_correlation_matrix()
+        try:
+            self.cholesky_factor = np.linalg.cholesky(self.correlation_matrix)
+        except np.linalg.LinAlgError:
+            raise ValueError(f'{self.__class__.__name__} correlation matrix must be positive definite.')
+        weights = getattr(self, 'weights', None)
+        self.basket_weights = (np.full(self.number_of_assets, 1 / self.number_of_assets) if weights is None
+                               else self.get_asset_params(weights))
+
+    @staticmethod
+    def get_state(model_params, components):
+        """
+        State component names, one per asset for each component e.g. ['price_0', 'price_1', ...].
+
+        Parameters
+        ----------
+        model_params : dict
+            Dictionary containing model parameters.
+        components : list
+            Per-asset component names.
+        """
+        number_of_assets = model_params.get('number_of_assets')
+        if not isinstance(number_of_assets, int) or number_of_assets < 1:
+            raise TypeError('Basket models cannot be instantiated without a positive integer number_of_assets. '
+                            'Please set in model_params in config_file.')
+        return [f'{component}_{index}' for component in components for index in range(number_of_assets)]
+
+    def get_asset_params(self, value):
+        """
+        Broadcast a scalar or per-asset list parameter to an array with one entry per asset.
+
+        Parameters
+        ----------
+        value : float or list
+            Parameter value.
+        """
+        return np.broadcast_to(np.asarray(value, dtype=float), (self.number_of_assets,)).copy()
+
+    @staticmethod
+    def get_correlation_matrix(correlation, size):
+        """
+        Build a correlation matrix from a constant pairwise correlation, a nested list or the path to an npy file.
+
+        Parameters
+        ----------
+        correlation : float, list or str
+            Correlation specification.
+        size : int
+            Size of the correlation matrix.
+        """
+        if isinstance(correlation, str):
+            if not os.path.exists(correlation):
+                raise FileNotFoundError(f"Correlation file '{correlation}' not found.")
+            correlation = np.load(correlation)
+        if np.ndim(correlation) == 0:
+            return np.full((size, size), float(correlation)) + (1 - float(correlation)) * np.eye(size)
+        correlation = np.asarray(correlation, dtype=float)
+        if correlation.shape != (size, size):
+            raise ValueError(f'correlation must have shape {(size, size)}. Provided: {correlation.shape}')
+        if not np.allclose(correlation, correlation.T) or not np.allclose(np.diag(correlation), 1):
+            raise ValueError('correlation must be symmetric with unit diagonal.')
+        return correlation
+
+    @staticmethod
+    def per_asset(values, ndim):
+        """
+        Reshape a per-asset parameter array to broadcast against arrays with ndim dimensions and assets first.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Parameter array with one entry per asset.
+        ndim : int
+            Number of dimensions of the array to broadcast against.
+        """
+        return values.reshape(values.shape + (1,) * (ndim - 1))
+
+    def aggregate(self, state):
+        """
+        Aggregate quantities of the asset prices: weighted basket value, best price and worst price.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            State with shape (dim, paths).
+        """
+        prices = state[:self.number_of_assets]
+        return np.stack([self.basket_weights @ prices, prices.max(axis=0), prices.min(axis=0)])
+
+    @abstractmethod
+    def build_correlation_matrix(self):
+        """
+        Correlation matrix of the driving Brownian motions.
+        """
+        raise NotImplementedError("Build correlation matrix function not implemented")
+
+    @abstractmethod
+    def diffusion_dot(self, state, bm_step):
+        """
+        Product of the diffusion coefficient with the Brownian increments.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            State with shape (dim, paths).
+        bm_step : np.ndarray
+            Independent Brownian increments with shape (dim, paths).
+        """
+        raise NotImplementedError("Diffusion dot function not implemented")
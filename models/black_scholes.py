@@ -1,3 +1,4 @@
+import numpy as np
 from models.stochastic_model import StochasticModel
 
 
@@ -66,4 +67,37 @@ class BlackScholes(StochasticModel):
         """
         return self.sigma
 
+    def get_scalar_coefficients(self):
+        """
+        Drift, diffusion and diffusion derivative as functions of a scalar price, with the model parameters bound as
+        constants, e.g. for compilation into a fused path kernel.
+        """
+        growth_rate, sigma = float(self.risk_free_rate - self.q), float(self.sigma)
+
+        def drift(price):
+            return growth_rate * price
+
+        def diffusion(price):
+            return sigma * price
+
+        def diffusion_prime(price):
+            return sigma
+        return drift, diffusion, diffusion_prime
 
+    def exact_solution(self, initial_value, time_values, brownian_motion):
+        """
+        Exact solution S_t = S_0 exp((r - q - σ²/2) t + σ W_t) driven by a given Brownian path e.g. to compute
+        strong errors of numerical schemes.
+
+        Parameters
+        ----------
+        initial_value : np.ndarray
+            Initial condition with shape (dim,).
+        time_values : np.ndarray
+            Times at which to evaluate the solution.
+        brownian_motion : np.ndarray
+            Brownian motion at time_values with shape (dim, paths, time).
+        """
+        drift = self.risk_free_rate - self.q - 0.5 * self.sigma ** 2
+        return (np.reshape(initial_value, (-1, 1, 1))
+                * np.exp(drift * np.asarray(time_values) + self.sigma * brownian_motion))
@@ -0,0 +1,67 @@
+import numpy as np
+from models.basket_model import BasketModel
+
+
+class BlackScholesBasket(BasketModel):
+    """
+    Basket of n correlated assets each following a geometric Brownian motion.
+
+    dS^i_t = (r - q_i) S^i_t dt + σ_i S^i_t dW^i_t
+    d⟨W^i, W^j⟩ₜ = C_ij dt
+
+    where:
+        - S^i_t = price of asset i at time t,
+        - r = risk-free rate,
+        - q_i = continuous dividend yield of asset i,
+        - σ_i = volatility of asset i,
+        - C = correlation matrix.
+    """
+    def __init__(self, model_params):
+        """
+        Parameters
+        ----------
+        model_params : dict
+            Dictionary containing model parameters. sigma and q may be scalars or lists with one entry per asset and
+            correlation a constant pairwise correlation, a nested list or the path to an npy file.
+        """
+        state = self.get_state(model_params, ['price'])
+        super().__init__(state=state, model_params=model_params)
+        if not hasattr(self, 'q'):
+            raise TypeError('BlackScholesBasket class cannot be instantiated without continuous dividend yield, q. '
+                            'Please set in model_params in config_file.')
+        if not hasattr(self, 'sigma'):
+            raise TypeError('BlackScholesBasket class cannot be instantiated without volatility, sigma. '
+                            'Please set in model_params in config_file.')
+        self.asset_drift = self.risk_free_rate - self.get_asset_params(self.q)
+        self.asset_sigma = self.get_asset_params(self.sigma)
+
+    def build_correlation_matrix(self):
+        return self.get_correlation_matrix(self.correlation, self.number_of_assets)
+
+    def drift(self, *prices):
+        """
+        Model drift
+
+        Parameters
+        ----------
+        prices : float or np.ndarray
+            Asset prices
+        """
+        prices = np.asarray(prices)
+        return self.per_asset(self.asset_drift, prices.ndim) * prices
+
+    def diffusion(self, *prices):
+        """
+        Model volatility
+
+        Parameters
+        ----------
+        prices : float or np.ndarray
+            Asset prices
+        """
+        prices = np.asarray(prices)
+        volatility = self.per_asset(self.asset_sigma, prices.ndim) * prices
+        return self.per_asset(self.cholesky_factor, prices.ndim) * volatility[:, None]
+
+    def diffusion_dot(self, state, bm_step):
+        return self.per_asset(self.asset_sigma, state.ndim) * state * (self.cholesky_factor @ bm_step)
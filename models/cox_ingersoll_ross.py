@@ -66,4 +66,21 @@ class CoxIngersollRoss(StochasticModel):
         price : float
             Asset price
         """
-        return 0
+        return 0.5 * self.lmbda / price ** 0.5
+
+    def get_scalar_coefficients(self):
+        """
+        Drift, diffusion and diffusion derivative as functions of a scalar price, with the model parameters bound as
+        constants, e.g. for compilation into a fused path kernel.
+        """
+        kappa, eta, lmbda = float(self.kappa), float(self.eta), float(self.lmbda)
+
+        def drift(price):
+            return kappa * (eta - price)
+
+        def diffusion(price):
+            return lmbda * price ** 0.5
+
+        def diffusion_prime(price):
+            return 0.5 * lmbda / price ** 0.5
+        return drift, diffusion, diffusion_prime
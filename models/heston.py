@@ -49,9 +49,9 @@ class Heston(StochasticModel):
 
         Parameters
         ---
-        price : float
+        price : float or np.ndarray
             Asset price
-        volatility: float
+        volatility: float or np.ndarray
             Asset volatility
         """
         return np.array([self.risk_free_rate * price, self.lmbda * (self.sigma ** 2 - volatility)])
@@ -62,14 +62,15 @@ class Heston(StochasticModel):
 
         Parameters
         ---
-        price : float
+        price : float or np.ndarray
             Asset price
-        volatility: float
+        volatility: float or np.ndarray
             Asset volatility
         """
-        return np.array([[price * np.sqrt(np.abs(volatility)), 0],
-                         [self.rho * self.xi * np.sqrt(np.abs(volatility)),
-                          np.sqrt(1 - self.rho ** 2) * self.xi * np.sqrt(np.abs(volatility))]])
+        root_volatility = np.sqrt(np.abs(volatility))
+        return np.array([[price * root_volatility, np.zeros_like(root_volatility)],
+                         [self.rho * self.xi * root_volatility,
+                          np.sqrt(1 - self.rho ** 2) * self.xi * root_volatility]])
 
     def diffusion_prime(self, price, volatility):
         """
@@ -77,14 +78,16 @@ class Heston(StochasticModel):
 
         Parameters
         ---
-        price : float
+        price : float or np.ndarray
             Asset price
-        volatility: float
+        volatility: float or np.ndarray
             Asset volatility
         """
-        price_derivative = np.array([[np.sqrt(abs(volatility)), 0], [0, 0]])
-        volatility_derivative = np.array([[0.5 * price / np.sqrt(abs(volatility)), 0],
-                                 [0.5 * self.rho * self.xi / np.sqrt(abs(volatility)),
-                                  0.5 * np.sqrt(1-self.rho**2) * self.xi / np.sqrt(abs(volatility))]])
+        root_volatility = np.sqrt(np.abs(volatility))
+        zeros = np.zeros_like(root_volatility)
+        price_derivative = np.array([[root_volatility, zeros], [zeros, zeros]])
+        volatility_derivative = np.array([[0.5 * price / root_volatility, zeros],
+                                          [0.5 * self.rho * self.xi / root_volatility,
+                                           0.5 * np.sqrt(1-self.rho**2) * self.xi / root_volatility]])
 
         return price_derivative, volatility_derivative
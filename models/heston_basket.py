@@ -0,0 +1,95 @@
+import numpy as np
+from models.basket_model import BasketModel
+
+
+class HestonBasket(BasketModel):
+    """
+    Basket of n correlated assets each with Heston stochastic variance.
+
+    dS^i_t = r S^i_t dt + √V^i_t S^i_t dW^i_t
+    dV^i_t = λ_i(σ_i² - V^i_t) dt + ξ_i√V^i_t dW^{n+i}_t
+
+    where:
+        - S^i_t = price of asset i at time t,
+        - V^i_t = instantaneous variance of asset i at time t,
+        - r = risk-free rate,
+        - λ_i = mean reversion rate,
+        - σ_i² = long-term variance,
+        - ξ_i = volatility of volatility,
+        - W = 2n-dimensional Brownian motion with correlation matrix built from the asset correlation matrix and the
+          price-variance correlations ρ_i, or given in full.
+    """
+    def __init__(self, model_params):
+        """
+        Parameters
+        ----------
+        model_params : dict
+            Dictionary containing model parameters. lmbda, sigma, xi and rho may be scalars or lists with one entry
+            per asset. correlation is either the n x n correlation between asset prices, combined with rho
+            and independent variances across assets, or the full 2n x 2n correlation ordered as prices then
+            variances, given as a constant, a nested list or the path to an npy file.
+        """
+        state = self.get_state(model_params, ['price', 'volatility'])
+        for key, description in [('lmbda', 'mean reversion rate'), ('sigma', 'long-term standard deviation'),
+                                 ('xi', 'volatility of volatility')]:
+            if key not in model_params:
+                raise TypeError(f'HestonBasket class cannot be instantiated without {description}, {key}. '
+                                'Please set in model_params in config_file.')
+        super().__init__(state=state, model_params=model_params)
+        self.asset_lmbda, self.asset_sigma, self.asset_xi = (self.get_asset_params(value) for value in
+                                                             (self.lmbda, self.sigma, self.xi))
+
+    def build_correlation_matrix(self):
+        size = 2 * self.number_of_assets
+        if not isinstance(self.correlation, str) and np.shape(self.correlation) == (size, size):
+            return self.get_correlation_matrix(self.correlation, size)
+        if not hasattr(self, 'rho'):
+            raise TypeError('HestonBasket class cannot be instantiated without Brownian motion correlation, rho, '
+                            'unless the full price and variance correlation is given. '
+                            'Please set in model_params in config_file.')
+        asset_correlation = self.get_correlation_matrix(self.correlation, self.number_of_assets)
+        rho = np.diag(self.get_asset_params(self.rho))
+        return np.block([[asset_correlation, rho], [rho, np.eye(self.number_of_assets)]])
+
+    def drift(self, *state):
+        """
+        Model drift
+
+        Parameters
+        ----------
+        state : float or np.ndarray
+            Asset prices followed by asset variances
+        """
+        prices, volatilities = np.split(np.asarray(state), 2)
+        ndim = prices.ndim
+        return np.concatenate([self.risk_free_rate * prices, self.per_asset(self.asset_lmbda, ndim)
+                               * (self.per_asset(self.asset_sigma, ndim) ** 2 - volatilities)])
+
+    def volatility_coefficients(self, state):
+        """
+        Diffusion coefficient of each state component before correlation, √V^i S^i and ξ_i√V^i.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            Asset prices followed by asset variances
+        """
+        prices, volatilities = np.split(np.asarray(state), 2)
+        root_volatilities = np.sqrt(np.abs(volatilities))
+        return np.concatenate([root_volatilities * prices,
+                               self.per_asset(self.asset_xi, prices.ndim) * root_volatilities])
+
+    def diffusion(self, *state):
+        """
+        Model volatility
+
+        Parameters
+        ----------
+        state : float or np.ndarray
+            Asset prices followed by asset variances
+        """
+        coefficients = self.volatility_coefficients(state)
+        return self.per_asset(self.cholesky_factor, coefficients.ndim) * coefficients[:, None]
+
+    def diffusion_dot(self, state, bm_step):
+        return self.volatility_coefficients(state) * (self.cholesky_factor @ bm_step)
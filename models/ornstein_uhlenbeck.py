@@ -68,3 +68,20 @@ class OrnsteinUhlenbeck(StochasticModel):
             Asset price
         """
         return 0
+
+    def get_scalar_coefficients(self):
+        """
+        Drift, diffusion and diffusion derivative as functions of a scalar price, with the model parameters bound as
+        constants, e.g. for compilation into a fused path kernel.
+        """
+        kappa, eta, lmbda = float(self.kappa), float(self.eta), float(self.lmbda)
+
+        def drift(price):
+            return kappa * (eta - price)
+
+        def diffusion(price):
+            return lmbda
+
+        def diffusion_prime(price):
+            return 0.0
+        return drift, diffusion, diffusion_prime
@@ -0,0 +1,36 @@
+from models.heston import Heston
+
+
+class RoughHeston(Heston):
+    """
+    Rough Heston model describing random evolution of stock price and associated rough stochastic volatility. The
+    variance is a Volterra process with a power-law kernel, so it is not Markov and must be simulated with
+    HybridSimulator.
+
+    dS_t = r S_t dt + √V_t S_t dW₁_t
+    V_t = V_0 + 1/Γ(α) ∫₀ᵗ (t - s)^(α - 1) [λ(σ² - V_s) ds + ξ√V_s dB_s],   α = H + ½
+    B_t = ρW₁_t + √(1 - ρ²)W₂_t
+
+    where:
+        - S_t = asset price at time t,
+        - V_t = instantaneous variance at time t,
+        - r = risk-free rate,
+        - λ = mean reversion rate,
+        - σ² = long-term variance,
+        - ξ = volatility of volatility,
+        - ρ = correlation between the Brownian motions W₁ and B,
+        - H = Hurst parameter in (0, ½], with H = ½ recovering the Heston model.
+    """
+    def __init__(self, **model_params):
+        """
+        Parameters
+        ----------
+        model_params : dict
+            Dictionary containing model parameters.
+        """
+        super().__init__(**model_params)
+        if not hasattr(self, 'hurst'):
+            raise TypeError('RoughHeston class cannot be instantiated without Hurst parameter, hurst. '
+                            'Please set in model_params in config_file.')
+        if not 0 < self.hurst <= 0.5:
+            raise ValueError(f'hurst must satisfy 0 < hurst <= 0.5. Provided: {self.hurst}')
@@ -0,0 +1,193 @@
+import numpy as np
+from models.heston import Heston
+
+
+class StochasticLocalVolatility(Heston):
+    """
+    Stochastic local volatility extension of the Heston model, whose price diffusion is scaled by a leverage function
+    L(t, S) chosen so that the marginal distributions of the price match those of a target local volatility model.
+
+    dS_t = r S_t dt + L(t, S_t) √V_t S_t dW₁_t
+    dV_t = λ(σ² - V_t) dt + ξ√V_t dW₂_t
+    d⟨W₁, W₂⟩ₜ = ρ dt
+    L(t, S)² = σ_LV(t, S)² / E[V_t | S_t = S]
+
+    where:
+        - S_t = asset price at time t,
+        - V_t = instantaneous variance at time t,
+        - r = risk-free rate,
+        - λ = mean reversion rate,
+        - σ² = long-term variance,
+        - ξ = volatility of volatility,
+        - ρ = correlation between the two Brownian motions W₁ and W₂,
+        - σ_LV = target local volatility.
+
+    The leverage is calibrated during simulation by the particle method: at each time step the paths of the first
+    batch are sorted by price into leverage_bins bins of equal counts, E[V_t | S_t] is estimated by the mean variance
+    of each bin and interpolated onto a grid uniform in log price, and the resulting row of leverages is stored. Later
+    time steps and batches evaluate the precomputed grid by bilinear interpolation, indexing the grid cell directly
+    rather than searching, vectorised over all paths. The calibrated grid is written to leverage.npy in the output
+    directory by the simulator and reloaded when a run is resumed or extended, so that all of its paths are simulated
+    with the same leverage function.
+    """
+    def __init__(self, **model_params):
+        """
+        Parameters
+        ----------
+        model_params : dict
+            Dictionary containing model parameters. local_volatility is the target local volatility, a constant or
+            a numpy expression in t and S e.g. "0.2 + 0.1 * np.exp(-t) * (S - 1) ** 2". leverage_price_bounds
+            (default [0.1, 10.0]) are the lowest and highest prices of the leverage grid relative to the initial
+            price, beyond which the leverage is extrapolated flat, leverage_grid_points (default 401) the number of
+            grid prices and leverage_bins (default 30) the number of bins used to estimate E[V_t | S_t].
+        """
+        super().__init__(**model_params)
+        if not hasattr(self, 'local_volatility'):
+            raise TypeError('StochasticLocalVolatility class cannot be instantiated without target local volatility, '
+                            'local_volatility. Please set in model_params in config_file.')
+        self.leverage_price_bounds = getattr(self, 'leverage_price_bounds', [0.1, 10.0])
+        self.leverage_grid_points = getattr(self, 'leverage_grid_points', 401)
+        self.leverage_bins = getattr(self, 'leverage_bins', 30)
+        if not 0 < self.leverage_price_bounds[0] < 1 < self.leverage_price_bounds[1]:
+            raise ValueError(f'leverage_price_bounds must satisfy 0 < lower < 1 < upper. '
+                             f'Provided: {self.leverage_price_bounds}')
+        if isinstance(self.local_volatility, str):
+            code = compile(self.local_volatility, '<local_volatility>', 'eval')
+            self.get_local_volatility = lambda t, S: np.broadcast_to(
+                eval(code, {'np': np, '__builtins__': {}}, {'t': t, 'S': S}), np.shape(S))
+        else:
+            self.get_local_volatility = lambda t, S: np.full(np.shape(S), float(self.local_volatility))
+        # Leverage grid: one row of leverages at uniform log prices per calibrated time step
+        self.leverage_rows = []
+        self.leverage_time_step = None
+        self.leverage_log_prices = None
+        self.leverage_time = 0.0
+
+    def update_leverage(self, time, state, discretisation_interval):
+        """
+        Set the time at which the leverage is evaluated, the start of the next time step. If the row of the leverage
+        grid at time has not been calibrated, it is calibrated by binning the provided paths. The grid is reset at
+        time 0 if the time step or initial price changed.
+
+        Parameters
+        ----------
+        time : float
+            Time of state.
+        state : np.ndarray
+            State of a batch of paths with shape (dim, paths).
+        discretisation_interval : float
+            Time step size.
+        """
+        price, volatility = state
+        if time == 0:
+            log_bounds = np.log(np.mean(price) * np.asarray(self.leverage_price_bounds, dtype=float))
+            log_prices = np.linspace(*log_bounds, self.leverage_grid_points)
+            if (self.leverage_time_step != discretisation_interval or self.leverage_log_prices is None
+                    or not np.allclose(self.leverage_log_prices, log_prices)):
+                self.leverage_rows = []
+                self.leverage_time_step = discretisation_interval
+                self.leverage_log_prices = log_prices
+        self.leverage_time = time
+        if int(round(time / self.leverage_time_step)) < len(self.leverage_rows):
+            return
+        log_price = np.log(np.maximum(price, 1e-300))
+        order = np.argsort(log_price)
+        bins = np.array_split(order, min(self.leverage_bins, len(order)))
+        bin_log_prices = np.array([np.mean(log_price[indices]) for indices in bins])
+        bin_variances = np.array([np.mean(np.abs(volatility[indices])) for indices in bins])
+        conditional_variance = np.interp(self.leverage_log_prices, bin_log_prices, bin_variances)
+        local_volatility = self.get_local_volatility(time, np.exp(self.leverage_log_prices))
+        with np.errstate(divide='ignore'):
+            self.leverage_rows.append(local_volatility / np.sqrt(np.maximum(conditional_variance, 1e-12)))
+
+    def get_leverage_grid(self):
+        """
+        Calibrated leverage grid as a dictionary of its time step, log prices and rows with shape (times, prices).
+        """
+        return {'time_step': self.leverage_time_step, 'log_prices': self.leverage_log_prices,
+                'rows': np.array(self.leverage_rows)}
+
+    def set_leverage_grid(self, leverage_grid):
+        """
+        Restore a leverage grid calibrated by an earlier run, e.g. read from leverage.npy. Rows which have been
+        calibrated are not recalibrated, as long as the grid matches the time step and initial price of the run.
+
+        Parameters
+        ----------
+        leverage_grid : dict
+            Leverage grid from get_leverage_grid.
+        """
+        self.leverage_time_step = leverage_grid['time_step']
+        self.leverage_log_prices = np.asarray(leverage_grid['log_prices'])
+        self.leverage_rows = list(np.asarray(leverage_grid['rows']))
+
+    def leverage(self, price):
+        """
+        Leverage L(t, S) at the current leverage time by bilinear interpolation of the leverage grid, vectorised over
+        prices. The grid cell of each price is found by direct indexing, as the grid is uniform in log price, and
+        times beyond the last calibrated row are extrapolated flat.
+
+        Parameters
+        ----------
+        price : np.ndarray
+            Asset prices.
+        """
+        if not self.leverage_rows:
+            raise ValueError('Leverage grid has not been calibrated. StochasticLocalVolatility models must be '
+                             'simulated by a simulator calling update_leverage at each time step.')
+        position = min(self.leverage_time / self.leverage_time_step, len(self.leverage_rows) - 1)
+        if np.isclose(position, round(position)):  # Time steps of the grid up to rounding
+            position = round(position)
+        time_index = min(int(position), len(self.leverage_rows) - 2) if len(self.leverage_rows) > 1 else 0
+        time_weight = position - time_index
+        log_price_step = self.leverage_log_prices[1] - self.leverage_log_prices[0]
+        position = np.clip((np.log(np.maximum(price, 1e-300)) - self.leverage_log_prices[0]) / log_price_step,
+                           0, self.leverage_grid_points - 1)
+        price_index = np.minimum(position.astype(int), self.leverage_grid_points - 2)
+        price_weight = position - price_index
+        leverage = 0
+        for row_index, row_weight in [(time_index, 1 - time_weight), (time_index + 1, time_weight)]:
+            if row_weight == 0:
+                continue
+            row = self.leverage_rows[row_index]
+            leverage = leverage + row_weight * ((1 - price_weight) * row[price_index]
+                                                + price_weight * row[price_index + 1])
+        return leverage
+
+    def diffusion(self, price, volatility):
+        """
+        Model volatility
+
+        Parameters
+        ---
+        price : float or np.ndarray
+            Asset price
+        volatility: float or np.ndarray
+            Asset volatility
+        """
+        root_volatility = np.sqrt(np.abs(volatility))
+        return np.array([[self.leverage(price) * price * root_volatility, np.zeros_like(root_volatility)],
+                         [self.rho * self.xi * root_volatility,
+                          np.sqrt(1 - self.rho ** 2) * self.xi * root_volatility]])
+
+    def diffusion_prime(self, price, volatility):
+        """
+        Compute derivative of the model volatility e.g. for use in Milstein scheme. The leverage is held fixed over
+        the step.
+
+        Parameters
+        ---
+        price : float or np.ndarray
+            Asset price
+        volatility: float or np.ndarray
+            Asset volatility
+        """
+        root_volatility = np.sqrt(np.abs(volatility))
+        leverage = self.leverage(price)
+        zeros = np.zeros_like(root_volatility)
+        price_derivative = np.array([[leverage * root_volatility, zeros], [zeros, zeros]])
+        volatility_derivative = np.array([[0.5 * leverage * price / root_volatility, zeros],
+                                          [0.5 * self.rho * self.xi / root_volatility,
+                                           0.5 * np.sqrt(1 - self.rho ** 2) * self.xi / root_volatility]])
+
+        return price_derivative, volatility_derivative
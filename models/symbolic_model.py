@@ -0,0 +1,126 @@
+import numpy as np
+from models.stochastic_model import StochasticModel
+
+
+class SymbolicModel(StochasticModel):
+    """
+    Model defined by symbolic drift and diffusion expressions in the state components and model parameters, e.g. the
+    Cox-Ingersoll-Ross model
+
+        state = ['price']
+        drift = ['kappa * (eta - price)']
+        diffusion = [['lmbda * sqrt(price)']]
+
+    The derivatives of the diffusion coefficient required by the Milstein scheme are derived symbolically, and drift,
+    diffusion and diffusion_prime are each compiled with sympy into a single vectorized NumPy kernel in which common
+    subexpressions are evaluated once. Model parameters remain arguments of the kernels rather than being substituted,
+    so they may be changed after compilation. Requires sympy.
+    """
+    def __init__(self, model_params):
+        """
+        Parameters
+        ----------
+        model_params : dict
+            Dictionary containing model parameters together with 'state', a list of state component names, 'drift', a
+            list of dim expressions, and 'diffusion', a dim x dim nested list of expressions. Expressions may be
+            strings or sympy expressions.
+        """
+        try:
+            import sympy
+        except ImportError:
+            raise ImportError('SymbolicModel requires sympy. Install with: pip install sympy')
+        model_params = dict(model_params)
+        for key in ['state', 'drift', 'diffusion']:
+            if key not in model_params:
+                raise TypeError(f'SymbolicModel class cannot be instantiated without {key}. '
+                                'Please set in model_params in config_file.')
+        state = list(model_params.pop('state'))
+        drift_expressions = model_params.pop('drift')
+        diffusion_expressions = model_params.pop('diffusion')
+        dim = len(state)
+        if len(drift_expressions) != dim:
+            raise ValueError(f'drift must contain one expression per state component. Provided: {drift_expressions}')
+        if np.shape(diffusion_expressions) != (dim, dim):
+            raise ValueError(f'diffusion must be a {dim} x {dim} nested list of expressions. '
+                             f'Provided: {diffusion_expressions}')
+        super().__init__(state=state, drift=self.drift, diffusion=self.diffusion,
+                         diffusion_prime=self.diffusion_prime, model_params=model_params)
+        self.model_params = self.model_params | {'drift': [str(expression) for expression in drift_expressions],
+                                                 'diffusion': [[str(expression) for expression in row]
+                                                               for row in diffusion_expressions]}
+        # Parse expressions
+        state_symbols = sympy.symbols(state, real=True)
+        symbols = {str(symbol): symbol for symbol in state_symbols}
+        symbols |= {key: sympy.Symbol(key, real=True) for key in model_params if key not in symbols}
+        drift = sympy.Matrix([sympy.sympify(expression, locals=symbols) for expression in drift_expressions])
+        diffusion = sympy.Matrix([[sympy.sympify(expression, locals=symbols) for expression in row]
+                                  for row in diffusion_expressions])
+        unknown_symbols = (drift.free_symbols | diffusion.free_symbols) - set(symbols.values())
+        if unknown_symbols:
+            raise TypeError(f'SymbolicModel class cannot be instantiated without {sorted(map(str, unknown_symbols))}. '
+                            'Please set in model_params in config_file.')
+        # Derivative of the diffusion coefficient with respect to each state component, indexed [k, i, j]
+        diffusion_prime = [diffusion.diff(symbol) for symbol in state_symbols]
+        self.parameter_names = [key for key in model_params if symbols[key] in drift.free_symbols
+                                | diffusion.free_symbols]
+        arguments = list(state_symbols) + [symbols[key] for key in self.parameter_names]
+        self.drift_kernel, self.diffusion_kernel, self.diffusion_prime_kernel = (
+            sympy.lambdify(arguments, list(expressions), modules='numpy', cse=True)
+            for expressions in (drift, diffusion, [entry for derivative in diffusion_prime for entry in derivative]))
+        self.expressions = {'drift': drift, 'diffusion': diffusion, 'diffusion_prime': diffusion_prime}
+
+    def evaluate(self, kernel, shape, state):
+        """
+        Evaluate a compiled kernel and assemble its entries, some of which may be scalar constants, into an array of
+        the given shape followed by the broadcast shape of the state.
+
+        Parameters
+        ----------
+        kernel : callable
+            Compiled kernel returning a flat list of entries.
+        shape : tuple
+            Shape of the expression array.
+        state : tuple
+            State components.
+        """
+        entries = kernel(*state, *(getattr(self, key) for key in self.parameter_names))
+        if len(self.state) == 1:
+            return entries[0]
+        output = np.empty((len(entries),) + np.broadcast_shapes(*(np.shape(entry) for entry in entries)))
+        for index, entry in enumerate(entries):
+            output[index] = entry
+        return output.reshape(shape + output.shape[1:])
+
+    def drift(self, *state):
+        """
+        Model drift
+
+        Parameters
+        ----------
+        state : float or np.ndarray
+            State components.
+        """
+        return self.evaluate(self.drift_kernel, (len(self.state),), state)
+
+    def diffusion(self, *state):
+        """
+        Model volatility
+
+        Parameters
+        ----------
+        state : float or np.ndarray
+            State components.
+        """
+        return self.evaluate(self.diffusion_kernel, (len(self.state),) * 2, state)
+
+    def diffusion_prime(self, *state):
+        """
+        Compute derivative of the model volatility e.g. for use in Milstein scheme. The derivative with respect to
+        state component k is indexed [k, i, j].
+
+        Parameters
+        ----------
+        state : float or np.ndarray
+            State components.
+        """
+        return self.evaluate(self.diffusion_prime_kernel, (len(self.state),) * 3, state)
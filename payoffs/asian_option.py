@@ -0,0 +1,31 @@
+import numpy as np
+from payoffs.payoff import Payoff
+
+
+class AsianOption(Payoff):
+    """
+    Arithmetic average price Asian option paying max(A - K, 0) for a call or max(K - A, 0) for a put, where A is the
+    average of the price over the simulation time steps up to maturity, excluding the initial price.
+    """
+    def __init__(self, **payoff_params):
+        """
+        Parameters
+        ----------
+        payoff_params : dict
+            Dictionary containing payoff parameters.
+        """
+        super().__init__(**payoff_params)
+        if not hasattr(self, 'strike'):
+            raise TypeError('AsianOption class cannot be instantiated without strike. '
+                            'Please set in payoffs in config_file.')
+
+    def initialise(self, initial_state):
+        self.running_sum = np.zeros_like(initial_state[self.price_index])
+        self.number_of_observations = 0
+
+    def update(self, time, previous_state, current_state, discretisation_interval, volatility=None):
+        self.running_sum += np.maximum(current_state[self.price_index], 0)
+        self.number_of_observations += 1
+
+    def payoff(self):
+        return self.intrinsic_value(self.running_sum / max(self.number_of_observations, 1), self.strike)
@@ -0,0 +1,59 @@
+import numpy as np
+from payoffs.payoff import Payoff
+
+
+class BarrierOption(Payoff):
+    """
+    Knock-out or knock-in barrier option on a European call or put, continuously monitored. Between time steps the
+    log price is approximated by a Brownian bridge, so a path which stays on one side of the barrier at both ends of a
+    step still crosses it with probability
+
+        p = exp(-2 ln(B / S_i) ln(B / S_{i+1}) / (σ² Δt))
+
+    where σ is the local volatility of the log price. Instead of sampling crossings, each path carries its survival
+    probability, which removes the O(√Δt) bias of discrete monitoring and reduces variance.
+    """
+    requires_volatility = True
+
+    def __init__(self, **payoff_params):
+        """
+        Parameters
+        ----------
+        payoff_params : dict
+            Dictionary containing payoff parameters.
+        """
+        super().__init__(**payoff_params)
+        if not hasattr(self, 'strike'):
+            raise TypeError('BarrierOption class cannot be instantiated without strike. '
+                            'Please set in payoffs in config_file.')
+        if not hasattr(self, 'barrier'):
+            raise TypeError('BarrierOption class cannot be instantiated without barrier. '
+                            'Please set in payoffs in config_file.')
+        if not hasattr(self, 'barrier_type'):
+            raise TypeError('BarrierOption class cannot be instantiated without barrier_type e.g. up_and_out. '
+                            'Please set in payoffs in config_file.')
+        if self.barrier_type not in ('up_and_out', 'down_and_out', 'up_and_in', 'down_and_in'):
+            raise ValueError(f"barrier_type must be one of 'up_and_out', 'down_and_out', 'up_and_in' or "
+                             f"'down_and_in'. Provided: {self.barrier_type}")
+        self.up = self.barrier_type.startswith('up')
+
+    def initialise(self, initial_state):
+        self.price = initial_state[self.price_index].copy()
+        breached = self.price >= self.barrier if self.up else self.price <= self.barrier
+        self.survival_probability = np.where(breached, 0.0, 1.0)
+
+    def update(self, time, previous_state, current_state, discretisation_interval, volatility=None):
+        previous_price = np.maximum(previous_state[self.price_index], 0)
+        self.price = np.maximum(current_state[self.price_index], 0)
+        breached = self.price >= self.barrier if self.up else self.price <= self.barrier
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_distances = np.log(self.barrier / previous_price) * np.log(self.barrier / self.price)
+            crossing_probability = np.exp(-2 * log_distances / (volatility ** 2 * discretisation_interval))
+        crossing_probability = np.where(np.isfinite(crossing_probability), crossing_probability, 0.0)
+        self.survival_probability *= np.where(breached, 0.0, 1 - crossing_probability)
+
+    def payoff(self):
+        intrinsic_value = self.intrinsic_value(self.price, self.strike)
+        if self.barrier_type.endswith('out'):
+            return intrinsic_value * self.survival_probability
+        return intrinsic_value * (1 - self.survival_probability)
@@ -0,0 +1,36 @@
+import numpy as np
+from payoffs.payoff import Payoff
+
+
+class BasketOption(Payoff):
+    """
+    European option on a weighted basket B_T = Σ w_i S^i_T of the first number_of_assets state components, paying
+    max(B_T - K, 0) for a call or max(K - B_T, 0) for a put. Weights default to 1 / number_of_assets.
+    """
+    def __init__(self, **payoff_params):
+        """
+        Parameters
+        ----------
+        payoff_params : dict
+            Dictionary containing payoff parameters.
+        """
+        super().__init__(**payoff_params)
+        if not hasattr(self, 'strike'):
+            raise TypeError('BasketOption class cannot be instantiated without strike. '
+                            'Please set in payoffs in config_file.')
+        if not hasattr(self, 'number_of_assets') and not hasattr(self, 'weights'):
+            raise TypeError('BasketOption class cannot be instantiated without number_of_assets or weights. '
+                            'Please set in payoffs in config_file.')
+        if hasattr(self, 'weights'):
+            self.basket_weights = np.asarray(self.weights, dtype=float)
+        else:
+            self.basket_weights = np.full(self.number_of_assets, 1 / self.number_of_assets)
+
+    def initialise(self, initial_state):
+        self.basket = self.basket_weights @ initial_state[:len(self.basket_weights)]
+
+    def update(self, time, previous_state, current_state, discretisation_interval, volatility=None):
+        self.basket = self.basket_weights @ current_state[:len(self.basket_weights)]
+
+    def payoff(self):
+        return self.intrinsic_value(self.basket, self.strike)
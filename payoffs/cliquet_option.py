@@ -0,0 +1,45 @@
+import numpy as np
+from payoffs.payoff import Payoff
+
+
+class CliquetOption(Payoff):
+    """
+    Cliquet option paying the sum of periodic returns R_k = S_{t_k} / S_{t_{k-1}} - 1 over reset times t_k, each
+    clipped to [local_floor, local_cap], with the sum clipped to [global_floor, global_cap]:
+
+        notional * min(max(Σ_k min(max(R_k, local_floor), local_cap), global_floor), global_cap)
+    """
+    def __init__(self, **payoff_params):
+        """
+        Parameters
+        ----------
+        payoff_params : dict
+            Dictionary containing payoff parameters.
+        """
+        super().__init__(**payoff_params)
+        if not hasattr(self, 'reset_times'):
+            raise TypeError('CliquetOption class cannot be instantiated without reset_times. '
+                            'Please set in payoffs in config_file.')
+        self.reset_times = np.sort(np.atleast_1d(self.reset_times))
+        self.local_floor = getattr(self, 'local_floor', 0.0)
+        self.local_cap = getattr(self, 'local_cap', np.inf)
+        self.global_floor = getattr(self, 'global_floor', 0.0)
+        self.global_cap = getattr(self, 'global_cap', np.inf)
+        self.notional = getattr(self, 'notional', 1.0)
+
+    def initialise(self, initial_state):
+        self.reset_price = initial_state[self.price_index].copy()
+        self.sum_of_returns = np.zeros_like(self.reset_price)
+        self.next_reset = 0
+
+    def update(self, time, previous_state, current_state, discretisation_interval, volatility=None):
+        if self.next_reset < len(self.reset_times) and time >= self.reset_times[self.next_reset] - 1e-12:
+            price = np.maximum(current_state[self.price_index], 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns = np.where(self.reset_price > 0, price / self.reset_price - 1, 0.0)
+            self.sum_of_returns += np.clip(returns, self.local_floor, self.local_cap)
+            self.reset_price = price.copy()
+            self.next_reset += 1
+
+    def payoff(self):
+        return self.notional * np.clip(self.sum_of_returns, self.global_floor, self.global_cap)
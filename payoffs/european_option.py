@@ -0,0 +1,27 @@
+from payoffs.payoff import Payoff
+
+
+class EuropeanOption(Payoff):
+    """
+    European option paying max(S_T - K, 0) for a call or max(K - S_T, 0) for a put.
+    """
+    def __init__(self, **payoff_params):
+        """
+        Parameters
+        ----------
+        payoff_params : dict
+            Dictionary containing payoff parameters.
+        """
+        super().__init__(**payoff_params)
+        if not hasattr(self, 'strike'):
+            raise TypeError('EuropeanOption class cannot be instantiated without strike. '
+                            'Please set in payoffs in config_file.')
+
+    def initialise(self, initial_state):
+        self.price = initial_state[self.price_index].copy()
+
+    def update(self, time, previous_state, current_state, discretisation_interval, volatility=None):
+        self.price = current_state[self.price_index]
+
+    def payoff(self):
+        return self.intrinsic_value(self.price, self.strike)
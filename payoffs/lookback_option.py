@@ -0,0 +1,37 @@
+import numpy as np
+from payoffs.payoff import Payoff
+
+
+class LookbackOption(Payoff):
+    """
+    Lookback option on the running maximum M and minimum m of the price. Without a strike the option has a floating
+    strike and pays S_T - m for a call or M - S_T for a put. With a strike K it pays max(M - K, 0) for a call or
+    max(K - m, 0) for a put.
+    """
+    def __init__(self, **payoff_params):
+        """
+        Parameters
+        ----------
+        payoff_params : dict
+            Dictionary containing payoff parameters.
+        """
+        super().__init__(**payoff_params)
+
+    def initialise(self, initial_state):
+        self.price = initial_state[self.price_index].copy()
+        self.running_maximum = self.price.copy()
+        self.running_minimum = self.price.copy()
+
+    def update(self, time, previous_state, current_state, discretisation_interval, volatility=None):
+        self.price = np.maximum(current_state[self.price_index], 0)
+        np.maximum(self.running_maximum, self.price, out=self.running_maximum)
+        np.minimum(self.running_minimum, self.price, out=self.running_minimum)
+
+    def payoff(self):
+        if hasattr(self, 'strike'):
+            if self.option_type == 'call':
+                return self.intrinsic_value(self.running_maximum, self.strike)
+            return self.intrinsic_value(self.running_minimum, self.strike)
+        if self.option_type == 'call':
+            return self.price - self.running_minimum
+        return self.running_maximum - self.price
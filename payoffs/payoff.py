@@ -0,0 +1,86 @@
+import numpy as np
+from abc import ABCMeta, abstractmethod
+
+
+class Payoff(metaclass=ABCMeta):
+    # Whether update requires the local volatility of the log price
+    requires_volatility = False
+
+    def __init__(self, option_type='call', maturity=None, price_index=0, **payoff_params):
+        """
+        Class for option payoffs accumulated on the fly as paths are simulated. Each payoff keeps a running state per
+        path which is updated at every time step, so only O(paths) memory is needed however long the paths are.
+
+        Parameters
+        ----------
+        option_type : str
+            'call' or 'put'.
+        maturity : float
+            Option maturity. Defaults to the simulation final time.
+        price_index : int
+            Index of the price component in the model state vector.
+        **payoff_params : keyword arguments
+            Payoff specific parameters e.g. strike.
+        """
+        if option_type not in ('call', 'put'):
+            raise ValueError(f"option_type must be 'call' or 'put'. Provided: {option_type}")
+        self.option_type = option_type
+        self.maturity = maturity
+        self.price_index = price_index
+        self.payoff_params = payoff_params | {'option_type': option_type, 'maturity': maturity}
+        for key, value in payoff_params.items():
+            setattr(self, key, value)
+
+    def intrinsic_value(self, underlying, strike):
+        """
+        Call or put intrinsic value.
+
+        Parameters
+        ----------
+        underlying : np.ndarray
+            Underlying value per path.
+        strike : float or np.ndarray
+            Strike per path.
+        """
+        if self.option_type == 'call':
+            return np.maximum(underlying - strike, 0)
+        return np.maximum(strike - underlying, 0)
+
+    @abstractmethod
+    def initialise(self, initial_state):
+        """
+        Reset running state for a new batch of paths.
+
+        Parameters
+        ----------
+        initial_state : np.ndarray
+            Initial state with shape (dim, paths).
+        """
+        raise NotImplementedError("Initialise function not implemented")
+
+    @abstractmethod
+    def update(self, time, previous_state, current_state, discretisation_interval, volatility=None):
+        """
+        Update running state with one time step.
+
+        Parameters
+        ----------
+        time : float
+            Time of current_state.
+        previous_state : np.ndarray
+            State at the previous time step with shape (dim, paths).
+        current_state : np.ndarray
+            State at time with shape (dim, paths).
+        discretisation_interval : float
+            Time step size.
+        volatility : np.ndarray
+            Local volatility of the log price over the step, provided if requires_volatility.
+        """
+        raise NotImplementedError("Update function not implemented")
+
+    @abstractmethod
+    def payoff(self):
+        """
+        Undiscounted payoff per path.
+        """
+        raise NotImplementedError("Payoff function not implemented")
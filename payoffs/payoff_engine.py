@@ -0,0 +1,218 @@
+import numpy as np
+from utils.data_utils import write_json
+
+# Sums of discounted payoffs over the paths of each stratum, accumulated by stratified runs
+STRATUM_KEYS = ['stratum_sum', 'stratum_sum_of_squares']
+
+
+class PayoffEngine:
+    """
+    Drives a set of payoffs from the simulator time loop and accumulates discounted payoff statistics over batches
+    of paths. Only per-path running state for the current batch and per-payoff sums are held, and the sums can be
+    merged exactly across runs. If paths are stratified, sums are also held per stratum so that standard errors only
+    reflect the variance within strata.
+    """
+    def __init__(self, payoffs, risk_free_rate, final_time, number_of_strata=None):
+        """
+        Parameters
+        ----------
+        payoffs : dict
+            Payoff instances keyed by label.
+        risk_free_rate : float
+            Risk-free rate used to discount payoffs.
+        final_time : float
+            Simulation final time, the default maturity.
+        number_of_strata : int
+            Number of strata if paths are stratified, path j of each batch in stratum j mod number_of_strata.
+        """
+        self.payoffs = payoffs
+        self.risk_free_rate = risk_free_rate
+        self.number_of_strata = number_of_strata
+        for payoff in payoffs.values():
+            if payoff.maturity is None:
+                payoff.maturity = final_time
+                payoff.payoff_params['maturity'] = final_time
+            if payoff.maturity > final_time:
+                raise ValueError(f'Payoff maturity must not exceed final_time. Provided: maturity={payoff.maturity}, '
+                                 f'final_time={final_time}')
+        self.requires_volatility = any(payoff.requires_volatility for payoff in payoffs.values())
+        self.accumulators = {label: {'sum': 0.0, 'sum_of_squares': 0.0, 'number_of_paths': 0} for label in payoffs}
+        if number_of_strata is not None:
+            for accumulator in self.accumulators.values():
+                accumulator |= {key: 0.0 for key in STRATUM_KEYS}
+
+    def initialise(self, initial_state):
+        """
+        Reset running state of every payoff for a new batch of paths.
+
+        Parameters
+        ----------
+        initial_state : np.ndarray
+            Initial state with shape (dim, paths).
+        """
+        for payoff in self.payoffs.values():
+            payoff.initialise(initial_state)
+
+    def update(self, time, previous_state, current_state, discretisation_interval, simulator):
+        """
+        Update every payoff whose maturity has not passed with one time step.
+
+        Parameters
+        ----------
+        time : float
+            Time of current_state.
+        previous_state : np.ndarray
+            State at the previous time step with shape (dim, paths).
+        current_state : np.ndarray
+            State at time with shape (dim, paths).
+        discretisation_interval : float
+            Time step size.
+        simulator : Simulator
+            Simulator providing the model diffusion coefficient.
+        """
+        volatility = None
+        for payoff in self.payoffs.values():
+            if time > payoff.maturity + 1e-12:
+                continue
+            if payoff.requires_volatility and volatility is None:
+                volatility = self.local_volatility(previous_state=previous_state, simulator=simulator)
+            payoff.update(time=time, previous_state=previous_state, current_state=current_state,
+                          discretisation_interval=discretisation_interval, volatility=volatility)
+
+    @staticmethod
+    def local_volatility(previous_state, simulator):
+        """
+        Local volatility of the log price over a step, |b_0(X)| / S where b_0 is the row of the diffusion coefficient
+        driving the price component.
+
+        Parameters
+        ----------
+        previous_state : np.ndarray
+            State at the start of the step with shape (dim, paths).
+        simulator : Simulator
+            Simulator providing the model diffusion coefficient.
+        """
+        if simulator.dim == 1:
+            price_diffusion = np.abs(np.broadcast_to(simulator.diffusion(previous_state), previous_state.shape)[0])
+        else:
+            price_diffusion = np.sqrt(np.sum(simulator.diffusion(*previous_state)[0] ** 2, axis=0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return price_diffusion / np.abs(previous_state[0])
+
+    def discounted_payoffs(self, weights=None):
+        """
+        Discounted payoff of every path of the current batch, keyed by label.
+
+        Parameters
+        ----------
+        weights : np.ndarray
+            Likelihood ratio weights of the paths if simulated with importance sampling.
+        """
+        discounted_payoffs = {}
+        for label, payoff in self.payoffs.items():
+            discounted_payoff = np.exp(-self.risk_free_rate * payoff.maturity) * payoff.payoff()
+            discounted_payoffs[label] = discounted_payoff if weights is None else discounted_payoff * weights
+        return discounted_payoffs
+
+    def accumulate(self, weights=None):
+        """
+        Add discounted payoffs of the current batch of paths to the running statistics. Payoffs with a leading
+        scenario axis are accumulated per scenario.
+
+        Parameters
+        ----------
+        weights : np.ndarray
+            Likelihood ratio weights of the paths if simulated with importance sampling.
+        """
+        for label, discounted_payoff in self.discounted_payoffs(weights=weights).items():
+            accumulator = self.accumulators[label]
+            accumulator['sum'] = accumulator['sum'] + np.sum(discounted_payoff, axis=-1)
+            accumulator['sum_of_squares'] = accumulator['sum_of_squares'] + np.sum(discounted_payoff ** 2, axis=-1)
+            accumulator['number_of_paths'] += int(np.shape(discounted_payoff)[-1])
+            if self.number_of_strata is not None:
+                stratum_payoff = np.reshape(discounted_payoff, np.shape(discounted_payoff)[:-1]
+                                            + (-1, self.number_of_strata))
+                accumulator['stratum_sum'] = accumulator['stratum_sum'] + np.sum(stratum_payoff, axis=-2)
+                accumulator['stratum_sum_of_squares'] = (accumulator['stratum_sum_of_squares']
+                                                         + np.sum(stratum_payoff ** 2, axis=-2))
+
+    def results(self, scenario_index=None):
+        """
+        Price and Monte Carlo standard error of every payoff.
+
+        Parameters
+        ----------
+        scenario_index : int
+            Scenario to report if payoffs were accumulated per scenario.
+        """
+        results = {}
+        for label, payoff in self.payoffs.items():
+            accumulator = self.accumulators[label]
+            sum_keys = [key for key in ['sum', 'sum_of_squares'] + STRATUM_KEYS if key in accumulator]
+            if scenario_index is not None:
+                accumulator = accumulator | {key: accumulator[key][scenario_index] for key in sum_keys}
+            accumulator = accumulator | {key: np.asarray(accumulator[key], dtype=float).tolist() for key in sum_keys}
+            results[label] = {'payoff_name': payoff.__class__.__name__,
+                              'payoff_params': payoff.payoff_params} | self.summarise(accumulator)
+        return results
+
+    @staticmethod
+    def summarise(accumulator):
+        """
+        Price and Monte Carlo standard error from the accumulated sums of discounted payoffs, returned with the sums.
+        If stratum sums are accumulated, strata hold equal numbers of paths and the variance is the mean variance
+        within strata.
+
+        Parameters
+        ----------
+        accumulator : dict
+            Sum, sum of squares and number of paths of the discounted payoffs, and optionally those of each stratum.
+        """
+        number_of_paths = accumulator['number_of_paths']
+        price = accumulator['sum'] / number_of_paths
+        if 'stratum_sum' in accumulator:
+            stratum_sum = np.asarray(accumulator['stratum_sum'])
+            stratum_paths = number_of_paths / len(stratum_sum)
+            stratum_variances = (np.asarray(accumulator['stratum_sum_of_squares']) / stratum_paths
+                                 - (stratum_sum / stratum_paths) ** 2)
+            variance = max(float(np.mean(stratum_variances)), 0)
+        else:
+            variance = max(accumulator['sum_of_squares'] / number_of_paths - price ** 2, 0)
+        return {'price': price, 'standard_error': np.sqrt(variance / number_of_paths)} | accumulator
+
+    @staticmethod
+    def merge_results(results):
+        """
+        Exactly merge payoff results of runs over disjoint sets of paths, e.g. shards, by adding their sums.
+
+        Parameters
+        ----------
+        results : list
+            Payoff results read from the payoffs.json of each run.
+        """
+        merged_results = {}
+        for label, result in results[0].items():
+            keys = [key for key in ['sum', 'sum_of_squares', 'number_of_paths'] + STRATUM_KEYS if key in result]
+            accumulator = {key: np.sum([run_results[label][key] for run_results in results], axis=0).tolist()
+                           for key in keys}
+            merged_results[label] = {key: result[key] for key in ['payoff_name', 'payoff_params']}
+            merged_results[label] |= PayoffEngine.summarise(accumulator)
+        return merged_results
+
+    def write(self, directory, scenario_index=None):
+        """
+        Print payoff prices and write them to payoffs.json.
+
+        Parameters
+        ----------
+        directory : str
+            Output directory to write to.
+        scenario_index : int
+            Scenario to write if payoffs were accumulated per scenario.
+        """
+        results = self.results(scenario_index=scenario_index)
+        scenario = '' if scenario_index is None else f'scenario {scenario_index} '
+        for label, result in results.items():
+            print(f'{scenario}{label} ({result["payoff_name"]}) price: {result["price"]:.4f} '
+                  f'+- {result["standard_error"]:.4f}')
+        write_json(directory=directory, payoffs=results)
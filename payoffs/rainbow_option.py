@@ -0,0 +1,36 @@
+from payoffs.payoff import Payoff
+
+
+class RainbowOption(Payoff):
+    """
+    European option on the best or worst of the first number_of_assets state components at maturity, paying
+    max(max_i S^i_T - K, 0) for a best-of call or max(K - min_i S^i_T, 0) for a worst-of put.
+    """
+    def __init__(self, rainbow_type='best_of', **payoff_params):
+        """
+        Parameters
+        ----------
+        rainbow_type : str
+            'best_of' or 'worst_of'.
+        payoff_params : dict
+            Dictionary containing payoff parameters.
+        """
+        if rainbow_type not in ('best_of', 'worst_of'):
+            raise ValueError(f"rainbow_type must be 'best_of' or 'worst_of'. Provided: {rainbow_type}")
+        super().__init__(rainbow_type=rainbow_type, **payoff_params)
+        if not hasattr(self, 'strike'):
+            raise TypeError('RainbowOption class cannot be instantiated without strike. '
+                            'Please set in payoffs in config_file.')
+        if not hasattr(self, 'number_of_assets'):
+            raise TypeError('RainbowOption class cannot be instantiated without number_of_assets. '
+                            'Please set in payoffs in config_file.')
+
+    def initialise(self, initial_state):
+        self.update(time=0, previous_state=None, current_state=initial_state, discretisation_interval=None)
+
+    def update(self, time, previous_state, current_state, discretisation_interval, volatility=None):
+        prices = current_state[:self.number_of_assets]
+        self.underlying = prices.max(axis=0) if self.rainbow_type == 'best_of' else prices.min(axis=0)
+
+    def payoff(self):
+        return self.intrinsic_value(self.underlying, self.strike)
@@ -0,0 +1,142 @@
+import os
+import sys
+import numpy as np
+from run import load_config, build_simulator
+from convergence_study import coupled_bm_increments
+from payoffs.payoff_engine import PayoffEngine
+from utils.build_utils import parse_value
+from utils.data_utils import write_json
+from utils.sim_utils import timer
+
+
+def get_richardson_weights(step_sizes, weak_order=1):
+    """
+    Weights of the Richardson extrapolation of estimates at the given step sizes. If the weak error has the expansion
+    c₁h^p + c₂h^(2p) + ... in the step size h, with p the weak order, the weighted sum of the estimates cancels the
+    first len(step_sizes) - 1 error terms. The weights solve the Vandermonde system Σₗ wₗ hₗ^(kp) = δₖ₀ for
+    k = 0, ..., len(step_sizes) - 1, e.g. (-1, 2) for step sizes h and h/2 and weak order 1.
+
+    Parameters
+    ----------
+    step_sizes : list
+        Distinct step sizes of the levels.
+    weak_order : float
+        Weak order p of the scheme.
+    """
+    step_sizes = np.asarray(step_sizes, dtype=float)
+    powers = np.arange(len(step_sizes)) * weak_order
+    right_hand_side = np.zeros(len(step_sizes))
+    right_hand_side[0] = 1
+    return np.linalg.solve(step_sizes[None, :] ** powers[:, None], right_hand_side)
+
+
+@timer
+def richardson_extrapolation(config_path):
+    """
+    Price the payoffs of the config by Richardson extrapolation. The simulator is run at each discretisation parameter
+    in the [extrapolation] section, by default n and 2n - 1 with n the discretisation parameter of the config, on
+    nested time grids driven by the same Brownian paths. The discounted payoffs of each path are combined over the
+    levels with the Richardson weights to cancel the leading terms of the discretisation bias, so the extrapolated
+    price and its Monte Carlo standard error are estimated from one sample of combined payoffs. Prices of each level
+    and the bias of the finest level estimated by its difference to the extrapolated price are reported alongside.
+
+    Parameters
+    ----------
+    config_path : str
+        Path to config file.
+    """
+    config = load_config(config_path)
+    directory = config.get("output", "output_directory")
+    os.makedirs(directory, exist_ok=True)
+    extrapolation_params = {}
+    if config.has_section("extrapolation"):
+        extrapolation_params = {key: parse_value(config.get("extrapolation", key))
+                                for key in config.options("extrapolation")}
+    simulator = build_simulator(config)
+    if simulator.payoff_engine is None:
+        raise ValueError('Richardson extrapolation requires payoffs. Please set payoffs in config_file.')
+    if simulator.number_of_scenarios is not None:
+        raise ValueError('Scenario batching is not supported by Richardson extrapolation.')
+    if simulator.importance_strikes is not None:
+        raise ValueError('Importance sampling is not supported by Richardson extrapolation.')
+    discretisation_parameters = sorted(extrapolation_params.get(
+        'discretisation_parameters', [simulator.discretisation_parameter, 2 * simulator.discretisation_parameter - 1]))
+    finest_discretisation_parameter = discretisation_parameters[-1]
+    if len(set(discretisation_parameters)) < 2:
+        raise ValueError(f'Richardson extrapolation requires at least two distinct discretisation parameters. '
+                         f'Provided: {discretisation_parameters}')
+    for discretisation_parameter in discretisation_parameters:
+        if (finest_discretisation_parameter - 1) % (discretisation_parameter - 1) != 0:
+            raise ValueError('Time grids must be nested i.e. discretisation_parameter - 1 must divide that of the '
+                             f'finest level. Provided: {discretisation_parameters}')
+    weak_order = extrapolation_params.get('weak_order', 1)
+    final_time = simulator.final_time
+    finest_steps = finest_discretisation_parameter - 1
+    step_sizes = [final_time / (discretisation_parameter - 1) for discretisation_parameter in discretisation_parameters]
+    weights = get_richardson_weights(step_sizes=step_sizes, weak_order=weak_order)
+    seed = simulator.seed if simulator.seed is not None else int(np.random.SeedSequence().entropy % 2 ** 63)
+    batch_size = extrapolation_params.get('batch_size', 10000)
+    simulators = [build_simulator(config, discretisation_parameter=discretisation_parameter)
+                  for discretisation_parameter in discretisation_parameters]
+    labels = list(simulator.payoff_engine.payoffs)
+    # Sums of discounted payoffs of each level, of the combined payoffs and of the bias of the finest level
+    estimates = ['level_' + str(level) for level in range(len(discretisation_parameters))] + ['extrapolated', 'bias']
+    accumulators = {label: {estimate: {'sum': 0.0, 'sum_of_squares': 0.0, 'number_of_paths': 0}
+                            for estimate in estimates} for label in labels}
+    print(f"Initiating Richardson extrapolation of {simulator.model_name} model with {simulator.simulator_name}, "
+          f"{simulator.number_of_paths} paths and discretisation parameters {discretisation_parameters}.")
+    for batch_index, start in enumerate(range(0, simulator.number_of_paths, batch_size)):
+        paths = min(batch_size, simulator.number_of_paths - start)
+        level_payoffs = []
+        for level_simulator, discretisation_parameter in zip(simulators, discretisation_parameters):
+            steps = discretisation_parameter - 1
+            bm_increments = coupled_bm_increments(seed=seed, batch_index=batch_index,
+                                                  shape=(simulator.dim, paths, finest_steps),
+                                                  discretisation_interval=final_time / finest_steps,
+                                                  refinement_factor=finest_steps // steps)
+            for _ in level_simulator.iterate_steps(initial_state=level_simulator.get_initial_state(paths),
+                                                   number_of_steps=steps, discretisation_interval=final_time / steps,
+                                                   bm_increments=bm_increments):
+                pass
+            level_payoffs.append(level_simulator.payoff_engine.discounted_payoffs())
+        for label in labels:
+            samples = {'level_' + str(level): payoffs[label] for level, payoffs in enumerate(level_payoffs)}
+            samples['extrapolated'] = sum(weight * payoffs[label] for weight, payoffs in zip(weights, level_payoffs))
+            samples['bias'] = level_payoffs[-1][label] - samples['extrapolated']
+            for estimate, sample in samples.items():
+                accumulator = accumulators[label][estimate]
+                accumulator['sum'] += float(np.sum(sample))
+                accumulator['sum_of_squares'] += float(np.sum(sample ** 2))
+                accumulator['number_of_paths'] += paths
+    # Summarise estimates
+    results = {}
+    for label, payoff in simulator.payoff_engine.payoffs.items():
+        summaries = {estimate: PayoffEngine.summarise(accumulator)
+                     for estimate, accumulator in accumulators[label].items()}
+        levels = [{'discretisation_parameter': discretisation_parameter, 'step_size': step_size,
+                   'price': summaries['level_' + str(level)]['price'],
+                   'standard_error': summaries['level_' + str(level)]['standard_error']}
+                  for level, (discretisation_parameter, step_size) in enumerate(zip(discretisation_parameters,
+                                                                                    step_sizes))]
+        results[label] = {'payoff_name': payoff.__class__.__name__, 'payoff_params': payoff.payoff_params,
+                          'price': summaries['extrapolated']['price'],
+                          'standard_error': summaries['extrapolated']['standard_error'],
+                          'bias': summaries['bias']['price'],
+                          'bias_standard_error': summaries['bias']['standard_error'], 'levels': levels}
+        print(f'{label} ({payoff.__class__.__name__}) extrapolated price: {results[label]["price"]:.4f} '
+              f'+- {results[label]["standard_error"]:.4f}, finest level bias: {results[label]["bias"]:.4f} '
+              f'+- {results[label]["bias_standard_error"]:.4f}')
+    # Write outputs
+    extrapolation = {'model_name': simulator.model_name, 'model_params': simulator.model_params,
+                     'simulator_name': simulator.simulator_name, 'discretisation_parameters': discretisation_parameters,
+                     'step_sizes': step_sizes, 'weak_order': weak_order, 'weights': weights.tolist(),
+                     'number_of_paths': simulator.number_of_paths, 'seed': seed, 'payoffs': results}
+    write_json(directory=directory, extrapolation=extrapolation)
+
+    return extrapolation
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise ValueError("Usage: python richardson_extrapolation.py <config_path>")
+    richardson_extrapolation(config_path=sys.argv[1])
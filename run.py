@@ -1,60 +1,172 @@
 import os
 import sys
 import configparser
-from utils.build_utils import parse_value, list_files_excluding
+import numpy as np
+from utils.build_utils import parse_value, parse_memory_size, list_files_excluding
+from utils.cache_utils import ResultCache
+from utils.memory_utils import plan_memory
+from utils.data_utils import remove_file
+from utils.analysis_utils import get_analysis_steps, run_analysis
 from models.heston import Heston
 from models.black_scholes import BlackScholes
 from models.cox_ingersoll_ross import CoxIngersollRoss
 from models.ornstein_uhlenbeck import OrnsteinUhlenbeck
+from models.symbolic_model import SymbolicModel
+from models.black_scholes_basket import BlackScholesBasket
+from models.heston_basket import HestonBasket
+from models.rough_heston import RoughHeston
+from models.stochastic_local_volatility import StochasticLocalVolatility
 from simulators.euler_simulator import EulerSimulator
 from simulators.milstein_simulator import MilsteinSimulator
+from simulators.hybrid_simulator import HybridSimulator
+from payoffs.payoff_engine import PayoffEngine
+from payoffs.european_option import EuropeanOption
+from payoffs.asian_option import AsianOption
+from payoffs.barrier_option import BarrierOption
+from payoffs.lookback_option import LookbackOption
+from payoffs.cliquet_option import CliquetOption
+from payoffs.basket_option import BasketOption
+from payoffs.rainbow_option import RainbowOption
 
 
-def main(config_path):
+def load_config(config_path):
     """
-    Run simulation. Parameters and methods set by config_path.
+    Load configuration file.
 
     Parameters
     ----------
     config_path : str
         Path to config file.
     """
-    # Load configuration
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"Config file '{config_path}' not found. "
-                                f"Available: {os.listdir('config_paths')}")
+                                f"Available: {os.listdir('config_files')}")
     config = configparser.ConfigParser()
     config.read(config_path)
-    # Load parameters
+    return config
+
+
+def build_simulator(config, simulator_name=None, **simulator_overrides):
+    """
+    Instantiate model and simulator from configuration.
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+        Loaded configuration.
+    simulator_name : str
+        Simulator class name. Defaults to simulator_name in config.
+    **simulator_overrides : keyword arguments
+        Simulation parameters overriding those in config e.g. discretisation_parameter.
+    """
     model_name = config.get("run", "model_name")
-    simulator_name = config.get("run", "simulator_name")
+    if simulator_name is None:
+        simulator_name = config.get("run", "simulator_name")
     model_params = {key: parse_value(config.get("model_params", key)) for key in config.options("model_params")}
     simulator_params = {key: parse_value(config.get("simulation", key)) for key in config.options("simulation")}
-    directory = config.get("output", "output_directory")
-    os.makedirs(directory, exist_ok=True)
+    simulator_params = simulator_params | simulator_overrides
+    # Model parameters batched along a leading scenario axis
+    scenario_params = {}
+    if config.has_section("scenarios"):
+        scenario_params = {key: list(parse_value(config.get("scenarios", key))) for key in config.options("scenarios")}
+        if len({len(values) for values in scenario_params.values()}) > 1:
+            raise ValueError(f'All scenario parameters must have the same number of values. Provided: '
+                             f'{ {key: len(values) for key, values in scenario_params.items()} }')
+        model_params = model_params | {key: np.asarray(values, dtype=float)[:, None]
+                                       for key, values in scenario_params.items()}
+        simulator_params['scenario_params'] = scenario_params
     # Instantiate model
     model_class = globals().get(model_name)
     if model_class is None:
         raise ValueError(
             f"Model '{model_name}' not found. Available: {list_files_excluding('models', 'model.py')}")
     model = model_class(model_params=model_params)
+    model.model_params |= scenario_params  # Record scenario values as lists
     # Instantiate simulator
     simulator_class = globals().get(simulator_name)
     if simulator_class is None:
         raise ValueError(f"Simulator class {simulator_name} not found."
                          f"Available: {list_files_excluding('simulators', 'simulator.py')}")
     simulator = simulator_class(model=model, simulator_params=simulator_params)
-    # Perform simulation
-    print(f"Initiating {simulator_name} simulation of {model_name} model with "
-          f"{simulator_params['number_of_paths']} paths, final time={simulator_params['final_time']} and "
-          f"discretisation parameter n={simulator_params['discretisation_parameter']}.")
-    simulator.sim(directory=directory)
+    # Attach payoffs accumulated during simulation
+    if config.has_section("payoffs"):
+        payoffs = {}
+        for label in config.options("payoffs"):
+            payoff_params = dict(parse_value(config.get("payoffs", label)))
+            payoff_name = payoff_params.pop('payoff_name')
+            payoff_class = globals().get(payoff_name)
+            if payoff_class is None:
+                raise ValueError(f"Payoff class {payoff_name} not found. "
+                                 f"Available: {list_files_excluding('payoffs', ['payoff.py', 'payoff_engine.py'])}")
+            payoffs[label] = payoff_class(**payoff_params)
+        simulator.payoff_engine = PayoffEngine(payoffs=payoffs, risk_free_rate=model.risk_free_rate,
+                                               final_time=simulator.final_time,
+                                               number_of_strata=simulator.number_of_strata
+                                               if simulator.sampling == 'stratified' else None)
+    # Plan memory once payoffs are attached, as their per-path state counts towards the budget
+    if simulator.max_memory is not None:
+        plan_memory(simulator)
+        simulator.validate_sampling()  # Planned chunk_size
+    return simulator
+
+
+def main(config_path, resume=False, shard=None):
+    """
+    Run simulation. Parameters and methods set by config_path.
+
+    Parameters
+    ----------
+    config_path : str
+        Path to config file.
+    resume : bool
+        Continue an interrupted chunked run from its checkpoint.
+    shard : tuple
+        (shard_index, shard_count) overriding those in config, to simulate one shard of the run.
+    """
+    # Load configuration
+    config = load_config(config_path)
+    directory = config.get("output", "output_directory")
+    shard_overrides = {} if shard is None else {'shard_index': shard[0], 'shard_count': shard[1]}
+    simulator = build_simulator(config, **shard_overrides)
+    if simulator.shard_count is not None:  # Shards are written to subdirectories of the output directory
+        directory = os.path.join(directory, f'shard_{simulator.shard_index}')
+    os.makedirs(directory, exist_ok=True)
+    remove_file(os.path.join(directory, 'manifest.json'))  # Stale manifests of merged or extended runs shadow samples
+    analysis_params = None
+    if config.has_section("analysis"):
+        analysis_params = {key: parse_value(config.get("analysis", key)) for key in config.options("analysis")}
+        get_analysis_steps(analysis_params, store_samples=simulator.store_samples)  # Validate before simulating
+    # Serve from result cache if possible. Runs keeping samples in memory only are not cached
+    cache = None
+    if config.has_section("cache") and simulator.write_samples:
+        max_size = config.get("cache", "max_size", fallback=None)
+        cache = ResultCache(directory=config.get("cache", "directory", fallback="cache"),
+                            max_size=parse_memory_size(max_size) if max_size else None)
+    if cache is None or not cache.fetch(simulator=simulator, directory=directory):
+        # Perform simulation
+        print(f"Initiating {simulator.simulator_name} simulation of {simulator.model_name} model with "
+              f"{simulator.number_of_paths} paths, final time={simulator.final_time} and "
+              f"discretisation parameter n={simulator.discretisation_parameter}.")
+        simulator.sim(directory=directory, resume=resume)
+        if cache is not None:
+            cache.store(simulator=simulator, directory=directory)
 
-    print(f"{simulator_name} simulation of {model_name} model complete.")
+        print(f"{simulator.simulator_name} simulation of {simulator.model_name} model complete.")
+    # Analyse samples in process, in memory if the run was not chunked
+    if analysis_params is not None:
+        run_analysis(analysis_params=analysis_params, directories=simulator.get_scenario_directories(directory),
+                     samples=simulator.samples, weights=simulator.sample_weights)
 
 
 if __name__ == "__main__":
+    usage = "Usage: python run.py <config_path> [--resume] [--shard <shard_index>/<shard_count>]"
     if len(sys.argv) < 2:
-        raise ValueError("Usage: python run.py <directory> <config_path>")
+        raise ValueError(usage)
     config_path = sys.argv[1]
-    main(config_path=config_path)
+    shard = None
+    if '--shard' in sys.argv[2:]:
+        shard_index = sys.argv.index('--shard') + 1
+        if shard_index >= len(sys.argv) or sys.argv[shard_index].count('/') != 1:
+            raise ValueError(usage)
+        shard = tuple(int(value) for value in sys.argv[shard_index].split('/'))
+    main(config_path=config_path, resume='--resume' in sys.argv[2:], shard=shard)
@@ -0,0 +1,160 @@
+import sys
+import numpy as np
+from scipy.special import ndtr
+
+# Greeks computed by black_scholes_greeks
+GREEKS = ['price', 'delta', 'gamma', 'vega', 'theta', 'rho', 'vanna', 'volga']
+
+
+def get_black_scholes_terms(stock_price, strike, maturity, risk_free_rate, sigma, q=0.0, density=True):
+    """
+    Intermediate terms shared by Black-Scholes prices and Greeks, broadcast over array arguments: d1, d2, √T, σ√T,
+    the discounted strike, the dividend discounted stock price and the standard normal density at d1.
+
+    Parameters
+    ----------
+    stock_price : float or np.ndarray
+        Current stock price.
+    strike : float or np.ndarray
+        Option strike price.
+    maturity : float or np.ndarray
+        Time to maturity.
+    risk_free_rate : float or np.ndarray
+        Risk-free rate.
+    sigma : float or np.ndarray
+        Volatility of the underlying asset.
+    q : float or np.ndarray
+        Dividend yield.
+    density : bool
+        Compute the normal density, which is not required for prices.
+    """
+    stock_price, strike, maturity, sigma = (np.asarray(value, dtype=float) for value in
+                                            (stock_price, strike, maturity, sigma))
+    root_maturity = np.sqrt(maturity)
+    total_volatility = sigma * root_maturity
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = np.log(stock_price / strike)
+        d1 += (risk_free_rate - q) * maturity
+        d1 /= total_volatility
+        d1 += 0.5 * total_volatility
+    terms = {'d1': d1, 'd2': d1 - total_volatility, 'root_maturity': root_maturity,
+             'total_volatility': total_volatility, 'discounted_strike': strike * np.exp(-risk_free_rate * maturity),
+             'discounted_stock_price': stock_price * np.exp(-q * maturity) if np.any(q) else stock_price}
+    if density:
+        terms['density'] = np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi)
+    return terms
+
+
+def black_scholes_greeks(stock_price, strike, maturity, risk_free_rate, sigma, q=0.0, option_type='call', greeks=None):
+    """
+    Black-Scholes price and Greeks of European calls or puts, broadcast over array arguments so that a whole surface
+    is evaluated in one pass. Shared terms are computed once and the normal distribution function is evaluated with
+    the ndtr ufunc. theta is the derivative with respect to calendar time, i.e. minus the maturity derivative, vanna
+    is ∂²V/∂S∂σ and volga is ∂²V/∂σ².
+
+    Parameters
+    ----------
+    stock_price : float or np.ndarray
+        Current stock price.
+    strike : float or np.ndarray
+        Option strike price.
+    maturity : float or np.ndarray
+        Time to maturity.
+    risk_free_rate : float or np.ndarray
+        Risk-free rate.
+    sigma : float or np.ndarray
+        Volatility of the underlying asset.
+    q : float or np.ndarray
+        Dividend yield.
+    option_type : str
+        'call' or 'put'.
+    greeks : list
+        Greeks to compute, from GREEKS. All if not provided.
+
+    Returns
+    -------
+    dict
+        Array of each requested Greek with the broadcast shape of the arguments.
+    """
+    if option_type not in ('call', 'put'):
+        raise ValueError(f"option_type must be 'call' or 'put'. Provided: {option_type}")
+    greeks = GREEKS if greeks is None else greeks
+    unknown_greeks = [greek for greek in greeks if greek not in GREEKS]
+    if unknown_greeks:
+        raise ValueError(f'Greeks {unknown_greeks} not found. Available: {GREEKS}')
+    terms = get_black_scholes_terms(stock_price=stock_price, strike=strike, maturity=maturity,
+                                    risk_free_rate=risk_free_rate, sigma=sigma, q=q, density=set(greeks) != {'price'})
+    sign = 1 if option_type == 'call' else -1
+    d1, d2, density = terms['d1'], terms['d2'], terms.get('density')
+    discounted_stock_price, discounted_strike = terms['discounted_stock_price'], terms['discounted_strike']
+    # N(±d1) and N(±d2), with the sign of the option type, so that put tails are not lost to cancellation
+    probabilities = {}
+    if {'price', 'delta', 'theta'} & set(greeks):
+        probabilities['d1'] = ndtr(sign * d1)
+    if {'price', 'theta', 'rho'} & set(greeks):
+        probabilities['d2'] = ndtr(sign * d2)
+    results = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vega = None if density is None else discounted_stock_price * density * terms['root_maturity']
+        for greek in greeks:
+            if greek == 'price':
+                results[greek] = sign * (discounted_stock_price * probabilities['d1']
+                                         - discounted_strike * probabilities['d2'])
+            elif greek == 'delta':
+                results[greek] = sign * discounted_stock_price / np.asarray(stock_price) * probabilities['d1']
+            elif greek == 'gamma':
+                results[greek] = discounted_stock_price * density / (np.asarray(stock_price) ** 2
+                                                                     * terms['total_volatility'])
+            elif greek == 'vega':
+                results[greek] = vega
+            elif greek == 'theta':
+                results[greek] = (-0.5 * vega * sigma / terms['root_maturity'] ** 2
+                                  + sign * (q * discounted_stock_price * probabilities['d1']
+                                            - risk_free_rate * discounted_strike * probabilities['d2']))
+            elif greek == 'rho':
+                results[greek] = sign * maturity * discounted_strike * probabilities['d2']
+            elif greek == 'vanna':
+                results[greek] = -discounted_stock_price / np.asarray(stock_price) * density * d2 / sigma
+            elif greek == 'volga':
+                results[greek] = vega * d1 * d2 / sigma
+    return results
+
+
+def black_scholes_price(stock_price, strike, maturity, risk_free_rate, sigma, q=0.0, option_type='call'):
+    """
+    Black-Scholes price of European calls or puts, broadcast over array arguments.
+
+    Parameters
+    ----------
+    stock_price : float or np.ndarray
+        Current stock price.
+    strike : float or np.ndarray
+        Option strike price.
+    maturity : float or np.ndarray
+        Time to maturity.
+    risk_free_rate : float or np.ndarray
+        Risk-free rate.
+    sigma : float or np.ndarray
+        Volatility of the underlying asset.
+    q : float or np.ndarray
+        Dividend yield.
+    option_type : str
+        'call' or 'put'.
+    """
+    return black_scholes_greeks(stock_price=stock_price, strike=strike, maturity=maturity,
+                                risk_free_rate=risk_free_rate, sigma=sigma, q=q, option_type=option_type,
+                                greeks=['price'])['price']
+
+
+if __name__ == "__main__":
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) < 5:
+        raise ValueError("Usage: python black_scholes_analytics.py <stock_price> <strike> <maturity> "
+                         "<risk_free_rate> <sigma> [<q>] [--put]")
+    results = black_scholes_greeks(stock_price=float(args[0]), strike=float(args[1]), maturity=float(args[2]),
+                                   risk_free_rate=float(args[3]), sigma=float(args[4]),
+                                   q=float(args[5]) if len(args) > 5 else 0.0,
+                                   option_type='put' if '--put' in flags else 'call')
+    for greek, value in results.items():
+        print(f'{greek}: {float(value):.6f}')
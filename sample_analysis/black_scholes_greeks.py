@@ -1,6 +1,4 @@
-import sys
-import numpy as np
-from scipy.stats import norm
+from black_scholes_analytics import black_scholes_greeks
 
 
 def black_scholes_vega(stock_price, strike, maturity, risk_free_rate, sigma, q=0.0):
@@ -22,6 +20,6 @@ def black_scholes_vega(stock_price, strike, maturity, risk_free_rate, sigma, q=0
     q : float
         Dividend yield.
     """
-    d1 = (np.log(stock_price / strike) + (risk_free_rate - q + 0.5 * sigma ** 2) * maturity) / (sigma * np.sqrt(maturity))
-    return stock_price * norm.pdf(d1) * np.sqrt(maturity)
+    return black_scholes_greeks(stock_price=stock_price, strike=strike, maturity=maturity,
+                                risk_free_rate=risk_free_rate, sigma=sigma, q=q, greeks=['vega'])['vega']
 
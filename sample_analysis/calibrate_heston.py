@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import configparser
+import numpy as np
+from scipy.optimize import least_squares
+from price_call_heston import HestonPricer
+from price_call_black_scholes import price_call_black_scholes
+from black_scholes_greeks import black_scholes_vega
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.build_utils import parse_value
+from utils.sim_utils import timer
+
+CALIBRATED_PARAMS = ['lmbda', 'sigma', 'xi', 'rho']
+LOWER_BOUNDS = [1e-3, 1e-3, 1e-3, -0.999]
+UPPER_BOUNDS = [20.0, 2.0, 5.0, 0.999]
+
+
+@timer
+def calibrate_heston(market_data_path, config_path, output_config_path=None):
+    """
+    Calibrate Heston model parameters lmbda, sigma, xi and rho to a market implied volatility surface by minimising
+    the vega-weighted difference between semi-analytic Heston and market call prices. Weighting each price residual
+    by the inverse Black-Scholes vega makes the objective approximately the implied volatility error. The initial
+    guess, stock price, initial variance and risk-free rate are read from config_path and a copy of the config
+    containing the calibrated parameters is written, ready to pass to run.py.
+
+    Parameters
+    ----------
+    market_data_path : str
+        Path to json file containing 'strikes', 'maturities' and 'implied_volatilities', the latter with shape
+        (maturities, strikes). Missing quotes may be given as null.
+    config_path : str
+        Path to Heston config file.
+    output_config_path : str
+        Path to write calibrated config file to. Defaults to config_path with a '_calibrated' suffix.
+    """
+    with open(market_data_path, 'r') as f:
+        market_data = json.load(f)
+    strikes = np.asarray(market_data['strikes'], dtype=float)
+    maturities = np.asarray(market_data['maturities'], dtype=float)
+    market_vols = np.asarray(market_data['implied_volatilities'], dtype=float)
+    if market_vols.shape != (len(maturities), len(strikes)):
+        raise ValueError(f'implied_volatilities must have shape (maturities, strikes) = '
+                         f'{(len(maturities), len(strikes))}. Provided: {market_vols.shape}')
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    if config.get("run", "model_name") != 'Heston':
+        raise ValueError(f'Calibration requires a Heston config. Provided: {config.get("run", "model_name")}')
+    model_params = {key: parse_value(config.get("model_params", key)) for key in config.options("model_params")}
+    stock_price, initial_variance = parse_value(config.get("simulation", "initial_value"))
+    risk_free_rate = model_params['risk_free_rate']
+    # Market prices and vega weights on the quoted part of the surface
+    quoted = ~np.isnan(market_vols)
+    maturity_grid, strike_grid = np.meshgrid(maturities, strikes, indexing='ij')
+    market_prices = price_call_black_scholes(stock_price=stock_price, strike=strike_grid[quoted],
+                                             maturity=maturity_grid[quoted], risk_free_rate=risk_free_rate,
+                                             sigma=market_vols[quoted])
+    vegas = black_scholes_vega(stock_price=stock_price, strike=strike_grid[quoted], maturity=maturity_grid[quoted],
+                               risk_free_rate=risk_free_rate, sigma=market_vols[quoted])
+    weights = 1 / np.maximum(vegas, 1e-8)
+    pricer = HestonPricer(stock_price=stock_price, strikes=strikes, maturities=maturities,
+                          risk_free_rate=risk_free_rate, initial_variance=initial_variance)
+
+    def residuals(x):
+        model_prices = pricer.price(*x)
+        return (model_prices[quoted] - market_prices) * weights
+
+    initial_guess = np.clip([model_params[param] for param in CALIBRATED_PARAMS], LOWER_BOUNDS, UPPER_BOUNDS)
+    result = least_squares(residuals, initial_guess, bounds=(LOWER_BOUNDS, UPPER_BOUNDS), method='trf',
+                           x_scale='jac')
+    calibrated_params = dict(zip(CALIBRATED_PARAMS, result.x.tolist()))
+    rmse = np.sqrt(np.mean(result.fun ** 2))
+    print(f'Heston calibration {"converged" if result.success else "failed"} after {result.nfev} evaluations. '
+          f'Implied volatility RMSE ~ {rmse:.2e}')
+    print(', '.join(f'{key}={value:.4f}' for key, value in calibrated_params.items()))
+    # Write ready-to-run config
+    if output_config_path is None:
+        root, ext = os.path.splitext(config_path)
+        output_config_path = f'{root}_calibrated{ext}'
+    for key, value in calibrated_params.items():
+        config.set("model_params", key, f'{value:.8g}')
+    if config.has_option("output", "output_directory"):
+        config.set("output", "output_directory", config.get("output", "output_directory").rstrip('/') + '_calibrated')
+    with open(output_config_path, 'w') as f:
+        config.write(f)
+    print(f"{output_config_path} saved.")
+
+    return calibrated_params, rmse
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        raise ValueError("Usage: python calibrate_heston.py <market_data_path> <config_path> [<output_config_path>]")
+    market_data_path = sys.argv[1]
+    config_path = sys.argv[2]
+    output_config_path = sys.argv[3] if len(sys.argv) > 3 else None
+    calibrate_heston(market_data_path=market_data_path, config_path=config_path,
+                     output_config_path=output_config_path)
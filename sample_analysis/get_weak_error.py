@@ -2,6 +2,9 @@ import os
 import sys
 import json
 import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.build_utils import parse_test_function
+from utils.data_utils import read_samples, read_weights
 
 
 def get_weak_error(directory, time_value, test_function=lambda x: x):
@@ -14,30 +17,31 @@ def get_weak_error(directory, time_value, test_function=lambda x: x):
         Path to directory containing simulation data.
     time_value : float
         Point in time to evaluate the weak error.
-    test_function : callable
-        Function to evaluate weak error.
+    test_function : callable or str
+        Vectorized function, or expression in x e.g. "x ** 2", to evaluate weak error.
     """
+    test_function = parse_test_function(test_function)
     params_file_path = os.path.join(directory, 'params.json')
     with open(params_file_path, 'r') as f:
         params = json.load(f)
     model_name = params['model_name']
     if "BlackScholes" not in model_name:
         raise ValueError(f"Weak error can only be computed for BlackScholes model simulations. Provided: {model_name}")
-    samples_file_path = os.path.join(directory, "samples.npy")
-    samples = np.load(samples_file_path, allow_pickle=True).item()
+    samples = read_samples(directory)
     time_values = samples["time"]
     time_value_idx = np.searchsorted(time_values, time_value)
     del samples["time"]
     samples = samples['price']
     initial_value = params["initial_value"][0]
     drift = params["model_params"]["risk_free_rate"] - params["model_params"]["q"]
-
-    expected_xt = initial_value * np.exp(drift * time_value)
-    expected_test_function = test_function(expected_xt)
+    sigma = params["model_params"]["sigma"]
+    # X_t is lognormal so E[f(X_t)] is computed with Gauss-Hermite quadrature over the driving Gaussian
+    nodes, weights = np.polynomial.hermite_e.hermegauss(100)
+    expected_xt = initial_value * np.exp((drift - 0.5 * sigma ** 2) * time_value + sigma * np.sqrt(time_value) * nodes)
+    expected_test_function = np.sum(weights * test_function(expected_xt)) / np.sqrt(2 * np.pi)
 
     sample_at_time_value = samples[:, time_value_idx]
-    test_function_output = [test_function(x) for x in sample_at_time_value]
-    agg_test_function_output = np.mean(test_function_output)
+    agg_test_function_output = np.average(test_function(sample_at_time_value), weights=read_weights(directory))
 
     weak_error = abs(agg_test_function_output - expected_test_function)
 
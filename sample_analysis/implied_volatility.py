@@ -8,7 +8,8 @@ from price_call_black_scholes import price_call_black_scholes
 from black_scholes_greeks import black_scholes_vega
 
 
-def implied_volatility(directory, strike, maturity):
+def implied_volatility(directory, strike, maturity, samples=None, weights=None, params=None, call_price=None,
+                       call_price_error=None):
     """
     Compute implied volatility from option price and model parameters. Implied volatility is the global volatility
     assuming the process has been generated by a geometric Brownian motion.
@@ -21,10 +22,22 @@ def implied_volatility(directory, strike, maturity):
         Option strike price.
     maturity : float
         Option maturity.
+    samples : dict
+        Samples already in memory. Read from directory if not provided.
+    weights : np.ndarray
+        Likelihood ratio weights of samples already in memory.
+    params : dict
+        Contents of params.json already in memory. Read from directory if not provided.
+    call_price : float
+        Call price already computed by price_option, with its standard error call_price_error. Priced from the
+        samples if not provided.
+    call_price_error : float
+        Standard error of call_price.
     """
-    params_file_path = os.path.join(directory, "params.json")
-    with open(params_file_path, "r") as f:
-        params = json.load(f)
+    if params is None:
+        params_file_path = os.path.join(directory, "params.json")
+        with open(params_file_path, "r") as f:
+            params = json.load(f)
     if maturity > params['final_time'] or maturity < 0:
         raise ValueError(f'Maturity must be between 0 and simulated final time. \n'
                          f'Provided: maturity={maturity}, final_time={params["final_time"]}')
@@ -33,7 +46,9 @@ def implied_volatility(directory, strike, maturity):
     risk_free_rate = params['model_params']['risk_free_rate']
     q = params.get('model_params', {}).get('q', 0.0)
     stock_price = params['initial_value'][0]
-    call_price, call_price_error = price_option(directory=directory, strike=strike, maturity=maturity)
+    if call_price is None:
+        call_price, call_price_error = price_option(directory=directory, strike=strike, maturity=maturity,
+                                                     samples=samples, weights=weights, params=params)
     intrinsic_value = max(stock_price - strike * np.exp(-risk_free_rate * maturity), 0)
     if call_price <= intrinsic_value:
         print("Call price is below intrinsic value — invalid for implied volatility.")
@@ -5,10 +5,12 @@ import numpy as np
 from scipy.stats import lognorm
 import matplotlib.pyplot as plt
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils.data_utils import get_color_map
+from utils.data_utils import get_color_map, read_samples, read_weights
+from utils.stats_utils import StreamingHistogram, StreamingQuantiles
 
 
-def plot_time_marginal_dist(directories, marginal_time, figsize=(12, 8)):
+def plot_time_marginal_dist(directories, marginal_time, figsize=(12, 8), streaming=False, kde=False, chunk_size=None,
+                            samples=None, weights=None):
     """
     Plot time marginal distribution of process from simulation data. Provides option to compare against
     analytical distribution to test for correct behaviour/convergence.
@@ -17,13 +19,27 @@ def plot_time_marginal_dist(directories, marginal_time, figsize=(12, 8)):
     ----------
     directories : list
         Path to directory containing simulation data.
-    marginal_time : float
-        Time at which to evaluate marginal distribution.
+    marginal_time : float or list
+        Time(s) at which to evaluate marginal distribution. One subplot is drawn per time.
     figsize : tuple
         Size of figure to be plotted.
+    streaming : bool
+        Accumulate histograms and approximate quantiles over chunks of paths read from memory-mapped samples, for all
+        marginal times in one pass, instead of loading the full marginals into memory.
+    kde : bool
+        Overlay a binned kernel density estimate. Requires streaming.
+    chunk_size : int
+        Number of paths read at once when streaming. Defaults to roughly 128MB of path data per chunk.
+    samples : list
+        Samples already in memory, one per directory. Read from each directory if not provided.
+    weights : list
+        Likelihood ratio weights of samples already in memory, one per directory. Histograms of samples simulated
+        with importance sampling are weighted.
     """
+    marginal_times = np.atleast_1d(np.asarray(marginal_time, dtype=float))
     num_directories = len(directories)
-    fig, ax = plt.subplots(1, 1, figsize=figsize)
+    fig, ax = plt.subplots(len(marginal_times), 1, figsize=(figsize[0], figsize[1] * len(marginal_times)))
+    ax = np.atleast_1d(ax)
     colors = get_color_map(num_directories)[0]
 
     for index, directory in enumerate(directories):
@@ -34,39 +50,78 @@ def plot_time_marginal_dist(directories, marginal_time, figsize=(12, 8)):
         model_name = params['model_name']
         final_time = params['final_time']
 
-        samples_path = os.path.join(directory, 'samples.npy')
-        samples = np.load(samples_path, allow_pickle=True).item()
-        time_values = samples["time"]
-        del samples["time"]
-        price = samples["price"]
+        if samples is None:
+            directory_samples, directory_weights = read_samples(directory), read_weights(directory)
+        else:
+            directory_samples, directory_weights = samples[index], None if weights is None else weights[index]
+        if streaming and directory_weights is not None:
+            raise ValueError(f'Streaming histograms of importance sampled paths are not supported. Plot {directory} '
+                             f'without streaming.')
+        time_values = directory_samples["time"]
+        price = directory_samples["price"]
+        number_of_paths = price.shape[0]
 
-        if marginal_time > time_values[-1]:
+        if np.any(marginal_times > time_values[-1]):
             raise ValueError('Time to evaluate marginal distribution must be less than or equal to final_time. '
                              f'Final_time {final_time}')
-        time_index = np.searchsorted(time_values, marginal_time)
-        marginal_prices = price[:, time_index]
-        threshold = np.percentile(marginal_prices, 98)
-        clipped_marginal_prices = marginal_prices[marginal_prices <= threshold]
-        ax.hist(clipped_marginal_prices, bins=100, density=True, color=colors[index], alpha=0.5, edgecolor='black',
-                label=f'Empirical\nModel: {model_name}\n{simulator_name}\n{len(marginal_prices)} paths')
+        time_indices = np.searchsorted(time_values, marginal_times)
+        label = f'Empirical\nModel: {model_name}\n{simulator_name}\n{number_of_paths} paths'
+        if streaming:
+            histograms = [StreamingHistogram() for _ in marginal_times]
+            sketches = [StreamingQuantiles() for _ in marginal_times]
+            if chunk_size is None:
+                chunk_size = max(1, 2 ** 27 // (8 * price.shape[1]))
+            for start in range(0, number_of_paths, chunk_size):
+                chunk = np.asarray(price[start:start + chunk_size][:, time_indices])
+                for time_index in range(len(marginal_times)):
+                    histograms[time_index].update(chunk[:, time_index])
+                    sketches[time_index].update(chunk[:, time_index])
+        for time_index, time_value in enumerate(marginal_times):
+            if streaming:
+                histogram, sketch = histograms[time_index], sketches[time_index]
+                threshold = sketch.quantile(0.98)
+                number_of_bins = max(int(np.searchsorted(histogram.edges, threshold)), 1)
+                clipped_count = histogram.counts[:number_of_bins].sum()
+                # Merge fine bins into roughly 100 plotted bins over the clipped range
+                merge_factor = max(number_of_bins // 100, 1)
+                plotted_bins = number_of_bins // merge_factor
+                plotted_counts = histogram.counts[:plotted_bins * merge_factor].reshape(plotted_bins, -1).sum(axis=1)
+                ax[time_index].stairs(plotted_counts / (clipped_count * merge_factor * histogram.bin_width),
+                                      histogram.edges[:plotted_bins * merge_factor + 1:merge_factor], fill=True,
+                                      color=colors[index], alpha=0.5, label=label)
+                if kde:
+                    ax[time_index].plot(histogram.centres[:number_of_bins],
+                                        histogram.kde()[:number_of_bins] * histogram.count / clipped_count,
+                                        color=colors[index], label=f'KDE\nModel: {model_name}')
+                x_min, x_max = sketch.minimum, sketch.maximum
+            else:
+                marginal_prices = np.asarray(price[:, time_indices[time_index]])
+                threshold = np.percentile(marginal_prices, 98)
+                clipped = marginal_prices <= threshold
+                ax[time_index].hist(marginal_prices[clipped], bins=100, density=True, color=colors[index], alpha=0.5,
+                                    edgecolor='black', label=label,
+                                    weights=None if directory_weights is None else directory_weights[clipped])
+                x_min, x_max = min(marginal_prices), max(marginal_prices)
 
-        if model_name == 'BlackScholes':
-            initial_value = params['initial_value']
-            q = params['model_params']['q']
-            sigma = params['model_params']['sigma']
-            risk_free_rate = params['model_params']['risk_free_rate']
-            mean = np.log(initial_value) + ((risk_free_rate - q) - 0.5 * sigma ** 2) * marginal_time
-            variance = sigma ** 2 * marginal_time
-            lognorm_dist = lognorm(s=variance**0.5, scale=np.exp(mean))
-            x = np.linspace(min(marginal_prices), max(marginal_prices), 10000)
-            lognorm_pdf = lognorm_dist.pdf(x)
-            ax.plot(x, lognorm_pdf, color=colors[index], linestyle='--', label=f'Analytical\nModel: {model_name}')
+            if model_name == 'BlackScholes':
+                initial_value = params['initial_value']
+                q = params['model_params']['q']
+                sigma = params['model_params']['sigma']
+                risk_free_rate = params['model_params']['risk_free_rate']
+                mean = np.log(initial_value) + ((risk_free_rate - q) - 0.5 * sigma ** 2) * time_value
+                variance = sigma ** 2 * time_value
+                lognorm_dist = lognorm(s=variance**0.5, scale=np.exp(mean))
+                x = np.linspace(x_min, x_max, 10000)
+                lognorm_pdf = lognorm_dist.pdf(x)
+                ax[time_index].plot(x, lognorm_pdf, color=colors[index], linestyle='--',
+                                    label=f'Analytical\nModel: {model_name}')
 
-    ax.set_xlabel('Price')
-    ax.set_ylabel('Marginal PDF')
-    ax.set_title(f'Marginal distribution: Time={marginal_time:.2g}')
-    ax.grid(True, alpha=0.6)
-    ax.legend()
+    for time_index, time_value in enumerate(marginal_times):
+        ax[time_index].set_xlabel('Price')
+        ax[time_index].set_ylabel('Marginal PDF')
+        ax[time_index].set_title(f'Marginal distribution: Time={time_value:.2g}')
+        ax[time_index].grid(True, alpha=0.6)
+        ax[time_index].legend()
 
     for directory in directories:
         output_file = os.path.join(directory, "time_marginal_dist.png")
@@ -79,8 +134,12 @@ def plot_time_marginal_dist(directories, marginal_time, figsize=(12, 8)):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        raise ValueError("Usage: python plot_time_marginal_dist.py <directory1> [<directory2> ...] <marginal_time>")
-    *directories, marginal_time = sys.argv[1:]
-    marginal_time = float(marginal_time)
-    plot_time_marginal_dist(directories=directories, marginal_time=marginal_time)
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) < 2:
+        raise ValueError("Usage: python plot_time_marginal_dist.py <directory1> [<directory2> ...] "
+                         "<marginal_time>[,<marginal_time2>,...] [--streaming] [--kde]")
+    *directories, marginal_time = args
+    marginal_time = [float(time_value) for time_value in marginal_time.split(',')]
+    plot_time_marginal_dist(directories=directories, marginal_time=marginal_time, streaming='--streaming' in flags,
+                            kde='--kde' in flags)
@@ -2,9 +2,13 @@ import os
 import sys
 import numpy as np
 import matplotlib.pyplot as plt
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.data_utils import read_samples
+from utils.plot_utils import lttb_downsample, streaming_percentile_bands
 
 
-def plot_trajectory(directory, figsize=(14, 10)):
+def plot_trajectory(directory, figsize=(14, 10), mode='full', number_of_paths=20, number_of_points=1000,
+                    percentiles=(5, 25, 50, 75, 95), seed=None, samples=None):
     """
     Plot state trajectories from simulation data.
 
@@ -14,22 +18,58 @@ def plot_trajectory(directory, figsize=(14, 10)):
         Path to directory containing simulation data.
     figsize : tuple
         Size of figure to be plotted.
+    mode : str
+        'full' plots every path at full resolution. 'summary' plots number_of_paths randomly sampled paths downsampled
+        to number_of_points with LTTB, over percentile bands computed across all paths, so that the cost of the plot
+        does not grow with the size of the run.
+    number_of_paths : int
+        Number of sampled paths plotted in summary mode.
+    number_of_points : int
+        Number of time points per curve in summary mode.
+    percentiles : tuple
+        Percentiles of the bands plotted in summary mode, symmetric about the median.
+    seed : int
+        Seed for sampling paths in summary mode.
+    samples : dict
+        Samples already in memory. Read from directory if not provided.
     """
-    samples_file_path = os.path.join(directory, "samples.npy")
-    samples = np.load(samples_file_path, allow_pickle=True).item()
-    time_values = samples["time"]
-    del samples["time"]
+    if mode not in ('full', 'summary'):
+        raise ValueError(f"mode must be 'full' or 'summary'. Provided: {mode}")
+    samples = dict(read_samples(directory) if samples is None else samples)
+    time_values = samples.pop("time")
     dim = len(samples)
     # Create figure
     fig, ax = plt.subplots(dim, 1, figsize=figsize)
     ax = np.atleast_1d(ax)
     cmap = plt.get_cmap('tab10')
+    if mode == 'summary':
+        total_paths = next(iter(samples.values())).shape[0]
+        rng = np.random.default_rng(seed)
+        path_indices = np.sort(rng.choice(total_paths, size=min(number_of_paths, total_paths), replace=False))
+        pilot_indices = np.sort(rng.choice(total_paths, size=min(1000, total_paths), replace=False))
+        time_indices = np.unique(np.linspace(0, len(time_values) - 1, number_of_points).astype(int))
     # Plot samples
     for component_index, state_component in enumerate(samples.keys()):
         sample = samples[state_component]
-        for path_index, path in enumerate(sample):
-            color = cmap(path_index % 10)
-            ax[component_index].plot(time_values, path, lw=1.5, color=color, alpha=0.5)
+        if mode == 'full':
+            for path_index, path in enumerate(sample):
+                color = cmap(path_index % 10)
+                ax[component_index].plot(time_values, path, lw=1.5, color=color, alpha=0.5)
+        else:
+            bands = streaming_percentile_bands(column=sample, time_indices=time_indices, percentiles=percentiles,
+                                               pilot_rows=np.asarray(sample[pilot_indices][:, time_indices]))
+            for band_index in range(len(percentiles) // 2):
+                ax[component_index].fill_between(time_values[time_indices], bands[band_index], bands[-band_index - 1],
+                                                 color='grey', alpha=0.2, lw=0,
+                                                 label=f'{percentiles[band_index]}-{percentiles[-band_index - 1]}%')
+            if len(percentiles) % 2:
+                ax[component_index].plot(time_values[time_indices], bands[len(percentiles) // 2], color='black',
+                                         lw=1.5, label='Median')
+            for path_index, path in enumerate(path_indices):
+                color = cmap(path_index % 10)
+                ax[component_index].plot(*lttb_downsample(time_values, np.asarray(sample[path]), number_of_points),
+                                         lw=1.0, color=color, alpha=0.5)
+            ax[component_index].legend(loc='upper left', fontsize=12)
         ax[component_index].set_ylabel(state_component.capitalize(), fontsize=18)
         ax[component_index].tick_params(axis='both', which='major', labelsize=14)
         ax[component_index].grid(True, linestyle='--', linewidth=0.8, alpha=0.7)
@@ -48,5 +88,5 @@ def plot_trajectory(directory, figsize=(14, 10)):
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        raise ValueError("Usage: python plot_trajectory.py <directory>")
-    plot_trajectory(sys.argv[1])
+        raise ValueError("Usage: python plot_trajectory.py <directory> [full|summary]")
+    plot_trajectory(sys.argv[1], mode=sys.argv[2] if len(sys.argv) > 2 else 'full')
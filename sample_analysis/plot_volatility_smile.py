@@ -5,10 +5,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 from implied_volatility import implied_volatility
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils.data_utils import get_color_map
+from utils.data_utils import get_color_map, read_samples, read_weights
 
 
-def plot_volatility_smile(directories, low_strike, high_strike, maturity, figsize=(12, 8)):
+def plot_volatility_smile(directories, low_strike, high_strike, maturity, figsize=(12, 8), samples=None,
+                          weights=None):
     """
     Plot implied volatility as a function of strike price from simulation data.
 
@@ -24,6 +25,10 @@ def plot_volatility_smile(directories, low_strike, high_strike, maturity, figsiz
         Maturity of output.
     figsize : tuple
         Size of figure to be plotted.
+    samples : list
+        Samples already in memory, one per directory. Read once per directory if not provided.
+    weights : list
+        Likelihood ratio weights of samples already in memory, one per directory.
     """
     num_directories = len(directories)
     fig, ax = plt.subplots(1, 1, figsize=figsize)
@@ -36,7 +41,13 @@ def plot_volatility_smile(directories, low_strike, high_strike, maturity, figsiz
             params = json.load(f)
         simulator_name = params['simulator_name']
         model_name = params['model_name']
-        implied_volatility_results = [implied_volatility(directory=directory, strike=strike, maturity=maturity)
+        if samples is None:
+            directory_samples, directory_weights = read_samples(directory), read_weights(directory)
+        else:
+            directory_samples, directory_weights = samples[index], None if weights is None else weights[index]
+        implied_volatility_results = [implied_volatility(directory=directory, strike=strike, maturity=maturity,
+                                                         samples=directory_samples, weights=directory_weights,
+                                                         params=params)
                                       for strike in strikes]
         implied_volatilities, implied_volatility_errors = list(zip(*implied_volatility_results))
         implied_volatilities, implied_volatility_errors = (np.array(implied_volatilities, dtype=float),
@@ -0,0 +1,229 @@
+import os
+import sys
+import itertools
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.data_utils import read_json, read_samples, read_weights
+
+
+def get_basis(regressors, basis='laguerre', degree=3):
+    """
+    Regression design matrix with one column per product of basis polynomials in the regressors of total degree at most
+    degree.
+
+    Parameters
+    ----------
+    regressors : list
+        Scaled regressors, each an array with shape (paths,).
+    basis : str
+        'polynomial' for monomials or 'laguerre' for Laguerre polynomials.
+    degree : int
+        Maximum total degree.
+    """
+    polynomials = []
+    for regressor in regressors:
+        if basis == 'polynomial':
+            polynomials.append([regressor ** power for power in range(degree + 1)])
+        elif basis == 'laguerre':
+            laguerre = [np.ones_like(regressor), 1 - regressor]
+            for order in range(2, degree + 1):
+                laguerre.append(((2 * order - 1 - regressor) * laguerre[-1] - (order - 1) * laguerre[-2]) / order)
+            polynomials.append(laguerre[:degree + 1])
+        else:
+            raise ValueError(f"basis must be 'polynomial' or 'laguerre'. Provided: {basis}")
+    columns = [np.prod([polynomials[index][power] for index, power in enumerate(powers)], axis=0)
+               for powers in itertools.product(range(degree + 1), repeat=len(regressors)) if sum(powers) <= degree]
+    return np.stack(columns, axis=1)
+
+
+def read_exercise_date(samples, component, time_index, start=0, stop=None, chunk_size=None):
+    """
+    Samples of a component at one time index for paths start to stop with shape (paths,). Memory-mapped columns are
+    read in chunks of paths, so that only the selected time of each path is read and the path set is never copied.
+
+    Parameters
+    ----------
+    samples : dict
+        Simulation samples, typically memory-mapped.
+    component : str
+        State component to read.
+    time_index : int
+        Time index of the exercise date.
+    start : int
+        First path read.
+    stop : int
+        Path after the last read. Defaults to the number of paths.
+    chunk_size : int
+        Number of paths read at once. Defaults to 2 ** 20 paths.
+    """
+    column = samples[component]
+    stop = column.shape[0] if stop is None else stop
+    if isinstance(column, np.ndarray) and not isinstance(column, np.memmap):
+        return column[start:stop, time_index]
+    chunk_size = chunk_size or 2 ** 20
+    values = np.empty(stop - start)
+    for chunk_start in range(start, stop, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, stop)
+        values[chunk_start - start:chunk_stop - start] = column[chunk_start:chunk_stop, time_index]
+    return values
+
+
+def price_american_option(directory, strike, maturity=None, option_type='put', exercise_times=None, basis='laguerre',
+                          degree=3, lower_bound=False, samples=None, weights=None, chunk_size=None):
+    """
+    Price an American or Bermudan option with the Longstaff-Schwartz least-squares Monte Carlo method. At each exercise
+    date, from the last backwards, the discounted cashflows of all in-the-money paths are regressed on a polynomial or
+    Laguerre basis in the price, and the variance for stochastic volatility models, in one batched least-squares
+    solve, and paths exercise where the payoff exceeds the fitted continuation value. The induction reads the samples
+    at one exercise date at a time from the sample columns and holds only the cashflow of each path, so memory is
+    linear in the number of paths and the path set is never copied.
+
+    With lower_bound the regression is fitted on the first half of the paths and the resulting exercise policy is
+    applied out of sample to the second half, giving a low-biased estimate which, with the in-sample estimate, brackets
+    the price. Samples simulated with importance sampling are weighted by their likelihood ratios in the regressions
+    and when averaging.
+
+    Parameters
+    ----------
+    directory : str
+        Path to directory containing simulation data.
+    strike : float
+        Option strike price.
+    maturity : float
+        Option maturity. Defaults to final_time.
+    option_type : str
+        'put' or 'call'.
+    exercise_times : list
+        Exercise dates of a Bermudan option, rounded up to the time grid. American exercise, at every time point up to
+        maturity, if not provided.
+    basis : str
+        'laguerre' or 'polynomial'.
+    degree : int
+        Maximum total degree of the regression basis.
+    lower_bound : bool
+        Also compute the out-of-sample lower bound.
+    samples : dict
+        Samples already in memory. Read from directory if not provided.
+    weights : np.ndarray
+        Likelihood ratio weights of samples already in memory. Read from directory with the samples.
+    chunk_size : int
+        Number of paths read at once from memory-mapped samples.
+
+    Returns
+    -------
+    tuple
+        Price, standard error, and the lower bound and its standard error (None unless lower_bound).
+    """
+    params = read_json(os.path.join(directory, 'params.json'))
+    if samples is None:
+        samples = read_samples(directory)
+        weights = read_weights(directory)
+    if option_type not in ('put', 'call'):
+        raise ValueError(f"option_type must be 'put' or 'call'. Provided: {option_type}")
+    if strike <= 0:
+        raise ValueError(f'Strike price must be positive. Provided: {strike}')
+    maturity = params['final_time'] if maturity is None else maturity
+    if maturity > params['final_time'] or maturity <= 0:
+        raise ValueError(f'Maturity must be between 0 and simulated final time. \n'
+                         f'Provided: maturity={maturity}, final_time={params["final_time"]}')
+    time_values = np.asarray(samples['time'])
+    maturity_idx = int(np.searchsorted(time_values, maturity))
+    if exercise_times is None:
+        exercise_indices = np.arange(1, maturity_idx + 1)
+    else:
+        exercise_indices = np.unique(np.append(np.searchsorted(time_values, np.asarray(exercise_times, dtype=float)),
+                                               maturity_idx))
+        exercise_indices = exercise_indices[(exercise_indices > 0) & (exercise_indices <= maturity_idx)]
+    exercise_dates = time_values[exercise_indices]
+    risk_free_rate = params['model_params']['risk_free_rate']
+    sign = 1 if option_type == 'call' else -1
+    number_of_paths = samples['price'].shape[0]
+    training_paths = number_of_paths // 2 if lower_bound else number_of_paths
+    # Regressors scaled to order one: price over strike and variance over its mean over the training paths at each date
+    components = [component for component in ['price', 'volatility'] if component in samples]
+    scales = {'price': np.full(len(exercise_dates), float(strike))}
+    if 'volatility' in components:
+        scales['volatility'] = np.ones(len(exercise_dates))
+
+    def read_date(date_index, start, stop):
+        date_samples = {component: read_exercise_date(samples=samples, component=component,
+                                                      time_index=exercise_indices[date_index], start=start, stop=stop,
+                                                      chunk_size=chunk_size) for component in components}
+        return date_samples, np.maximum(sign * (date_samples['price'] - strike), 0)
+
+    def get_regressors(date_samples, date_index, paths):
+        return [date_samples[component][paths] / scales[component][date_index] for component in components]
+
+    # Backward induction on the training paths one date at a time, holding only the discounted cashflow of each path
+    # and storing the regression coefficients of each date
+    values = read_date(len(exercise_dates) - 1, 0, training_paths)[1].copy()
+    coefficients = [None] * len(exercise_dates)
+    for date_index in range(len(exercise_dates) - 2, -1, -1):
+        values *= np.exp(-risk_free_rate * (exercise_dates[date_index + 1] - exercise_dates[date_index]))
+        date_samples, payoffs = read_date(date_index, 0, training_paths)
+        if 'volatility' in components:
+            scales['volatility'][date_index] = max(np.mean(np.abs(date_samples['volatility'])), 1e-12)
+        in_the_money = np.flatnonzero(payoffs > 0)
+        if len(in_the_money) == 0:
+            continue
+        design = get_basis(get_regressors(date_samples, date_index, in_the_money), basis=basis, degree=degree)
+        # Least squares weighted by likelihood ratios projects under the pricing measure
+        root_weights = np.ones(len(in_the_money)) if weights is None else np.sqrt(weights[in_the_money])
+        coefficients[date_index] = np.linalg.lstsq(root_weights[:, None] * design,
+                                                   root_weights * values[in_the_money], rcond=None)[0]
+        exercise = payoffs[in_the_money] > design @ coefficients[date_index]
+        values[in_the_money[exercise]] = payoffs[in_the_money[exercise]]
+    values *= np.exp(-risk_free_rate * exercise_dates[0])
+    intrinsic_value = max(sign * (params['initial_value'][0] - strike), 0)
+    price, price_error = weighted_mean(values, None if weights is None else weights[:training_paths])
+    price = max(price, intrinsic_value)
+    exercise_style = 'Bermudan' if exercise_times is not None else 'American'
+    print(f'{exercise_style} {option_type} (K={strike:.2f}, T={maturity:.2g}) price: {price:.4f} +- {price_error:.4f}')
+    if not lower_bound:
+        return price, price_error, None, None
+    # Apply the fitted exercise policy forwards on the held out paths, one date at a time
+    values = np.zeros(number_of_paths - training_paths)
+    alive = np.ones(number_of_paths - training_paths, dtype=bool)
+    for date_index, exercise_date in enumerate(exercise_dates):
+        if date_index < len(exercise_dates) - 1 and coefficients[date_index] is None:
+            continue
+        date_samples, payoffs = read_date(date_index, training_paths, number_of_paths)
+        candidates = np.flatnonzero(alive & (payoffs > 0))
+        if date_index == len(exercise_dates) - 1:
+            exercise_paths = candidates
+        elif len(candidates) == 0:
+            continue
+        else:
+            design = get_basis(get_regressors(date_samples, date_index, candidates), basis=basis, degree=degree)
+            exercise_paths = candidates[payoffs[candidates] > design @ coefficients[date_index]]
+        values[exercise_paths] = np.exp(-risk_free_rate * exercise_date) * payoffs[exercise_paths]
+        alive[exercise_paths] = False
+    lower_bound_price, lower_bound_error = weighted_mean(values, None if weights is None else weights[training_paths:])
+    lower_bound_price = max(lower_bound_price, intrinsic_value)
+    print(f'Out-of-sample lower bound: {lower_bound_price:.4f} +- {lower_bound_error:.4f}')
+    return price, price_error, lower_bound_price, lower_bound_error
+
+
+def weighted_mean(values, weights=None):
+    """
+    Monte Carlo mean and standard error of values, weighted by likelihood ratios if provided.
+    """
+    if weights is not None:
+        values = values * np.asarray(weights)
+    return np.mean(values), np.std(values) / np.sqrt(len(values))
+
+
+if __name__ == "__main__":
+    flags = dict(arg[2:].partition('=')[::2] for arg in sys.argv[1:] if arg.startswith('--'))
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) < 2:
+        raise ValueError("Usage: python price_american_option.py <directory> <strike> [<maturity>] [--call] "
+                         "[--exercise_times=<time1>,<time2>,...] [--basis=laguerre|polynomial] [--degree=<degree>] "
+                         "[--lower_bound]")
+    price_american_option(directory=args[0], strike=float(args[1]),
+                          maturity=float(args[2]) if len(args) > 2 else None,
+                          option_type='call' if 'call' in flags else 'put',
+                          exercise_times=[float(time_value) for time_value in flags['exercise_times'].split(',')]
+                          if 'exercise_times' in flags else None,
+                          basis=flags.get('basis', 'laguerre'), degree=int(flags.get('degree', 3)),
+                          lower_bound='lower_bound' in flags)
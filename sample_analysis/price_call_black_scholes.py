@@ -1,6 +1,5 @@
 import sys
-import numpy as np
-from scipy.stats import norm
+from black_scholes_analytics import black_scholes_price
 
 
 def price_call_black_scholes(stock_price, strike, maturity, risk_free_rate, sigma, q=0.0):
@@ -21,10 +20,8 @@ def price_call_black_scholes(stock_price, strike, maturity, risk_free_rate, sigm
     sigma : float
         Volatility of the underlying asset.
     """
-    d1 = (np.log(stock_price / strike) + (risk_free_rate - q + 0.5 * sigma ** 2) * maturity) / (sigma * np.sqrt(maturity))
-    d2 = d1 - sigma * np.sqrt(maturity)
-    call_price = stock_price * norm.cdf(d1) - strike * np.exp(-risk_free_rate * maturity) * norm.cdf(d2)
-    return call_price
+    return black_scholes_price(stock_price=stock_price, strike=strike, maturity=maturity,
+                               risk_free_rate=risk_free_rate, sigma=sigma, q=q)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+import sys
+import numpy as np
+
+
+class HestonPricer:
+    """
+    Semi-analytic Heston call pricer for a fixed strike x maturity grid. Prices are computed with the Lewis (2001)
+    single-integral formula
+
+        C(K, T) = S - √(S K) e^{-rT/2} / π ∫₀^∞ Re[e^{-iuk} φ_T(u - i/2)] / (u² + 1/4) du,    k = ln(K / F_T)
+
+    where φ_T is the characteristic function of ln(S_T / F_T), evaluated in the numerically stable form of
+    Albrecher et al. (2007). The integral is approximated with Gauss-Legendre quadrature on [0, upper_limit].
+    Everything that does not depend on the model parameters (quadrature nodes, the strike kernel
+    e^{-iuk} / (u² + 1/4) and the prefactors) is computed once on construction, so repeated pricing e.g. inside a
+    calibration only evaluates φ_T once per maturity and quadrature node, shared across all strikes.
+    """
+    def __init__(self, stock_price, strikes, maturities, risk_free_rate, initial_variance, number_of_nodes=256,
+                 upper_limit=200.0):
+        """
+        Parameters
+        ----------
+        stock_price : float
+            Current stock price.
+        strikes : array_like
+            Option strike prices.
+        maturities : array_like
+            Option maturities.
+        risk_free_rate : float
+            Risk-free rate.
+        initial_variance : float
+            Initial instantaneous variance V_0.
+        number_of_nodes : int
+            Number of Gauss-Legendre quadrature nodes.
+        upper_limit : float
+            Truncation point of the Fourier integral.
+        """
+        self.stock_price = stock_price
+        self.strikes = np.atleast_1d(np.asarray(strikes, dtype=float))
+        self.maturities = np.atleast_1d(np.asarray(maturities, dtype=float))
+        self.risk_free_rate = risk_free_rate
+        self.initial_variance = initial_variance
+        if np.any(self.strikes <= 0):
+            raise ValueError(f'Strike prices must be positive. Provided: {self.strikes}')
+        if np.any(self.maturities <= 0):
+            raise ValueError(f'Maturities must be positive. Provided: {self.maturities}')
+        # Quadrature nodes shifted onto the Lewis integration contour
+        nodes, weights = np.polynomial.legendre.leggauss(number_of_nodes)
+        self.u = 0.5 * upper_limit * (nodes + 1)
+        self.z = self.u - 0.5j
+        weights = 0.5 * upper_limit * weights / (self.u ** 2 + 0.25)
+        # Parameter independent strike kernel with shape (maturities, strikes, nodes)
+        forward = stock_price * np.exp(risk_free_rate * self.maturities)
+        log_moneyness = np.log(self.strikes[None, :] / forward[:, None])
+        self.kernel = weights * np.exp(-1j * self.u * log_moneyness[..., None])
+        self.prefactor = (np.sqrt(stock_price * self.strikes[None, :])
+                          * np.exp(-0.5 * risk_free_rate * self.maturities[:, None]) / np.pi)
+
+    def characteristic_function(self, lmbda, sigma, xi, rho):
+        """
+        Evaluate the characteristic function of ln(S_T / F_T) at the quadrature nodes for every maturity.
+
+        Parameters
+        ----------
+        lmbda : float
+            Mean reversion rate.
+        sigma : float
+            Long-term standard deviation.
+        xi : float
+            Volatility of volatility.
+        rho : float
+            Brownian motion correlation.
+        """
+        z = self.z
+        # Maturity independent terms shared across the whole grid
+        beta = lmbda - 1j * rho * xi * z
+        d = np.sqrt(beta ** 2 + xi ** 2 * (1j * z + z ** 2))
+        g = (beta - d) / (beta + d)
+        exp_dt = np.exp(-d * self.maturities[:, None])
+        log_term = np.log((1 - g * exp_dt) / (1 - g))
+        variance_coefficient = (beta - d) / xi ** 2 * (1 - exp_dt) / (1 - g * exp_dt)
+        mean_coefficient = lmbda / xi ** 2 * ((beta - d) * self.maturities[:, None] - 2 * log_term)
+        return np.exp(mean_coefficient * sigma ** 2 + variance_coefficient * self.initial_variance)
+
+    def price(self, lmbda, sigma, xi, rho):
+        """
+        Price European calls on the full strike x maturity grid.
+
+        Parameters
+        ----------
+        lmbda : float
+            Mean reversion rate.
+        sigma : float
+            Long-term standard deviation.
+        xi : float
+            Volatility of volatility.
+        rho : float
+            Brownian motion correlation.
+
+        Returns
+        -------
+        np.ndarray
+            Call prices with shape (maturities, strikes).
+        """
+        phi = self.characteristic_function(lmbda=lmbda, sigma=sigma, xi=xi, rho=rho)
+        integral = np.einsum('tku,tu->tk', self.kernel, phi).real
+        return self.stock_price - self.prefactor * integral
+
+
+def price_call_heston(stock_price, strike, maturity, risk_free_rate, initial_variance, lmbda, sigma, xi, rho):
+    """
+    Calculate the semi-analytic Heston call option price. Test numerically obtained option prices against the
+    Fourier solution or use to calibrate model parameters.
+
+    Parameters
+    ----------
+    stock_price : float
+        Current stock price.
+    strike : float or array_like
+        Option strike price(s).
+    maturity : float or array_like
+        Time(s) to maturity.
+    risk_free_rate : float
+        Risk-free rate.
+    initial_variance : float
+        Initial instantaneous variance V_0.
+    lmbda : float
+        Mean reversion rate.
+    sigma : float
+        Long-term standard deviation.
+    xi : float
+        Volatility of volatility.
+    rho : float
+        Brownian motion correlation.
+    """
+    pricer = HestonPricer(stock_price=stock_price, strikes=strike, maturities=maturity,
+                          risk_free_rate=risk_free_rate, initial_variance=initial_variance)
+    call_price = pricer.price(lmbda=lmbda, sigma=sigma, xi=xi, rho=rho)
+    if np.ndim(strike) == 0 and np.ndim(maturity) == 0:
+        return call_price.item()
+    return call_price
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 10:
+        raise ValueError("Usage: python price_call_heston.py <stock_price> <strike> <maturity> <risk_free_rate> "
+                         "<initial_variance> <lmbda> <sigma> <xi> <rho>")
+    stock_price, strike, maturity, risk_free_rate, initial_variance, lmbda, sigma, xi, rho = map(float, sys.argv[1:10])
+    call_price = price_call_heston(stock_price=stock_price, strike=strike, maturity=maturity,
+                                   risk_free_rate=risk_free_rate, initial_variance=initial_variance, lmbda=lmbda,
+                                   sigma=sigma, xi=xi, rho=rho)
+    print(f'Heston call (K={strike:.2f}, T={maturity:.2g}) price: {call_price:.4f}')
@@ -2,11 +2,16 @@ import os
 import sys
 import json
 import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.data_utils import read_samples, read_weights
+from utils.stats_utils import stratified_standard_error
 
 
-def price_option(directory, strike, maturity):
+def price_option(directory, strike, maturity, samples=None, weights=None, params=None):
     """
     Compute average price for European call option with strike price K and maturity T for given simulation samples.
+    Samples simulated with importance sampling are weighted by their likelihood ratios, and the standard error of
+    samples simulated with stratified sampling only reflects the variance within strata.
 
     Parameters
     ----------
@@ -16,14 +21,21 @@ def price_option(directory, strike, maturity):
         Option strike price.
     maturity : float
         Option maturity.
+    samples : dict
+        Samples already in memory, e.g. from the simulator in run.py. Read from directory if not provided.
+    weights : np.ndarray
+        Likelihood ratio weights of samples already in memory. Read from directory with the samples.
+    params : dict
+        Contents of params.json already in memory. Read from directory if not provided.
     """
-    samples_file_path = os.path.join(directory, "samples.npy")
-    samples = np.load(samples_file_path, allow_pickle=True).item()
+    if samples is None:
+        samples = read_samples(directory)
+        weights = read_weights(directory)
     time_values = samples["time"]
-    del samples["time"]
-    params_file_path = os.path.join(directory, "params.json")
-    with open(params_file_path, "r") as f:
-        params = json.load(f)
+    if params is None:
+        params_file_path = os.path.join(directory, "params.json")
+        with open(params_file_path, "r") as f:
+            params = json.load(f)
     if maturity > params['final_time'] or maturity < 0:
         raise ValueError(f'Maturity must be between 0 and simulated final time. \n'
                          f'Provided: maturity={maturity}, final_time={params["final_time"]}')
@@ -35,11 +47,16 @@ def price_option(directory, strike, maturity):
     maturity_idx = np.searchsorted(time_values, maturity)
     prices_at_maturity = price[:, maturity_idx]
     payoffs = np.maximum(prices_at_maturity - strike, 0)
+    if weights is not None:
+        payoffs = payoffs * weights
     discount_factor = np.exp(-risk_free_rate * maturity)
     call_price = discount_factor * np.mean(payoffs)
 
-    n = np.shape(price)[0]
-    call_price_error = discount_factor * np.std(payoffs) / np.sqrt(n)
+    n = price.shape[0]
+    if params.get('sampling') == 'stratified' and n % params['number_of_strata'] == 0:
+        call_price_error = discount_factor * stratified_standard_error(payoffs, params['number_of_strata'])
+    else:
+        call_price_error = discount_factor * np.std(payoffs) / np.sqrt(n)
 
     print(f'European call (K={strike:.2f}, T={maturity:.2g}) price: {call_price:.2f} +- {call_price_error:.2f}')
 
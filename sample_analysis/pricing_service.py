@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import asyncio
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from price_call_black_scholes import price_call_black_scholes
+from black_scholes_greeks import black_scholes_vega
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.data_utils import read_json, read_samples, read_weights
+
+
+class SampleSet:
+    """
+    Warm simulation samples of one output directory. The price column is kept memory-mapped, or in memory for
+    samples.npy, and the samples at each queried maturity are sorted once and stored with their cumulative sums, so
+    that the price and standard error of a European option at any strike follow from one binary search. Samples
+    simulated with importance sampling are weighted by their likelihood ratios.
+    """
+    def __init__(self, directory):
+        """
+        Parameters
+        ----------
+        directory : str
+            Path to directory containing simulation data.
+        """
+        self.directory = directory
+        self.params_mtime = os.path.getmtime(os.path.join(directory, 'params.json'))
+        self.params = read_json(os.path.join(directory, 'params.json'))
+        samples = read_samples(directory)
+        self.time_values = np.asarray(samples['time'])
+        self.price = samples['price']
+        self.weights = read_weights(directory)
+        self.risk_free_rate = self.params['model_params']['risk_free_rate']
+        self.q = self.params['model_params'].get('q', 0.0)
+        self.stock_price = self.params['initial_value'][0]
+        self.distributions = {}
+        self.lock = threading.Lock()
+
+    def get_distribution(self, maturity):
+        """
+        Sorted samples S at maturity, with weights w, and cumulative sums of w, wS, w², w²S and w²S², each with a
+        leading zero, stacked with shape (5, paths + 1).
+
+        Parameters
+        ----------
+        maturity : float
+            Option maturity.
+        """
+        if maturity > self.params['final_time'] or maturity < 0:
+            raise ValueError(f'Maturity must be between 0 and simulated final time. '
+                             f'Provided: maturity={maturity}, final_time={self.params["final_time"]}')
+        maturity_idx = int(np.searchsorted(self.time_values, maturity))
+        with self.lock:
+            if maturity_idx not in self.distributions:
+                samples = np.asarray(self.price[:, maturity_idx])
+                order = np.argsort(samples)
+                sorted_samples = samples[order]
+                weights = np.ones_like(sorted_samples) if self.weights is None else self.weights[order]
+                moments = np.stack([weights, weights * sorted_samples, weights ** 2, weights ** 2 * sorted_samples,
+                                    (weights * sorted_samples) ** 2])
+                self.distributions[maturity_idx] = (sorted_samples,
+                                                    np.concatenate([np.zeros((5, 1)), np.cumsum(moments, axis=1)],
+                                                                   axis=1))
+            return self.distributions[maturity_idx]
+
+    def price_options(self, strikes, maturities, option_type='call'):
+        """
+        Monte Carlo prices and standard errors of European options.
+
+        Parameters
+        ----------
+        strikes : np.ndarray
+            Option strikes, broadcast against maturities.
+        maturities : np.ndarray
+            Option maturities.
+        option_type : str
+            'call' or 'put'.
+        """
+        if option_type not in ('call', 'put'):
+            raise ValueError(f"option_type must be 'call' or 'put'. Provided: {option_type}")
+        strikes, maturities = np.broadcast_arrays(np.asarray(strikes, dtype=float), np.asarray(maturities, dtype=float))
+        if np.any(strikes < 0):
+            raise ValueError(f'Strike price must not be negative. Provided: {strikes[strikes < 0]}')
+        prices, price_errors = np.empty(strikes.shape), np.empty(strikes.shape)
+        for maturity in np.unique(maturities):
+            selected = maturities == maturity
+            sorted_samples, cumulative_moments = self.get_distribution(maturity)
+            number_of_paths = len(sorted_samples)
+            strike = strikes[selected]
+            # Sums of w, wS, w², w²S and w²S² over the paths in the money
+            if option_type == 'call':
+                index = np.searchsorted(sorted_samples, strike, side='right')
+                weight_sum, sample_sum, squared_weight_sum, squared_weight_sample_sum, sample_sum_of_squares = (
+                    cumulative_moments[:, -1:] - cumulative_moments[:, index])
+                payoff_sum = sample_sum - strike * weight_sum
+            else:
+                index = np.searchsorted(sorted_samples, strike, side='left')
+                weight_sum, sample_sum, squared_weight_sum, squared_weight_sample_sum, sample_sum_of_squares = (
+                    cumulative_moments[:, index])
+                payoff_sum = strike * weight_sum - sample_sum
+            payoff_sum_of_squares = (sample_sum_of_squares - 2 * strike * squared_weight_sample_sum
+                                     + strike ** 2 * squared_weight_sum)
+            mean = payoff_sum / number_of_paths
+            variance = np.maximum(payoff_sum_of_squares / number_of_paths - mean ** 2, 0)
+            discount_factor = np.exp(-self.risk_free_rate * maturity)
+            prices[selected] = discount_factor * mean
+            price_errors[selected] = discount_factor * np.sqrt(variance / number_of_paths)
+        return prices, price_errors
+
+    def implied_volatilities(self, strikes, maturities, lower=1e-6, upper=100.0, iterations=100):
+        """
+        Black-Scholes implied volatilities of call prices, solved for all strikes at once by bisection. Prices
+        below intrinsic value have no implied volatility and are returned as nan.
+
+        Parameters
+        ----------
+        strikes : np.ndarray
+            Option strikes, broadcast against maturities.
+        maturities : np.ndarray
+            Option maturities.
+        lower : float
+            Lower bound of implied volatility.
+        upper : float
+            Upper bound of implied volatility.
+        iterations : int
+            Number of bisection iterations.
+        """
+        strikes, maturities = np.broadcast_arrays(np.asarray(strikes, dtype=float), np.asarray(maturities, dtype=float))
+        call_prices, call_price_errors = self.price_options(strikes, maturities)
+        lower, upper = np.full(strikes.shape, lower), np.full(strikes.shape, upper)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for _ in range(iterations):
+                middle = 0.5 * (lower + upper)
+                above = price_call_black_scholes(stock_price=self.stock_price, strike=strikes, maturity=maturities,
+                                                 risk_free_rate=self.risk_free_rate, sigma=middle,
+                                                 q=self.q) > call_prices
+                upper, lower = np.where(above, middle, upper), np.where(above, lower, middle)
+            implied_vols = 0.5 * (lower + upper)
+            vegas = black_scholes_vega(stock_price=self.stock_price, strike=strikes, maturity=maturities,
+                                       risk_free_rate=self.risk_free_rate, sigma=implied_vols, q=self.q)
+            implied_vol_errors = call_price_errors / vegas
+        intrinsic_values = np.maximum(self.stock_price - strikes * np.exp(-self.risk_free_rate * maturities), 0)
+        invalid = call_prices <= intrinsic_values
+        implied_vols[invalid], implied_vol_errors[invalid] = np.nan, np.nan
+        return implied_vols, implied_vol_errors, call_prices, call_price_errors
+
+
+class PricingService:
+    """
+    Local asyncio pricing service answering JSON requests over HTTP on localhost or a Unix socket. Recently used
+    sample sets are kept warm in a least recently used store and reloaded when their params.json changes, and pricing
+    is run on a thread pool so that requests are served concurrently.
+
+    POST /price               {"directory", "strikes", "maturities", "option_type"}
+    POST /implied_volatility  {"directory", "strikes", "maturities"}
+    POST /surface             {"directory", "strikes", "maturities"} evaluated on the maturities x strikes grid
+    GET  /health
+
+    Any POST body may instead hold {"queries": [...]} to batch requests, which are answered concurrently.
+    """
+    def __init__(self, max_sample_sets=8, number_of_workers=4):
+        """
+        Parameters
+        ----------
+        max_sample_sets : int
+            Maximum number of sample sets kept warm.
+        number_of_workers : int
+            Number of pricing threads.
+        """
+        self.max_sample_sets = max_sample_sets
+        self.sample_sets = OrderedDict()
+        self.load_locks = {}
+        self.executor = ThreadPoolExecutor(max_workers=number_of_workers)
+        self.routes = {'/price': self.price, '/implied_volatility': self.implied_volatility, '/surface': self.surface}
+
+    async def get_sample_set(self, directory):
+        """
+        Warm sample set of directory, loaded on a worker thread on first use or if params.json has changed.
+
+        Parameters
+        ----------
+        directory : str
+            Path to directory containing simulation data.
+        """
+        directory = os.path.abspath(directory)
+        lock = self.load_locks.setdefault(directory, asyncio.Lock())
+        async with lock:
+            sample_set = self.sample_sets.get(directory)
+            params_path = os.path.join(directory, 'params.json')
+            if not os.path.exists(params_path):
+                raise FileNotFoundError(f"No simulation found in '{directory}'.")
+            if sample_set is None or sample_set.params_mtime != os.path.getmtime(params_path):
+                sample_set = await asyncio.get_running_loop().run_in_executor(self.executor, SampleSet, directory)
+                self.sample_sets[directory] = sample_set
+            self.sample_sets.move_to_end(directory)
+            while len(self.sample_sets) > self.max_sample_sets:
+                self.sample_sets.popitem(last=False)
+        return sample_set
+
+    async def run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def price(self, query):
+        sample_set = await self.get_sample_set(query['directory'])
+        prices, price_errors = await self.run(sample_set.price_options, query['strikes'], query['maturities'],
+                                              query.get('option_type', 'call'))
+        return {'prices': to_json(prices), 'price_errors': to_json(price_errors)}
+
+    async def implied_volatility(self, query):
+        sample_set = await self.get_sample_set(query['directory'])
+        implied_vols, implied_vol_errors, _, _ = await self.run(sample_set.implied_volatilities, query['strikes'],
+                                                                query['maturities'])
+        return {'implied_volatilities': to_json(implied_vols), 'implied_volatility_errors': to_json(implied_vol_errors)}
+
+    async def surface(self, query):
+        sample_set = await self.get_sample_set(query['directory'])
+        strikes, maturities = np.asarray(query['strikes'], dtype=float), np.asarray(query['maturities'], dtype=float)
+        implied_vols, implied_vol_errors, prices, price_errors = await self.run(
+            sample_set.implied_volatilities, strikes[None, :], maturities[:, None])
+        return {'strikes': strikes.tolist(), 'maturities': maturities.tolist(), 'prices': to_json(prices),
+                'price_errors': to_json(price_errors), 'implied_volatilities': to_json(implied_vols),
+                'implied_volatility_errors': to_json(implied_vol_errors)}
+
+    async def dispatch(self, method, path, body):
+        """
+        Answer one request, returning an HTTP status and a JSON serialisable response.
+
+        Parameters
+        ----------
+        method : str
+            HTTP method.
+        path : str
+            Request path.
+        body : bytes
+            Request body.
+        """
+        if method == 'GET' and path == '/health':
+            return '200 OK', {'status': 'ok', 'sample_sets': list(self.sample_sets)}
+        if method != 'POST' or path not in self.routes:
+            return '404 Not Found', {'error': f'Unknown endpoint {method} {path}. Available: POST {list(self.routes)}'}
+        try:
+            query = json.loads(body or b'{}')
+            if 'queries' in query:
+                responses = await asyncio.gather(*(self.routes[path](sub_query) for sub_query in query['queries']),
+                                                 return_exceptions=True)
+                return '200 OK', {'responses': [{'error': str(response)} if isinstance(response, Exception)
+                                                else response for response in responses]}
+            return '200 OK', await self.routes[path](query)
+        except (KeyError, ValueError, TypeError, FileNotFoundError) as e:
+            return '400 Bad Request', {'error': f'{e.__class__.__name__}: {e}'}
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serve HTTP/1.1 requests on one connection until the client closes it.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path = request_line.decode().split()[:2]
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    key, _, value = line.decode().partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, response = await self.dispatch(method, path, body)
+                payload = json.dumps(response).encode()
+                writer.write(f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(payload)}\r\n\r\n'.encode() + payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, socket_path=None):
+        """
+        Serve requests until cancelled.
+
+        Parameters
+        ----------
+        host : str
+            Host to listen on.
+        port : int
+            Port to listen on.
+        socket_path : str
+            Listen on this Unix socket instead of host and port.
+        """
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+            print(f'Pricing service listening on unix socket {socket_path}.', flush=True)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+            print(f'Pricing service listening on http://{host}:{port}.', flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def to_json(values):
+    """
+    Convert an array to nested lists with nan replaced by None.
+    """
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+if __name__ == "__main__":
+    usage = ("Usage: python pricing_service.py [--port <port>] [--socket <socket_path>] "
+             "[--max-sample-sets <number>] [--workers <number>]")
+    options = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+    if len(sys.argv) % 2 == 0 or set(options) - {'--port', '--socket', '--max-sample-sets', '--workers'}:
+        raise ValueError(usage)
+    service = PricingService(max_sample_sets=int(options.get('--max-sample-sets', 8)),
+                             number_of_workers=int(options.get('--workers', 4)))
+    try:
+        asyncio.run(service.serve(port=int(options.get('--port', 8765)), socket_path=options.get('--socket')))
+    except KeyboardInterrupt:
+        pass
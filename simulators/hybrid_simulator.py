@@ -0,0 +1,238 @@
+from math import gamma
+from simulators.simulator import Simulator
+import numpy as np
+
+
+class HybridSimulator(Simulator):
+    """
+    Hybrid scheme simulator for rough volatility models such as RoughHeston, whose variance is a Volterra process with
+    the power-law kernel (t - s)^(α - 1) / Γ(α), α = hurst + ½.
+
+    The variance at each time point is the sum of the kernel weighted drift and noise of every earlier cell. Within
+    hybrid_cells cells of the diagonal the singular kernel is integrated exactly against the Brownian motion, by drawing
+    the Wiener integrals of the kernel jointly with the Brownian increment, and further away the kernel is evaluated at
+    the optimal point of each cell. The sums over the history are causal convolutions, evaluated batch-wise over paths
+    by divide and conquer: once the first half of an interval of time points is simulated, its contribution to the
+    second half is added by one FFT convolution, so that a path costs O(n log² n) rather than O(n²). The price is
+    advanced by Euler steps.
+    """
+    # Number of (time, paths) arrays of convolution terms and FFT workspace held per batch, used to estimate memory
+    history_arrays = 6
+    # Time points below which the history is convolved directly rather than by FFT
+    block_size = 32
+    simulates_volterra = True
+
+    def __init__(self, model, simulator_params):
+        """
+        Constructor for the HybridSimulator class.
+
+        Parameters
+        ----------
+        model : RoughHeston
+            Model to be simulated.
+        simulator_params : dict
+            Dictionary containing simulator-specific parameters. hybrid_cells (default 1) sets the number of cells
+            next to the diagonal in which the kernel is integrated exactly.
+        """
+        self.hybrid_cells = 1
+        super().__init__(model=model, simulator_params=simulator_params)
+        if not hasattr(model, 'hurst'):
+            raise TypeError(f'HybridSimulator class cannot be instantiated without a rough volatility model defining '
+                            f'hurst. Provided: {self.model_name}')
+        if self.number_of_scenarios is not None:
+            raise ValueError('Scenario batching is not supported by HybridSimulator.')
+        if self.importance_strikes is not None:
+            raise ValueError('Importance sampling is not supported by HybridSimulator.')
+        if not isinstance(self.hybrid_cells, int) or self.hybrid_cells < 1:
+            raise ValueError(f'hybrid_cells must be a positive integer. Provided: {self.hybrid_cells}')
+
+    def get_kernel_weights(self, number_of_points, discretisation_interval):
+        """
+        Weights of the hybrid scheme on a uniform time grid.
+
+        Parameters
+        ----------
+        number_of_points : int
+            Number of time points.
+        discretisation_interval : float
+            Time step size.
+
+        Returns
+        -------
+        tuple
+            Drift weights and noise weights by lag, each with shape (number_of_points,), zero at lag 0 and the noise
+            weights zero within hybrid_cells of the diagonal. Mean coefficients with shape (hybrid_cells,) and root
+            covariance with shape (hybrid_cells, hybrid_cells) of the Wiener integrals of the kernel over the cells
+            next to the diagonal, conditional on the Brownian increment, normalised by Γ(α).
+        """
+        alpha = self.model.hurst + 0.5
+        lags = np.arange(1, number_of_points)
+        # Kernel integrated over the cell lag cells before each time point
+        drift_weights = np.zeros(number_of_points)
+        drift_weights[1:] = discretisation_interval ** alpha * (lags ** alpha - (lags - 1) ** alpha) / gamma(alpha + 1)
+        # Kernel at the point of each cell minimising the mean squared error, i.e. its average over the cell
+        noise_weights = drift_weights / discretisation_interval
+        noise_weights[:self.hybrid_cells + 1] = 0
+        cells = np.arange(1, self.hybrid_cells + 1)
+        # Covariances of the Brownian increment and Wiener integrals Z_k = ∫ (t_{j+k} - s)^(α - 1) dB_s over cell j
+        increment_covariance = discretisation_interval ** alpha * (cells ** alpha - (cells - 1) ** alpha) / alpha
+        integral_covariance = discretisation_interval ** (2 * alpha - 1) * np.array(
+            [[self.get_kernel_product_integral(alpha, first_cell, second_cell) for second_cell in cells]
+             for first_cell in cells])
+        conditional_mean = increment_covariance / discretisation_interval
+        conditional_covariance = (integral_covariance
+                                  - np.outer(increment_covariance, increment_covariance) / discretisation_interval)
+        eigenvalues, eigenvectors = np.linalg.eigh(conditional_covariance)
+        conditional_root = eigenvectors * np.sqrt(np.clip(eigenvalues, a_min=0, a_max=None))
+        return drift_weights, noise_weights, conditional_mean / gamma(alpha), conditional_root / gamma(alpha)
+
+    @staticmethod
+    def get_kernel_product_integral(alpha, first_cell, second_cell, quadrature_points=64):
+        """
+        ∫₀¹ (first_cell - u)^(α - 1) (second_cell - u)^(α - 1) du by Gauss-Legendre quadrature, after the
+        substitution 1 - u = v^(1/α) removing the singularity at u = 1 if a cell is next to the diagonal.
+
+        Parameters
+        ----------
+        alpha : float
+            Kernel exponent plus one.
+        first_cell : int
+            Lag of the first kernel.
+        second_cell : int
+            Lag of the second kernel.
+        quadrature_points : int
+            Number of quadrature points.
+        """
+        if first_cell == second_cell == 1:
+            return 1 / (2 * alpha - 1)
+        nodes, quadrature_weights = np.polynomial.legendre.leggauss(quadrature_points)
+        nodes, quadrature_weights = 0.5 * (nodes + 1), 0.5 * quadrature_weights
+        if min(first_cell, second_cell) > 1:
+            return np.sum(quadrature_weights * ((first_cell - nodes) * (second_cell - nodes)) ** (alpha - 1))
+        other_cell = max(first_cell, second_cell)
+        return np.sum(quadrature_weights * (other_cell - 1 + nodes ** (1 / alpha)) ** (alpha - 1)) / alpha
+
+    def get_schedule(self, start, stop, convolve):
+        """
+        Generator over the time points of [start, stop) in order, yielding each point with the end of its block.
+        Intervals longer than block_size are split in two, and convolve(start, middle, stop) is called to add the
+        contribution of the first half to the second before the second half is visited.
+
+        Parameters
+        ----------
+        start : int
+            First time point.
+        stop : int
+            Time point after the last.
+        convolve : callable
+            Adds the convolution terms of [start, middle) to the sums of [middle, stop).
+        """
+        if stop - start <= self.block_size:
+            for index in range(start, stop):
+                yield index, stop
+            return
+        middle = (start + stop) // 2
+        yield from self.get_schedule(start, middle, convolve)
+        convolve(start, middle, stop)
+        yield from self.get_schedule(middle, stop, convolve)
+
+    def iterate_steps(self, initial_state, number_of_steps, discretisation_interval, bm_increments=None,
+                      verbose=False):
+        """
+        Generator advancing a batch of paths through the time loop, yielding the step index and the new state after
+        every step. The variance at each step is its initial value plus the convolution sums of all earlier cells.
+        Payoffs attached through payoff_engine are updated on the fly.
+
+        Parameters
+        ----------
+        initial_state : np.ndarray
+            Initial state with shape (dim, paths).
+        number_of_steps : int
+            Number of time steps.
+        discretisation_interval : float
+            Time step size.
+        bm_increments : np.ndarray
+            Optional Brownian increments of W₁ and W₂ with shape (dim, paths, number_of_steps). The Wiener integrals
+            of the kernel are drawn conditional on them.
+        verbose : bool
+            Print progress every tenth of the time steps.
+        """
+        number_of_points = number_of_steps + 1
+        number_of_paths = initial_state.shape[-1]
+        drift_weights, noise_weights, conditional_mean, conditional_root = self.get_kernel_weights(
+            number_of_points=number_of_points, discretisation_interval=discretisation_interval)
+        # Kernel weighted drift and noise of each cell and the sums of earlier cells at each time point
+        drift_terms = np.zeros((number_of_points, number_of_paths))
+        noise_terms = np.zeros((number_of_points, number_of_paths))
+        volterra_sums = np.zeros((number_of_points, number_of_paths))
+        kernel_transforms = {}
+
+        def convolve(start, middle, stop):
+            size = 1 << (stop - start - 1).bit_length()  # Wrap-around only reaches the first half
+            if (stop - start, size) not in kernel_transforms:
+                kernel_transforms[stop - start, size] = (np.fft.rfft(drift_weights[:stop - start], size)[:, None],
+                                                         np.fft.rfft(noise_weights[:stop - start], size)[:, None])
+            drift_transform, noise_transform = kernel_transforms[stop - start, size]
+            convolution = np.fft.irfft(np.fft.rfft(drift_terms[start:middle], size, axis=0) * drift_transform
+                                       + np.fft.rfft(noise_terms[start:middle], size, axis=0) * noise_transform,
+                                       size, axis=0)
+            volterra_sums[middle:stop] += convolution[middle - start:stop - start]
+
+        current_state = initial_state
+        if self.payoff_engine is not None:
+            self.payoff_engine.initialise(initial_state)
+        if bm_increments is None:
+            increment_blocks = self.iterate_bm_increments(number_of_paths=number_of_paths,
+                                                          number_of_steps=number_of_steps,
+                                                          discretisation_interval=discretisation_interval)
+        for step_index, block_stop in self.get_schedule(0, number_of_points, convolve):
+            if step_index > 0:
+                if verbose and number_of_steps >= 10 and step_index % (number_of_steps // 10) == 0:
+                    print(f'Step {step_index}/{number_of_steps} simulated.')
+                next_state = np.empty_like(current_state)
+                next_state[0] = self.step(current_state=current_state, bm_step=bm_step,
+                                          discretisation_interval=discretisation_interval)
+                next_state[1] = initial_state[1] + volterra_sums[step_index]
+                if self.payoff_engine is not None:
+                    self.payoff_engine.update(time=step_index * discretisation_interval, previous_state=current_state,
+                                              current_state=next_state,
+                                              discretisation_interval=discretisation_interval, simulator=self)
+                current_state = next_state
+                yield step_index, current_state
+            if step_index == number_of_steps:
+                break
+            if bm_increments is None:
+                bm_step = next(increment_blocks)[0]
+            else:
+                bm_step = bm_increments[..., step_index]
+            # Brownian increment driving the variance and the Wiener integrals of the kernel next to the diagonal
+            variance_increment = self.model.rho * bm_step[0] + np.sqrt(1 - self.model.rho ** 2) * bm_step[1]
+            kernel_integrals = (conditional_mean[:, None] * variance_increment
+                                + conditional_root @ self.rng.standard_normal((self.hybrid_cells, number_of_paths)))
+            variance_diffusion = np.hypot(*self.diffusion(*current_state)[1])
+            drift_terms[step_index] = self.drift(*current_state)[1]
+            noise_terms[step_index] = variance_diffusion * variance_increment
+            # Cells within the block are convolved directly and cells next to the diagonal with the exact integrals
+            lags = block_stop - step_index
+            volterra_sums[step_index + 1:block_stop] += (drift_weights[1:lags, None] * drift_terms[step_index]
+                                                        + noise_weights[1:lags, None] * noise_terms[step_index])
+            near_lags = min(self.hybrid_cells, number_of_steps - step_index)
+            volterra_sums[step_index + 1:step_index + 1 + near_lags] += (variance_diffusion
+                                                                         * kernel_integrals[:near_lags])
+
+    def step(self, current_state, bm_step, discretisation_interval):
+        """
+        Advances the price of a batch of paths by one Euler-Maruyama step. The variance is given by the convolution
+        sums of iterate_steps.
+
+        Parameters
+        ---
+        current_state : np.ndarray
+            State with shape (dim, paths).
+        bm_step : np.ndarray
+            Brownian increments with shape (dim, paths).
+        discretisation_interval : float
+            Time step size.
+        """
+        return (current_state[0] + self.drift(*current_state)[0] * discretisation_interval
+                + np.einsum('j...,j...->...', self.diffusion(*current_state)[0], bm_step))
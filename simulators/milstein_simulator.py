@@ -6,6 +6,10 @@ class MilsteinSimulator(Simulator):
     """
     Milstein simulator for simulating stochastic processes.
     """
+    # Derivative of the diffusion coefficient with respect to each state component
+    diffusion_tensor_rank = 3
+    path_scheme = 'milstein'
+
     def __init__(self, model, simulator_params):
         """
         Constructor for the EulerSimulator class.
@@ -22,31 +26,28 @@ class MilsteinSimulator(Simulator):
             raise ValueError("Diffusion_prime not provided. Derivative of diffusion coefficient is "
                              "required to simulate Milstein scheme.")
 
-    def sim_path(self, path_samples, discretisation_interval):
+    def step(self, current_state, bm_step, discretisation_interval):
         """
-        Simulates one path using the Milstein scheme.
+        Advances a batch of paths by one step of the Milstein scheme.
 
         Parameters
         ----------
-        path_samples : dict
-            Initial condition and arrays for solution trajectories.
+        current_state : np.ndarray
+            State with shape (dim, paths).
+        bm_step : np.ndarray
+            Brownian increments with shape (dim, paths).
         discretisation_interval : float
             Time step size.
         """
-        bm_samples = np.zeros((self.dim, self.discretisation_parameter))
-        for i in range(1, self.discretisation_parameter):
-            bm_step = np.random.normal(0, np.sqrt(discretisation_interval), self.dim)
-            bm_samples[:, i] = bm_samples[:, i - 1] + bm_step
-            current_state = path_samples[:, i - 1]
-            if self.dim == 1:
-                path_samples[:, i] = (current_state + self.drift(current_state) * discretisation_interval
-                                      + self.diffusion(current_state) * bm_step
-                                      + 0.5 * self.diffusion(current_state) * self.diffusion_prime(current_state)
-                                      * (bm_step ** 2 - discretisation_interval))
-            else:
-                path_samples[:, i] = (current_state + self.drift(*current_state) * discretisation_interval
-                                      + np.dot(self.diffusion(*current_state), bm_step)
-                                      + 0.5 * np.einsum('ij,ijk->ik', self.diffusion(*current_state),
-                                                        self.diffusion_prime(*current_state))
-                                      @ (bm_step ** 2 - discretisation_interval))
-        return path_samples
+        if self.dim == 1:
+            diffusion = self.diffusion(current_state)
+            return (current_state + self.drift(current_state) * discretisation_interval
+                    + diffusion * bm_step
+                    + 0.5 * diffusion * self.diffusion_prime(current_state)
+                    * (bm_step ** 2 - discretisation_interval))
+        diffusion = self.diffusion(*current_state)
+        milstein_coefficient = np.einsum('ij...,ijk...->ik...', diffusion,
+                                         np.array(self.diffusion_prime(*current_state)))
+        return (current_state + self.drift(*current_state) * discretisation_interval
+                + np.einsum('ij...,j...->i...', diffusion, bm_step)
+                + 0.5 * np.einsum('ik...,k...->i...', milstein_coefficient, bm_step ** 2 - discretisation_interval))
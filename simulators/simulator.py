@@ -1,13 +1,37 @@
+import os
+import json
 import numpy as np
+from scipy.special import ndtri
 from abc import ABCMeta, abstractmethod
-from utils.data_utils import write_json, write_npy
+from utils.cache_utils import NON_RESULT_PARAMS
+from utils.data_utils import (write_json, write_npy, read_json, replace_json, remove_file, open_sample_columns,
+                              BackgroundWriter)
+from utils.jit_utils import get_path_kernel
+from utils.shard_utils import get_shard_range
 from utils.sim_utils import timer
 
 
+# Methods of sampling Brownian increments
+SAMPLING_METHODS = ['pseudo_random', 'moment_matched', 'stratified']
+
+
 class Simulator(metaclass=ABCMeta):
     """
     Base class for simulators.
     """
+    # Rank of the largest diffusion tensor formed per path by the scheme step, used to estimate memory
+    diffusion_tensor_rank = 2
+    # Number of (time, paths) arrays of path history held by the scheme, used to estimate memory
+    history_arrays = 0
+    # Whether the scheme simulates Volterra processes, required by rough volatility models
+    simulates_volterra = False
+    # Scheme of the compiled path kernel of the numba backend, 'euler' or 'milstein', None if not supported
+    path_scheme = None
+    # Number of time steps advanced per call of the compiled path kernel
+    kernel_block_steps = 256
+    # Attributes holding simulated data in memory rather than parameters
+    data_attributes = ['samples', 'sample_weights']
+
     def __init__(self, model, simulator_params):
         """
         Constructor for the Simulator class.
@@ -27,7 +51,25 @@ class Simulator(metaclass=ABCMeta):
         self.dim = len(self.state)
         self.drift = model.drift
         self.diffusion = model.diffusion
-        self.diffusion_prime = model.diffusion_prime
+        self.diffusion_prime = getattr(model, 'diffusion_prime', None)
+        self.diffusion_dot = getattr(model, 'diffusion_dot', None)
+        self.update_leverage = getattr(model, 'update_leverage', None)
+        self.seed = None
+        self.verbose = True
+        self.chunk_size = None
+        self.store_samples = True
+        self.write_samples = True
+        self.store_aggregates = False
+        self.payoff_engine = None
+        self.scenario_params = None
+        self.write_buffers = 2
+        self.max_memory = None
+        self.shard_index = None
+        self.shard_count = None
+        self.importance_strikes = None
+        self.backend = 'numpy'
+        self.sampling = 'pseudo_random'
+        self.number_of_strata = None
         for key, value in simulator_params.items():
             setattr(self, key, value)
         if not self.final_time:
@@ -42,10 +84,150 @@ class Simulator(metaclass=ABCMeta):
         if not self.number_of_paths:
             raise TypeError('Simulator class cannot be instantiated without number_of_paths. '
                             'Please set in simulation in config_file.')
-        self.initial_value = np.atleast_1d(self.initial_value)
+        if hasattr(model, 'hurst') and not self.simulates_volterra:
+            raise ValueError(f'{self.model_name} models have Volterra dynamics and cannot be simulated by '
+                             f'{self.simulator_name}. Set simulator_name = HybridSimulator in run in config_file.')
+        if self.shard_count is not None:
+            self.set_shard()
+        self.initial_value = np.broadcast_to(np.atleast_1d(self.initial_value), (self.dim,)).astype(float)
+        if self.store_aggregates and not hasattr(model, 'aggregate'):
+            raise ValueError(f'store_aggregates requires a model defining aggregate quantities. '
+                             f'Provided: {self.model_name}')
+        if not self.write_samples and self.chunk_size:
+            raise ValueError('write_samples = False requires samples to be held in memory. Remove chunk_size from '
+                             'simulation in config_file.')
+        self.number_of_scenarios = len(next(iter(self.scenario_params.values()))) if self.scenario_params else None
+        if self.number_of_scenarios and (self.diffusion_dot is not None or self.update_leverage is not None):
+            raise ValueError(f'Scenario batching is not supported for {self.model_name} models.')
+        if self.shard_count is not None and self.update_leverage is not None:
+            raise ValueError(f'{self.model_name} runs cannot be sharded, as each shard would calibrate its own '
+                             f'leverage function. Remove shard_index and shard_count from simulation in config_file.')
+        # Components written to the output directory
+        self.output_state = [str(component) for component in
+                             (model.aggregate_state if self.store_aggregates else self.state)]
+        self.samples = None  # Samples of each scenario held in memory by the last unchunked run
+        self.sample_weights = None  # Likelihood ratio weights of self.samples, None if not importance sampling
+        self.path_weights = None  # Likelihood ratio weights of the last batch of paths if importance sampling
+        if self.shard_count is None:
+            self.rng = np.random.default_rng(self.seed)
+        else:  # Independent stream of shard_index among shard_count streams spawned from seed
+            shard_seeds = np.random.SeedSequence(self.seed).spawn(self.shard_count)
+            self.rng = np.random.default_rng(shard_seeds[self.shard_index])
+        if self.importance_strikes is not None:
+            self.set_importance_shifts()
+        self.validate_sampling()
+        if self.backend not in ('numpy', 'numba'):
+            raise ValueError(f"backend must be 'numpy' or 'numba'. Provided: {self.backend}")
+        self.path_kernel = self.get_path_kernel() if self.backend == 'numba' else None
+
+    def get_path_kernel(self):
+        """
+        Compiled path kernel of the numba backend, or None, falling back to the NumPy scheme steps with a message, if
+        numba is not installed or the simulation is not supported. The kernel supports one-dimensional models defining
+        get_scalar_coefficients, without scenarios or aggregates, simulated by a scheme with a path_scheme.
+        """
+        if self.path_scheme is None:
+            reason = f'{self.simulator_name} has no compiled path kernel'
+        elif self.dim != 1 or not hasattr(self.model, 'get_scalar_coefficients'):
+            reason = f'{self.model_name} models are not supported by the compiled path kernel'
+        elif self.number_of_scenarios is not None or self.store_aggregates:
+            reason = 'scenarios and aggregates are not supported by the compiled path kernel'
+        else:
+            path_kernel = get_path_kernel(model=self.model, milstein=self.path_scheme == 'milstein')
+            if path_kernel is not None:
+                return path_kernel
+            reason = 'numba is not installed. Install with: pip install numba'
+        print(f'numba backend unavailable: {reason}. Falling back to the numpy backend.')
+        return None
+
+    def validate_sampling(self):
+        """
+        Check that the sampling method is supported. Stratified sampling allocates path j of each batch to stratum
+        j mod number_of_strata, so every batch must hold the same number of paths in each stratum.
+        """
+        if self.sampling not in SAMPLING_METHODS:
+            raise ValueError(f'sampling must be one of {SAMPLING_METHODS}. Provided: {self.sampling}')
+        if self.sampling != 'stratified':
+            return
+        if not self.number_of_strata:
+            raise TypeError('Stratified sampling cannot be used without number_of_strata. '
+                            'Please set in simulation in config_file.')
+        if self.importance_strikes is not None:
+            raise ValueError('Stratified sampling is not supported with importance sampling.')
+        for key in ['number_of_paths', 'chunk_size']:
+            if getattr(self, key) and getattr(self, key) % self.number_of_strata:
+                raise ValueError(f'{key} of each batch or shard must be a multiple of number_of_strata for '
+                                 f'stratified sampling. Provided: {key}={getattr(self, key)}, '
+                                 f'number_of_strata={self.number_of_strata}')
+
+    def set_shard(self):
+        """
+        Restrict the simulation to shard shard_index of shard_count shards. number_of_paths is split as evenly as
+        possible between shards and replaced by the number of paths of this shard, and the total and the index of the
+        first path of the shard are recorded in total_number_of_paths and shard_start. Samples of shards are always
+        written as memory-mapped columns, with chunk_size defaulting to the paths of the shard, so that merged shards
+        are read without loading them into memory.
+        """
+        if self.seed is None:
+            raise TypeError('Sharded simulations cannot be instantiated without seed, from which the random number '
+                            'streams of all shards are derived. Please set in simulation in config_file.')
+        if self.shard_index is None or not 0 <= self.shard_index < self.shard_count <= self.number_of_paths:
+            raise ValueError(f'shard_index must satisfy 0 <= shard_index < shard_count <= number_of_paths. '
+                             f'Provided: shard_index={self.shard_index}, shard_count={self.shard_count}, '
+                             f'number_of_paths={self.number_of_paths}')
+        self.total_number_of_paths = self.number_of_paths
+        self.shard_start, shard_stop = get_shard_range(number_of_paths=self.total_number_of_paths,
+                                                       shard_count=self.shard_count, shard_index=self.shard_index)
+        self.number_of_paths = shard_stop - self.shard_start
+        if self.store_samples and self.write_samples and not self.chunk_size:
+            self.chunk_size = self.number_of_paths
+
+    def set_importance_shifts(self):
+        """
+        Choose the Brownian drift shifts of defensive mixture importance sampling: one unshifted component and one per
+        strike in importance_strikes. Each shift is along the Brownian direction driving the price at initial_value,
+        sized so that the median price at final_time under the shifted measure is the strike, given the local price
+        volatility at initial_value. Shifts are recorded in importance_shifts with shape (components, dim).
+        """
+        if self.number_of_scenarios is not None:
+            raise ValueError('Importance sampling is not supported with scenario_params.')
+        state = self.initial_value[:, None]
+        if self.dim == 1:
+            price_diffusion = np.broadcast_to(self.diffusion(state), state.shape)[:, 0]
+        else:
+            price_diffusion = np.asarray(self.diffusion(*state))[0, :, 0]
+        diffusion_norm = np.linalg.norm(price_diffusion)
+        if not diffusion_norm > 0:
+            raise ValueError('Importance sampling requires a non-zero price volatility at initial_value.')
+        volatility = diffusion_norm / self.initial_value[0]
+        q = np.atleast_1d(getattr(self.model, 'q', 0.0))[0]
+        median_log_return = (self.model.risk_free_rate - q - 0.5 * volatility ** 2) * self.final_time
+        shift_sizes = ((np.log(np.atleast_1d(self.importance_strikes) / self.initial_value[0]) - median_log_return)
+                       / (volatility * self.final_time))
+        shifts = np.vstack([np.zeros(self.dim), shift_sizes[:, None] * price_diffusion / diffusion_norm])
+        self.importance_shifts = shifts.tolist()
+
+    def get_importance_weights(self, brownian_motion, time):
+        """
+        Likelihood ratio dP/dQ of each path, where Q is the equally weighted mixture of the drift-shifted measures of
+        importance_shifts, from the simulated Brownian motion at time. Weights are bounded by the number of mixture
+        components, as one component is unshifted.
+
+        Parameters
+        ----------
+        brownian_motion : np.ndarray
+            Sum of the Brownian increments of each path with shape (dim, paths).
+        time : float
+            Time of brownian_motion.
+        """
+        shifts = np.asarray(self.importance_shifts)
+        # log dQ_j/dP = θ_j·W_t - |θ_j|² t / 2 for each component j
+        log_likelihood_ratios = shifts @ brownian_motion - 0.5 * np.sum(shifts ** 2, axis=1)[:, None] * time
+        maximum = log_likelihood_ratios.max(axis=0)
+        return np.exp(-maximum) / np.mean(np.exp(log_likelihood_ratios - maximum), axis=0)
 
     @timer
-    def sim(self, directory):
+    def sim(self, directory, resume=False):
         """
         Simulates numerical solution to SDE.
 
@@ -53,36 +235,605 @@ class Simulator(metaclass=ABCMeta):
         ----------
         directory : str
             Output directory to write to.
+        resume : bool
+            Continue an interrupted chunked run from the checkpoint in directory.
         """
         # Setup paths and discretise interval
-        discretisation_interval = self.final_time / self.discretisation_parameter
+        discretisation_interval = self.final_time / (self.discretisation_parameter - 1)
         time_values = np.linspace(0, self.final_time, self.discretisation_parameter)
-        samples = {'time': time_values} | {state_component: np.zeros((self.number_of_paths,
-                                                                      self.discretisation_parameter)) for
-                                           state_component in self.state}
-        for path_index, state_component in enumerate(self.state):
-            samples[state_component][:, 0] = self.initial_value[path_index]
-        # Simulate paths
-        for path in range(self.number_of_paths):
-            if path > 0 and path % (self.number_of_paths // 10) == 0:
-                print(f'Path {path}/{self.number_of_paths} simulated.')
-            path_samples = {state_component: samples[state_component][path, :] for state_component in self.state}
-            path_samples = np.vstack([value for value in path_samples.values()])
-            path_samples = self.sim_path(path_samples=path_samples, discretisation_interval=discretisation_interval)
-            path_samples = np.clip(path_samples, a_min=0, a_max=None)  # Ensure non-negativity
-            for component_index, state_component in enumerate(self.state):
-                samples[state_component][path, :] = path_samples[component_index]
-        # Write outputs
-        samples = {str(k): v for k, v in samples.items()}
-        write_npy(directory=directory, samples=samples)
-        self.initial_value = self.initial_value.tolist()  # Convert to list for JSON serialization
+        if not self.store_samples:
+            if self.payoff_engine is None:
+                raise ValueError('store_samples = False requires payoffs to be set in config_file.')
+            self.sim_payoffs(directory=directory, discretisation_interval=discretisation_interval, resume=resume)
+        elif self.chunk_size:
+            self.sim_chunks(directory=directory, time_values=time_values,
+                            discretisation_interval=discretisation_interval, resume=resume)
+        else:
+            if resume:
+                print('Checkpoints are only written by chunked runs. Set chunk_size in simulation in config_file. '
+                      'Simulating from the start.')
+            path_samples = np.zeros(self.get_output_shape(self.number_of_paths) + (self.discretisation_parameter,))
+            # Simulate paths
+            self.sim_paths(path_samples=path_samples, discretisation_interval=discretisation_interval,
+                           initial_state=self.get_initial_state(self.number_of_paths), verbose=self.verbose)
+            np.clip(path_samples, a_min=0, a_max=None, out=path_samples)  # Ensure non-negativity
+            if self.payoff_engine is not None:
+                self.payoff_engine.accumulate(weights=self.path_weights)
+            self.write_leverage(directory)
+            # Write outputs
+            self.samples = []
+            self.sample_weights = [self.path_weights] * len(self.get_scenario_directories(directory))
+            if self.importance_strikes is not None and self.write_samples:
+                write_npy(directory=directory, weights=self.path_weights)
+            for scenario_index, scenario_directory in enumerate(self.get_scenario_directories(directory)):
+                scenario_samples = path_samples if self.number_of_scenarios is None else path_samples[:, scenario_index]
+                samples = {'time': time_values} | {state_component: scenario_samples[component_index] for
+                                                   component_index, state_component in enumerate(self.output_state)}
+                samples = {str(k): v for k, v in samples.items()}
+                self.samples.append(samples)
+                if self.write_samples:
+                    write_npy(directory=scenario_directory, samples=samples)
+        if self.payoff_engine is not None:
+            for scenario_index, scenario_directory in enumerate(self.get_scenario_directories(directory)):
+                self.payoff_engine.write(directory=scenario_directory,
+                                         scenario_index=None if self.number_of_scenarios is None else scenario_index)
+        # Random number generator state after the last path, continued by extend_run.py
+        self.write_params(directory=directory, rng_state=self.rng.bit_generator.state)
+        remove_file(os.path.join(directory, 'checkpoint.json'))  # Run complete
+
+    def get_params(self):
+        """
+        JSON serialisable model and simulation parameters.
+        """
         params = {key: value for key, value in self.__dict__.items() if
-                  isinstance(value, (int, float, list, str, dict))}
+                  isinstance(value, (int, float, list, str, dict)) and key not in self.data_attributes}
+        params['initial_value'] = self.initial_value.tolist()  # Convert to list for JSON serialization
+        if self.payoff_engine is not None:
+            params['payoffs'] = {label: {'payoff_name': payoff.__class__.__name__} | payoff.payoff_params
+                                 for label, payoff in self.payoff_engine.payoffs.items()}
+        return params
+
+    def write_params(self, directory, **extra_params):
+        """
+        Write model and simulation parameters to params.json.
+
+        Parameters
+        ----------
+        directory : str
+            Output directory to write to.
+        **extra_params : keyword arguments
+            Additional entries to record in params.json.
+        """
+        params = self.get_params() | extra_params
         write_json(directory=directory, params=params)
+        if self.number_of_scenarios is None:
+            return
+        for scenario_index, scenario_directory in enumerate(self.get_scenario_directories(directory)):
+            scenario_model_params = params['model_params'] | {key: values[scenario_index] for key, values in
+                                                              self.scenario_params.items()}
+            write_json(directory=scenario_directory, params=params | {'model_params': scenario_model_params,
+                                                                      'scenario_index': scenario_index})
+
+    def get_scenario_directories(self, directory):
+        """
+        Output directory of each scenario, scenario_<k> subdirectories of directory if scenario_params are set and
+        directory itself otherwise.
+
+        Parameters
+        ----------
+        directory : str
+            Output directory.
+        """
+        import os
+        if self.number_of_scenarios is None:
+            return [directory]
+        scenario_directories = [os.path.join(directory, f'scenario_{scenario_index}')
+                                for scenario_index in range(self.number_of_scenarios)]
+        for scenario_directory in scenario_directories:
+            os.makedirs(scenario_directory, exist_ok=True)
+        return scenario_directories
+
+    def output_file_names(self):
+        """
+        Names of the files written to the output directory by sim.
+        """
+        if not self.store_samples:
+            sample_files = []
+        elif self.chunk_size:
+            sample_files = ['time.npy'] + [f'{state_component}.npy' for state_component in self.output_state]
+        elif self.write_samples:
+            sample_files = ['samples.npy']
+        else:
+            sample_files = []
+        if sample_files and self.importance_strikes is not None:
+            sample_files.append('weights.npy')
+        payoff_files = ['payoffs.json'] if self.payoff_engine is not None else []
+        if self.number_of_scenarios is None:
+            leverage_files = ['leverage.npy'] if self.update_leverage is not None else []
+            return sample_files + payoff_files + leverage_files + ['params.json']
+        return ['params.json'] + [f'scenario_{scenario_index}/{file_name}'
+                                  for scenario_index in range(self.number_of_scenarios)
+                                  for file_name in sample_files + payoff_files + ['params.json']]
+
+    def sim_chunks(self, directory, time_values, discretisation_interval, resume=False):
+        """
+        Simulates paths in chunks of chunk_size paths and writes them to memory-mapped sample columns, one npy file per
+        state component. Chunks are written by a background thread while the next chunk is simulated, and a checkpoint
+        is written once each chunk has been flushed to disk.
+
+        Parameters
+        ----------
+        directory : str
+            Output directory to write to.
+        time_values : np.ndarray
+            Time grid.
+        discretisation_interval : float
+            Time step size.
+        resume : bool
+            Continue from the checkpoint in directory.
+        """
+        completed_paths = self.load_checkpoint(directory) if resume else 0
+        scenario_columns = []
+        for scenario_directory in self.get_scenario_directories(directory):
+            if completed_paths:
+                scenario_columns.append(open_sample_columns(directory=scenario_directory, state=self.output_state,
+                                                            mode='r+'))
+                continue
+            write_npy(directory=scenario_directory, time=time_values)
+            scenario_columns.append(open_sample_columns(directory=scenario_directory, state=self.output_state,
+                                                        shape=(self.number_of_paths, self.discretisation_parameter)))
+        # Columns ordered by state component then scenario, matching the flattened leading axes of the buffers
+        columns = [columns[component_index] for component_index in range(len(self.output_state))
+                   for columns in scenario_columns]
+        if self.importance_strikes is not None:
+            if completed_paths:
+                weights_column = open_sample_columns(directory=directory, state=['weights'], mode='r+')[0]
+            else:
+                weights_column = open_sample_columns(directory=directory, state=['weights'],
+                                                     shape=(self.number_of_paths,))[0]
+        buffer_shape = self.get_output_shape(self.chunk_size) + (self.discretisation_parameter,)
+        with BackgroundWriter(columns=columns, buffer_shape=(len(columns),) + buffer_shape[-2:],
+                              number_of_buffers=self.write_buffers,
+                              callback=lambda checkpoint: self.write_checkpoint(directory, checkpoint)) as writer:
+            for start in range(completed_paths, self.number_of_paths, self.chunk_size):
+                stop = min(start + self.chunk_size, self.number_of_paths)
+                buffer = writer.acquire()
+                path_samples = buffer.reshape(buffer_shape)[..., :stop - start, :]
+                self.sim_paths(path_samples=path_samples, discretisation_interval=discretisation_interval,
+                               initial_state=self.get_initial_state(stop - start))
+                np.clip(path_samples, a_min=0, a_max=None, out=path_samples)  # Ensure non-negativity
+                if self.payoff_engine is not None:
+                    self.payoff_engine.accumulate(weights=self.path_weights)
+                if start == 0:  # Leverage grid calibrated on the first chunk, written before its checkpoint
+                    self.write_leverage(directory)
+                if self.importance_strikes is not None:
+                    weights_column[start:stop] = self.path_weights
+                    weights_column.flush()
+                writer.submit(buffer=buffer, start=start, stop=stop, checkpoint=self.get_checkpoint(stop))
+                if self.verbose:
+                    print(f'Path {stop}/{self.number_of_paths} simulated.')
+        print(f"{directory} sample columns saved.")
+
+    def sim_payoffs(self, directory, discretisation_interval, resume=False):
+        """
+        Simulates paths in chunks of chunk_size paths, keeping only the current state and the running payoff state,
+        so that memory is O(paths) rather than O(paths x time). A checkpoint is written after each chunk.
+
+        Parameters
+        ----------
+        directory : str
+            Output directory to write to.
+        discretisation_interval : float
+            Time step size.
+        resume : bool
+            Continue from the checkpoint in directory.
+        """
+        chunk_size = self.chunk_size or self.number_of_paths
+        completed_paths = self.load_checkpoint(directory) if resume else 0
+        for start in range(completed_paths, self.number_of_paths, chunk_size):
+            stop = min(start + chunk_size, self.number_of_paths)
+            for _ in self.iterate_steps(initial_state=self.get_initial_state(stop - start),
+                                        number_of_steps=self.discretisation_parameter - 1,
+                                        discretisation_interval=discretisation_interval,
+                                        verbose=self.verbose and chunk_size == self.number_of_paths):
+                pass
+            self.payoff_engine.accumulate(weights=self.path_weights)
+            if start == 0:  # Leverage grid calibrated on the first chunk, written before its checkpoint
+                self.write_leverage(directory)
+            if chunk_size < self.number_of_paths:
+                self.write_checkpoint(directory=directory, checkpoint=self.get_checkpoint(stop))
+            if self.verbose and chunk_size < self.number_of_paths:
+                print(f'Path {stop}/{self.number_of_paths} simulated.')
+
+    def get_checkpoint(self, completed_paths):
+        """
+        Checkpoint of a chunked run after completed_paths paths: the random number generator state, payoff statistics
+        and result determining parameters.
+
+        Parameters
+        ----------
+        completed_paths : int
+            Number of paths simulated.
+        """
+        checkpoint = {'completed_paths': completed_paths, 'rng_state': self.rng.bit_generator.state,
+                      'params': {key: value for key, value in self.get_params().items()
+                                 if key not in NON_RESULT_PARAMS}}
+        if self.payoff_engine is not None:
+            checkpoint['payoff_accumulators'] = {label: {key: np.asarray(value).tolist() for key, value in
+                                                         accumulator.items()}
+                                                 for label, accumulator in self.payoff_engine.accumulators.items()}
+        return checkpoint
+
+    @staticmethod
+    def write_checkpoint(directory, checkpoint):
+        """
+        Atomically replace checkpoint.json in directory.
+
+        Parameters
+        ----------
+        directory : str
+            Output directory.
+        checkpoint : dict
+            Checkpoint from get_checkpoint.
+        """
+        replace_json(os.path.join(directory, 'checkpoint.json'), checkpoint)
+
+    def load_checkpoint(self, directory):
+        """
+        Restore the random number generator state and payoff statistics from checkpoint.json in directory and return
+        the number of completed paths, or 0 if there is no checkpoint.
+
+        Parameters
+        ----------
+        directory : str
+            Output directory.
+        """
+        checkpoint = read_json(os.path.join(directory, 'checkpoint.json'))
+        if not checkpoint:
+            print(f'No checkpoint found in {directory}. Simulating from the start.')
+            return 0
+        params = json.loads(json.dumps({key: value for key, value in self.get_params().items()
+                                        if key not in NON_RESULT_PARAMS}, default=str))
+        if json.loads(json.dumps(checkpoint['params'], default=str)) != params:
+            raise ValueError(f'Checkpoint in {directory} was written by a different configuration. Remove '
+                             'checkpoint.json or restore the original config_file to resume.')
+        self.rng.bit_generator.state = checkpoint['rng_state']
+        if checkpoint['completed_paths']:
+            self.load_leverage(directory)
+        if self.payoff_engine is not None:
+            for label, accumulator in checkpoint['payoff_accumulators'].items():
+                self.payoff_engine.accumulators[label] = {key: value if isinstance(value, (int, float))
+                                                          else np.asarray(value) for key, value in accumulator.items()}
+        print(f"Resuming from checkpoint with {checkpoint['completed_paths']}/{self.number_of_paths} paths complete.")
+        return checkpoint['completed_paths']
+
+    def write_leverage(self, directory):
+        """
+        Write the leverage grid calibrated by models with a leverage function to leverage.npy in directory, so that
+        resumed and extended runs simulate their paths with the same leverage function.
+
+        Parameters
+        ----------
+        directory : str
+            Output directory.
+        """
+        if self.update_leverage is not None:
+            write_npy(directory=directory, leverage=self.model.get_leverage_grid())
+
+    def load_leverage(self, directory):
+        """
+        Restore the leverage grid of models with a leverage function from leverage.npy in directory. Raises
+        FileNotFoundError if the grid was not written.
+
+        Parameters
+        ----------
+        directory : str
+            Output directory.
+        """
+        if self.update_leverage is None:
+            return
+        leverage_path = os.path.join(directory, 'leverage.npy')
+        if not os.path.exists(leverage_path):
+            raise FileNotFoundError(f"No leverage grid found in '{directory}'. {self.model_name} runs can only be "
+                                    f"continued with the leverage function their paths were simulated with.")
+        self.model.set_leverage_grid(np.load(leverage_path, allow_pickle=True).item())
+
+    def get_initial_state(self, number_of_paths):
+        """
+        Initial state of a batch of paths with shape (dim, paths), or (dim, scenarios, paths) if scenario_params are
+        set.
+
+        Parameters
+        ----------
+        number_of_paths : int
+            Number of paths in the batch.
+        """
+        if self.number_of_scenarios is None:
+            return np.repeat(self.initial_value[:, None], number_of_paths, axis=1)
+        return np.broadcast_to(self.initial_value[:, None, None],
+                               (self.dim, self.number_of_scenarios, number_of_paths)).copy()
+
+    def get_output_shape(self, number_of_paths):
+        """
+        Shape (output components, paths), or (output components, scenarios, paths) if scenario_params are set, of the
+        samples written at each time point.
+
+        Parameters
+        ----------
+        number_of_paths : int
+            Number of paths in the batch.
+        """
+        if self.number_of_scenarios is None:
+            return len(self.output_state), number_of_paths
+        return len(self.output_state), self.number_of_scenarios, number_of_paths
+
+    def get_output_state(self, state):
+        """
+        Components of a state written to the output directory, i.e. the state itself or, if store_aggregates is set,
+        the aggregate quantities of the model.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            State with shape (dim, paths).
+        """
+        return self.model.aggregate(state) if self.store_aggregates else state
+
+    def sim_paths(self, path_samples, discretisation_interval, bm_increments=None, initial_state=None, verbose=False):
+        """
+        Simulates a batch of paths, vectorised over paths, by repeatedly applying the scheme step.
+
+        Parameters
+        ----------
+        path_samples : np.ndarray
+            Array with shape (output components, paths, time), filled in place. Contains the initial condition in its
+            first time column if initial_state is not provided.
+        discretisation_interval : float
+            Time step size.
+        bm_increments : np.ndarray
+            Optional Brownian increments with shape (dim, paths, time - 1), e.g. to couple simulations on different
+            time grids. Drawn from the simulator random number generator if not provided.
+        initial_state : np.ndarray
+            Initial state with shape (dim, paths).
+        verbose : bool
+            Print progress every tenth of the time steps.
+        """
+        if initial_state is None:
+            initial_state = path_samples[..., 0]
+        else:
+            path_samples[..., 0] = self.get_output_state(initial_state)
+        if self.path_kernel is not None and self.payoff_engine is None:  # Kernel writes directly to the samples
+            for first_step_index, states in self.iterate_kernel_blocks(
+                    initial_state=initial_state, number_of_steps=path_samples.shape[-1] - 1,
+                    discretisation_interval=discretisation_interval, bm_increments=bm_increments,
+                    out=path_samples[0, :, 1:]):
+                if verbose:
+                    print(f'Step {first_step_index + states.shape[1] - 1}/{path_samples.shape[-1] - 1} simulated.')
+            return path_samples
+        for step_index, current_state in self.iterate_steps(initial_state=initial_state,
+                                                            number_of_steps=path_samples.shape[-1] - 1,
+                                                            discretisation_interval=discretisation_interval,
+                                                            bm_increments=bm_increments, verbose=verbose):
+            path_samples[..., step_index] = self.get_output_state(current_state)
+        return path_samples
+
+    def iterate_steps(self, initial_state, number_of_steps, discretisation_interval, bm_increments=None,
+                      verbose=False):
+        """
+        Generator advancing a batch of paths through the time loop, yielding the step index and the new state after
+        every step. Payoffs attached through payoff_engine are updated on the fly. If importance_strikes is set and
+        increments are drawn, the likelihood ratio weights of the batch are set in path_weights once it is exhausted.
+
+        Parameters
+        ----------
+        initial_state : np.ndarray
+            Initial state with shape (dim, paths).
+        number_of_steps : int
+            Number of time steps.
+        discretisation_interval : float
+            Time step size.
+        bm_increments : np.ndarray
+            Optional Brownian increments with shape (dim, paths, number_of_steps).
+        verbose : bool
+            Print progress every tenth of the time steps.
+        """
+        if self.path_kernel is not None:
+            yield from self.iterate_kernel_steps(initial_state=initial_state, number_of_steps=number_of_steps,
+                                                 discretisation_interval=discretisation_interval,
+                                                 bm_increments=bm_increments, verbose=verbose)
+            return
+        current_state = initial_state
+        if self.payoff_engine is not None:
+            self.payoff_engine.initialise(initial_state)
+        importance_sampling = self.importance_strikes is not None and bm_increments is None
+        if importance_sampling:  # Draw each path from a randomly chosen drift-shifted mixture component
+            shifts = np.asarray(self.importance_shifts)
+            path_shifts = shifts[self.rng.integers(len(shifts), size=current_state.shape[-1])].T
+            brownian_motion = np.zeros((current_state.shape[0], current_state.shape[-1]))
+        if bm_increments is None:
+            increment_blocks = self.iterate_bm_increments(number_of_paths=current_state.shape[-1],
+                                                          number_of_steps=number_of_steps,
+                                                          discretisation_interval=discretisation_interval)
+        for step_index in range(1, number_of_steps + 1):
+            if verbose and number_of_steps >= 10 and step_index % (number_of_steps // 10) == 0:
+                print(f'Step {step_index}/{number_of_steps} simulated.')
+            if bm_increments is None:
+                bm_step = next(increment_blocks)[0]
+                if importance_sampling:
+                    bm_step += path_shifts * discretisation_interval
+                    brownian_motion += bm_step
+            else:
+                bm_step = bm_increments[..., step_index - 1]
+            if current_state.ndim > bm_step.ndim:  # Common random numbers across scenarios
+                bm_step = bm_step[:, None]
+            if self.update_leverage is not None:  # Calibrate or look up the leverage at the start of the step
+                self.update_leverage(time=(step_index - 1) * discretisation_interval, state=current_state,
+                                     discretisation_interval=discretisation_interval)
+            next_state = self.step(current_state=current_state, bm_step=bm_step,
+                                   discretisation_interval=discretisation_interval)
+            if self.payoff_engine is not None:
+                self.payoff_engine.update(time=step_index * discretisation_interval, previous_state=current_state,
+                                          current_state=next_state, discretisation_interval=discretisation_interval,
+                                          simulator=self)
+            current_state = next_state
+            yield step_index, current_state
+        if importance_sampling:
+            self.path_weights = self.get_importance_weights(brownian_motion=brownian_motion,
+                                                            time=number_of_steps * discretisation_interval)
+
+    def iterate_bm_increments(self, number_of_paths, number_of_steps, discretisation_interval, block_steps=1):
+        """
+        Generator over the Brownian increments of a batch of paths, yielding blocks with shape (steps, dim, paths) of
+        block_steps time steps. Increments are drawn lazily, so that other draws of the scheme interleave with them,
+        and are sampled according to sampling:
+            - 'pseudo_random': independent normal draws.
+            - 'moment_matched': the increments of each step and component are shifted and scaled over the paths of
+              the batch to sample mean zero and sample variance discretisation_interval.
+            - 'stratified': the terminal value of the first Brownian component, which drives the price, is drawn
+              from one of number_of_strata equiprobable strata, path j from stratum j mod number_of_strata, and the
+              path is filled in by Brownian bridge steps towards it.
+
+        Parameters
+        ----------
+        number_of_paths : int
+            Number of paths in the batch.
+        number_of_steps : int
+            Number of time steps.
+        discretisation_interval : float
+            Time step size.
+        block_steps : int
+            Number of time steps per block.
+        """
+        root_interval = np.sqrt(discretisation_interval)
+        if self.sampling == 'stratified':
+            strata = np.arange(number_of_paths) % self.number_of_strata
+            uniforms = (strata + self.rng.random(number_of_paths)) / self.number_of_strata
+            # Terminal value less the Brownian motion so far
+            remaining = np.sqrt(number_of_steps * discretisation_interval) * ndtri(uniforms)
+        for block_start in range(0, number_of_steps, block_steps):
+            block_stop = min(block_start + block_steps, number_of_steps)
+            increments = self.rng.normal(0, root_interval, (block_stop - block_start, self.dim, number_of_paths))
+            if self.sampling == 'moment_matched':
+                increments -= increments.mean(axis=-1, keepdims=True)
+                increments *= root_interval / increments.std(axis=-1, keepdims=True)
+            elif self.sampling == 'stratified':
+                for step_index in range(block_start, block_stop):
+                    # Conditional on the remaining value, the increment has mean remaining / remaining_steps and
+                    # variance discretisation_interval (remaining_steps - 1) / remaining_steps
+                    remaining_steps = number_of_steps - step_index
+                    increment = increments[step_index - block_start, 0]
+                    increment *= np.sqrt((remaining_steps - 1) / remaining_steps)
+                    increment += remaining / remaining_steps
+                    remaining -= increment
+            yield increments
+            del increments  # Released before the next block is drawn
+
+    def iterate_kernel_blocks(self, initial_state, number_of_steps, discretisation_interval, bm_increments=None,
+                              out=None):
+        """
+        Generator advancing a batch of paths with the compiled path kernel of the numba backend, kernel_block_steps
+        time steps at a time, and yielding the first step index and the states with shape (paths, steps) of each block.
+        Brownian increments are drawn a block at a time in the order of iterate_steps, so that both backends consume
+        the same random numbers. If importance_strikes is set and increments are drawn, the likelihood ratio weights of
+        the batch are set in path_weights once it is exhausted.
+
+        Parameters
+        ----------
+        initial_state : np.ndarray
+            Initial state with shape (1, paths).
+        number_of_steps : int
+            Number of time steps.
+        discretisation_interval : float
+            Time step size.
+        bm_increments : np.ndarray
+            Optional Brownian increments with shape (1, paths, number_of_steps).
+        out : np.ndarray
+            Optional array with shape (paths, number_of_steps) receiving the states, e.g. the path samples after the
+            initial condition. Each block is written to a recycled buffer if not provided.
+        """
+        number_of_paths = initial_state.shape[-1]
+        importance_sampling = self.importance_strikes is not None and bm_increments is None
+        if importance_sampling:
+            shifts = np.asarray(self.importance_shifts)
+            path_shifts = shifts[self.rng.integers(len(shifts), size=number_of_paths)].T
+            brownian_motion = np.zeros((1, number_of_paths))
+        state = initial_state[0].astype(float)
+        if out is None:  # Step-major buffer, so that the state at each step is contiguous
+            block_states = np.empty((min(self.kernel_block_steps, number_of_steps), number_of_paths)).T
+        if bm_increments is None:
+            increment_blocks = self.iterate_bm_increments(number_of_paths=number_of_paths,
+                                                          number_of_steps=number_of_steps,
+                                                          discretisation_interval=discretisation_interval,
+                                                          block_steps=self.kernel_block_steps)
+        for block_start in range(0, number_of_steps, self.kernel_block_steps):
+            block_stop = min(block_start + self.kernel_block_steps, number_of_steps)
+            if bm_increments is None:
+                increments = next(increment_blocks)
+                if importance_sampling:
+                    increments += path_shifts * discretisation_interval
+                    brownian_motion += increments.sum(axis=0)
+                increments = increments[:, 0]
+            else:
+                increments = bm_increments[0, :, block_start:block_stop].T
+            states = (block_states[:, :block_stop - block_start] if out is None
+                      else out[:, block_start:block_stop])
+            self.path_kernel(state, increments, discretisation_interval, states)
+            del increments  # Released before the next block is drawn
+            yield block_start + 1, states
+        if importance_sampling:
+            self.path_weights = self.get_importance_weights(brownian_motion=brownian_motion,
+                                                            time=number_of_steps * discretisation_interval)
+
+    def iterate_kernel_steps(self, initial_state, number_of_steps, discretisation_interval, bm_increments=None,
+                             verbose=False):
+        """
+        Generator equivalent to iterate_steps for the numba backend, yielding the states of each block of
+        iterate_kernel_blocks step by step so that payoffs are updated as by the NumPy backend.
+
+        Parameters
+        ----------
+        initial_state : np.ndarray
+            Initial state with shape (1, paths).
+        number_of_steps : int
+            Number of time steps.
+        discretisation_interval : float
+            Time step size.
+        bm_increments : np.ndarray
+            Optional Brownian increments with shape (1, paths, number_of_steps).
+        verbose : bool
+            Print progress every tenth of the time steps.
+        """
+        current_state = initial_state
+        if self.payoff_engine is not None:
+            self.payoff_engine.initialise(initial_state)
+        for first_step_index, states in self.iterate_kernel_blocks(initial_state=initial_state,
+                                                                   number_of_steps=number_of_steps,
+                                                                   discretisation_interval=discretisation_interval,
+                                                                   bm_increments=bm_increments):
+            for block_index in range(states.shape[1]):
+                step_index = first_step_index + block_index
+                if verbose and number_of_steps >= 10 and step_index % (number_of_steps // 10) == 0:
+                    print(f'Step {step_index}/{number_of_steps} simulated.')
+                next_state = states[None, :, block_index].copy()  # Block states are overwritten by the next block
+                if self.payoff_engine is not None:
+                    self.payoff_engine.update(time=step_index * discretisation_interval, previous_state=current_state,
+                                              current_state=next_state,
+                                              discretisation_interval=discretisation_interval, simulator=self)
+                current_state = next_state
+                yield step_index, current_state
 
     @abstractmethod
-    def sim_path(self, path_samples, discretisation_interval):
+    def step(self, current_state, bm_step, discretisation_interval):
         """
-        Abstract method for simulating a single path.
+        Abstract method for advancing a batch of paths by one time step.
+
+        Parameters
+        ----------
+        current_state : np.ndarray
+            State with shape (dim, paths).
+        bm_step : np.ndarray
+            Brownian increments with shape (dim, paths).
+        discretisation_interval : float
+            Time step size.
         """
         pass
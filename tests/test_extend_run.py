@@ -0,0 +1,57 @@
+import os
+import sys
+import numpy as np
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_analysis'))
+import run
+from extend_run import extend_horizon
+from price_option import price_option
+from price_call_black_scholes import price_call_black_scholes
+from utils.data_utils import read_json, read_samples
+
+SIGMA = 0.2
+RISK_FREE_RATE = 0.05
+
+
+def write_config(directory, sampling, chunk_size=None):
+    """
+    Write the config of a seeded BlackScholes run to final time 1 with sampling, returning its path.
+    """
+    simulation = [f'sampling = {sampling}', 'number_of_strata = 100'] if sampling != 'pseudo_random' else []
+    if chunk_size:
+        simulation.append(f'chunk_size = {chunk_size}')
+    config_path = os.path.join(directory, 'config.ini')
+    with open(config_path, 'w') as f:
+        f.write('\n'.join([
+            '[run]', 'model_name = BlackScholes', 'simulator_name = MilsteinSimulator',
+            '[model_params]', 'q = 0.0', f'sigma = {SIGMA}', f'risk_free_rate = {RISK_FREE_RATE}',
+            '[simulation]', 'initial_value = 1.0', 'final_time = 1.0', 'discretisation_parameter = 51',
+            'number_of_paths = 20000', 'seed = 0', 'verbose = False', *simulation,
+            '[output]', f'output_directory = {os.path.join(directory, "output")}']))
+    return config_path
+
+
+@pytest.mark.parametrize('sampling', ['pseudo_random', 'moment_matched', 'stratified'])
+def test_extend_horizon_matches_black_scholes(tmp_path, sampling):
+    config_path = write_config(str(tmp_path), sampling=sampling, chunk_size=5000)
+    run.main(config_path)
+    directory = os.path.join(str(tmp_path), 'output')
+    original_price = np.array(read_samples(directory)['price'])
+    extend_horizon(config_path=config_path, final_time=2.0)
+    params = read_json(os.path.join(directory, 'params.json'))
+    assert params['final_time'] == 2.0 and params['discretisation_parameter'] == 101
+    assert params.get('sampling', 'pseudo_random') == sampling
+    samples = read_samples(directory)
+    price = np.asarray(samples['price'])
+    assert price.shape == (20000, 101)
+    assert np.array_equal(price[:, :51], original_price)
+    # Increments of the log price over the run and its continuation are independent with variance σ² each
+    first_increment = np.log(price[:, 50])
+    second_increment = np.log(price[:, 100] / price[:, 50])
+    assert abs(np.corrcoef(first_increment, second_increment)[0, 1]) < 0.05
+    assert np.var(np.log(price[:, 100])) == pytest.approx(2 * SIGMA ** 2, rel=0.05)
+    call_price, call_price_error = price_option(directory=directory, strike=1.3, maturity=2.0)
+    exact_price = price_call_black_scholes(stock_price=1.0, strike=1.3, maturity=2.0, risk_free_rate=RISK_FREE_RATE,
+                                           sigma=SIGMA, q=0.0)
+    assert abs(call_price - exact_price) < 5 * call_price_error + 1e-3
@@ -0,0 +1,61 @@
+import os
+import sys
+import tracemalloc
+import configparser
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from run import build_simulator
+from utils.build_utils import parse_memory_size
+from utils.memory_utils import estimate_memory, get_reserved_memory
+
+# Budgets forcing a chunked run of each backend, whose reserved memory differs
+MAX_MEMORY = {'numpy': '70MB', 'numba': '240MB'}
+
+
+def get_config(backend, store_samples, number_of_paths=100000, max_memory=MAX_MEMORY['numba']):
+    """
+    Config of a seeded BlackScholes run with backend, planned to fit in max_memory.
+    """
+    config = configparser.ConfigParser()
+    config['run'] = {'model_name': 'BlackScholes', 'simulator_name': 'MilsteinSimulator'}
+    config['model_params'] = {'q': '0.0', 'sigma': '0.2', 'risk_free_rate': '0.05'}
+    config['simulation'] = {'initial_value': '1.0', 'final_time': '1.0', 'discretisation_parameter': '513',
+                            'number_of_paths': str(number_of_paths), 'seed': '0', 'verbose': 'False',
+                            'backend': f"'{backend}'", 'store_samples': str(store_samples),
+                            'max_memory': f"'{max_memory}'"}
+    if not store_samples:
+        config['payoffs'] = {'call': "{'payoff_name': 'EuropeanOption', 'strike': 1.0}"}
+    return config
+
+
+@pytest.mark.parametrize('store_samples', [False, True], ids=['payoffs', 'samples'])
+def test_numba_plan_counts_kernel_blocks(store_samples):
+    pytest.importorskip('numba')
+    simulator = build_simulator(get_config(backend='numba', store_samples=store_samples))
+    assert simulator.path_kernel is not None
+    estimate = estimate_memory(simulator, simulator.chunk_size)
+    # Increment blocks, and state blocks unless the kernel writes to the samples in place
+    block_arrays = 1 if store_samples else 2
+    assert estimate['kernel_blocks'] == 8 * simulator.chunk_size * block_arrays * simulator.kernel_block_steps
+    assert sum(estimate.values()) + get_reserved_memory(simulator) <= parse_memory_size(simulator.max_memory)
+    numpy_simulator = build_simulator(get_config(backend='numpy', store_samples=store_samples))
+    assert 'kernel_blocks' not in estimate_memory(numpy_simulator, numpy_simulator.number_of_paths)
+
+
+@pytest.mark.parametrize('backend', ['numpy', 'numba'])
+def test_planned_payoff_run_fits_budget(tmp_path, backend):
+    if backend == 'numba':
+        pytest.importorskip('numba')
+    # Compile the path kernel before tracing, as compilation is covered by the reserved memory
+    build_simulator(get_config(backend=backend, store_samples=False, number_of_paths=10)).sim(
+        directory=str(tmp_path))
+    simulator = build_simulator(get_config(backend=backend, store_samples=False, max_memory=MAX_MEMORY[backend]))
+    assert simulator.chunk_size < simulator.number_of_paths
+    budget = parse_memory_size(simulator.max_memory) - get_reserved_memory(simulator)
+    tracemalloc.start()
+    try:
+        simulator.sim(directory=str(tmp_path))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak <= budget
@@ -0,0 +1,81 @@
+import os
+import sys
+import configparser
+import numpy as np
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from run import build_simulator
+from utils import jit_utils
+from utils.data_utils import read_json, read_samples
+
+MODEL_PARAMS = {'BlackScholes': {'q': 0.0, 'sigma': 0.3, 'risk_free_rate': 0.05},
+                'CoxIngersollRoss': {'kappa': 0.5, 'eta': 0.04, 'lmbda': 0.2, 'risk_free_rate': 0.05},
+                'OrnsteinUhlenbeck': {'kappa': 0.5, 'eta': 1.2, 'lmbda': 0.2, 'risk_free_rate': 0.05}}
+SIMULATORS = ['EulerSimulator', 'MilsteinSimulator']
+PAYOFFS = {'european_call': {'payoff_name': 'EuropeanOption', 'strike': 1.0},
+           'asian_put': {'payoff_name': 'AsianOption', 'strike': 1.0, 'option_type': 'put'},
+           'up_and_out_call': {'payoff_name': 'BarrierOption', 'strike': 1.0, 'barrier': 1.5,
+                               'barrier_type': 'up_and_out'}}
+
+
+def get_config(model_name, simulator_name, backend, payoffs=False, chunk_size=None):
+    """
+    Config of a small seeded run of model_name with simulator_name and backend.
+    """
+    config = configparser.ConfigParser()
+    config['run'] = {'model_name': model_name, 'simulator_name': simulator_name}
+    config['model_params'] = {key: str(value) for key, value in MODEL_PARAMS[model_name].items()}
+    config['simulation'] = {'initial_value': '1.0', 'final_time': '1.0', 'discretisation_parameter': '65',
+                            'number_of_paths': '500', 'seed': '0', 'verbose': 'False', 'backend': f"'{backend}'"}
+    if chunk_size:
+        config['simulation']['chunk_size'] = str(chunk_size)
+    if payoffs:
+        config['payoffs'] = {label: repr(payoff_params) for label, payoff_params in PAYOFFS.items()}
+    return config
+
+
+def simulate(directory, **config_kwargs):
+    """
+    Run the simulation of the config in directory and return the simulator, samples and payoffs.
+    """
+    os.makedirs(directory, exist_ok=True)
+    simulator = build_simulator(get_config(**config_kwargs))
+    simulator.sim(directory=directory)
+    return simulator, read_samples(directory), read_json(os.path.join(directory, 'payoffs.json'))
+
+
+def assert_same_outputs(reference, outputs):
+    """
+    Assert that samples and payoffs of two runs are identical.
+    """
+    _, reference_samples, reference_payoffs = reference
+    _, samples, payoffs = outputs
+    assert reference_samples.keys() == samples.keys()
+    for key in reference_samples:
+        assert np.array_equal(np.asarray(reference_samples[key]), np.asarray(samples[key]))
+    assert reference_payoffs == payoffs
+
+
+@pytest.mark.parametrize('model_name', list(MODEL_PARAMS))
+@pytest.mark.parametrize('simulator_name', SIMULATORS)
+@pytest.mark.parametrize('payoffs, chunk_size', [(False, None), (False, 200), (True, None), (True, 200)],
+                         ids=['direct', 'direct_chunked', 'payoffs', 'payoffs_chunked'])
+def test_numba_matches_numpy(tmp_path, model_name, simulator_name, payoffs, chunk_size):
+    pytest.importorskip('numba')
+    run = {'model_name': model_name, 'simulator_name': simulator_name, 'payoffs': payoffs, 'chunk_size': chunk_size}
+    reference = simulate(str(tmp_path / 'numpy'), backend='numpy', **run)
+    outputs = simulate(str(tmp_path / 'numba'), backend='numba', **run)
+    assert outputs[0].path_kernel is not None
+    assert_same_outputs(reference, outputs)
+
+
+@pytest.mark.parametrize('model_name', list(MODEL_PARAMS))
+@pytest.mark.parametrize('simulator_name', SIMULATORS)
+def test_numpy_fallback(tmp_path, monkeypatch, model_name, simulator_name):
+    monkeypatch.setitem(sys.modules, 'numba', None)  # Import of numba raises ImportError
+    monkeypatch.setattr(jit_utils, 'PATH_KERNELS', {})
+    run = {'model_name': model_name, 'simulator_name': simulator_name, 'payoffs': True}
+    reference = simulate(str(tmp_path / 'numpy'), backend='numpy', **run)
+    outputs = simulate(str(tmp_path / 'fallback'), backend='numba', **run)
+    assert outputs[0].path_kernel is None
+    assert_same_outputs(reference, outputs)
@@ -0,0 +1,150 @@
+import os
+import sys
+import numpy as np
+from utils.data_utils import read_json, write_json, read_samples, read_weights
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_analysis'))
+
+# Sample analysis steps which can be run by run.py after simulation, set in the [analysis] section of a config
+ANALYSIS_STEPS = ['price_surface', 'smile', 'marginal', 'trajectory']
+# Parameters of the [analysis] section required by each step
+REQUIRED_ANALYSIS_PARAMS = {'price_surface': ['strikes'], 'smile': ['low_strike', 'high_strike']}
+
+
+def get_analysis_steps(analysis_params, store_samples=True):
+    """
+    Steps of the [analysis] section, given as a list or a comma separated string. Raises ValueError for unknown steps
+    or steps on a run without samples, and TypeError for steps missing required parameters, so that configs can be
+    validated before simulating.
+
+    Parameters
+    ----------
+    analysis_params : dict
+        Parameters of the [analysis] section.
+    store_samples : bool
+        Whether the run stores the samples analysed by the steps.
+    """
+    steps = analysis_params.get('steps', [])
+    if isinstance(steps, str):
+        steps = [step.strip() for step in steps.split(',') if step.strip()]
+    unknown_steps = [step for step in steps if step not in ANALYSIS_STEPS]
+    if unknown_steps:
+        raise ValueError(f'Analysis steps {unknown_steps} not found. Available: {ANALYSIS_STEPS}')
+    if steps and not store_samples:
+        raise ValueError('Analysis steps require samples. Set store_samples = True in simulation in config_file.')
+    for step in steps:
+        for key in REQUIRED_ANALYSIS_PARAMS.get(step, []):
+            get_analysis_param(analysis_params, key, step)
+    return steps
+
+
+def get_analysis_param(analysis_params, key, step, default=None):
+    """
+    Read a parameter of an analysis step, raising TypeError if it is required and missing.
+
+    Parameters
+    ----------
+    analysis_params : dict
+        Parameters of the [analysis] section.
+    key : str
+        Parameter name.
+    step : str
+        Analysis step requiring the parameter.
+    default : object
+        Value used if the parameter is not set. The parameter is required if None.
+    """
+    value = analysis_params.get(key, default)
+    if value is None:
+        raise TypeError(f'Analysis step {step} cannot be run without {key}. Please set in analysis in config_file.')
+    return value
+
+
+def price_surface(directory, strikes, maturities, samples=None, weights=None):
+    """
+    Compute European call prices and implied volatilities on a grid of strikes and maturities and write them to
+    price_surface.json, with prices and implied volatilities of shape (maturities, strikes). Implied volatilities
+    which cannot be computed are null, so the file may be used as market data for calibrate_heston.py.
+
+    Parameters
+    ----------
+    directory : str
+        Path to directory containing simulation data.
+    strikes : list
+        Option strikes.
+    maturities : list
+        Option maturities.
+    samples : dict
+        Samples already in memory. Read from directory if not provided.
+    weights : np.ndarray
+        Likelihood ratio weights of samples already in memory.
+    """
+    from price_option import price_option
+    from implied_volatility import implied_volatility
+    if samples is None:
+        samples, weights = read_samples(directory), read_weights(directory)
+    params = read_json(os.path.join(directory, 'params.json'))
+    surface = {'strikes': list(strikes), 'maturities': list(maturities)}
+    results = []
+    for maturity in maturities:
+        row = []
+        for strike in strikes:
+            price = price_option(directory=directory, strike=strike, maturity=maturity, samples=samples,
+                                 weights=weights, params=params)
+            row.append(price + implied_volatility(directory=directory, strike=strike, maturity=maturity,
+                                                  params=params, call_price=price[0], call_price_error=price[1]))
+        results.append(row)
+    for result_index, key in enumerate(['prices', 'price_errors', 'implied_volatilities', 'implied_volatility_errors']):
+        surface[key] = [[None if result[result_index] is None else float(result[result_index]) for result in row]
+                        for row in results]
+    write_json(directory=directory, price_surface=surface)
+    return surface
+
+
+def run_analysis(analysis_params, directories, samples=None, weights=None):
+    """
+    Run sample analysis steps in the simulating process, on samples still held in memory where available so that
+    they are not reloaded from disk by each step.
+
+    Parameters
+    ----------
+    analysis_params : dict
+        Parameters of the [analysis] section. steps lists the steps to run, in order, from ANALYSIS_STEPS.
+    directories : list
+        Output directory of each scenario of the run, to which analysis outputs are written.
+    samples : list
+        Samples of each directory held in memory by the simulator. Read from each directory, memory-mapped for
+        chunked runs, if not provided.
+    weights : list
+        Likelihood ratio weights of the samples held in memory, None for each directory if not importance sampled.
+    """
+    from plot_volatility_smile import plot_volatility_smile
+    from plot_time_marginal_dist import plot_time_marginal_dist
+    from plot_trajectory import plot_trajectory
+    for index, directory in enumerate(directories):
+        params = read_json(os.path.join(directory, 'params.json'))
+        steps = get_analysis_steps(analysis_params, store_samples=params.get('store_samples', True))
+        if samples is None:
+            directory_samples, directory_weights = read_samples(directory), read_weights(directory)
+        else:
+            directory_samples, directory_weights = samples[index], weights[index]
+        final_time = params['final_time']
+        for step in steps:
+            print(f'Running analysis step {step} on {directory}.')
+            if step == 'price_surface':
+                price_surface(directory=directory, strikes=get_analysis_param(analysis_params, 'strikes', step),
+                              maturities=np.atleast_1d(analysis_params.get('maturities', final_time)).tolist(),
+                              samples=directory_samples, weights=directory_weights)
+            elif step == 'smile':
+                plot_volatility_smile(directories=[directory],
+                                      low_strike=get_analysis_param(analysis_params, 'low_strike', step),
+                                      high_strike=get_analysis_param(analysis_params, 'high_strike', step),
+                                      maturity=analysis_params.get('maturity', final_time),
+                                      samples=[directory_samples], weights=[directory_weights])
+            elif step == 'marginal':
+                plot_time_marginal_dist(directories=[directory],
+                                        marginal_time=analysis_params.get('marginal_times', final_time),
+                                        streaming=analysis_params.get('streaming', False),
+                                        kde=analysis_params.get('kde', False), samples=[directory_samples],
+                                        weights=[directory_weights])
+            elif step == 'trajectory':
+                plot_trajectory(directory=directory, mode=analysis_params.get('trajectory_mode', 'summary'),
+                                samples=directory_samples)
@@ -47,6 +47,45 @@ def parse_possible_list(value):
     return [value]
 
 
+def parse_test_function(expression):
+    """
+    Convert a string expression in x e.g. "x ** 2" or "np.maximum(x - 1.0, 0)" to a vectorized callable acting on
+    arrays of samples. Callables are returned unchanged.
+    """
+    import numpy as np
+    if callable(expression):
+        return expression
+    code = compile(expression, '<test_function>', 'eval')
+
+    def test_function(x):
+        return np.broadcast_to(eval(code, {'np': np, '__builtins__': {}}, {'x': x}), np.shape(x))
+    return test_function
+
+
+def parse_memory_size(value):
+    """
+    Convert a memory size e.g. 512MB, 2.5GB or a number of bytes to an integer number of bytes.
+    """
+    import re
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?i?B?)\s*', str(value), flags=re.IGNORECASE)
+    if match is None:
+        raise ValueError(f'Could not parse memory size {value}. Expected e.g. 512MB or 2GB.')
+    number, unit = match.groups()
+    exponent = 'BKMGT'.index(unit[0].upper()) if unit else 0
+    return int(float(number) * 1024 ** exponent)
+
+
+def format_memory_size(value):
+    """
+    Convert a number of bytes to a human readable memory size e.g. 1.5GB.
+    """
+    for exponent, unit in reversed(list(enumerate(['B', 'KB', 'MB', 'GB', 'TB']))):
+        if value >= 1024 ** exponent or exponent == 0:
+            return f'{value / 1024 ** exponent:.3g}{unit}'
+
+
 def to_camel_case(s):
     """
     Convert a snake_case string to CamelCase. For example, "black_scholes" becomes "BlackScholes".
@@ -0,0 +1,237 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from utils.data_utils import read_json, write_json, write_npy, link_or_copy, open_sample_columns, read_samples
+
+# Simulator attributes which do not change simulated values
+NON_RESULT_PARAMS = ['verbose', 'write_buffers', 'max_memory', 'backend']
+# Simulator attributes a cached run may exceed and still serve a request from a subset of its samples
+SUBSET_PARAMS = ['number_of_paths', 'discretisation_parameter', 'final_time', 'chunk_size']
+
+
+def get_code_version():
+    """
+    Hash of the source of the models, payoffs, simulators and utils packages, so that cached results are invalidated
+    whenever the simulation code changes.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code_hash = hashlib.sha256()
+    for package in ['models', 'payoffs', 'simulators', 'utils']:
+        for file_name in sorted(os.listdir(os.path.join(root, package))):
+            if file_name.endswith('.py'):
+                with open(os.path.join(root, package, file_name), 'rb') as f:
+                    code_hash.update(file_name.encode() + f.read())
+    return code_hash.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of simulation outputs. Entries are keyed by a hash of the canonicalised model parameters,
+    simulation parameters, payoffs, simulator name, code version and seed, and output files are hard linked between the
+    cache and output directories so that hits cost no copying. Entries are evicted least recently used first once the
+    cache exceeds max_size. A request which misses may still be served from an entry with the same model, simulator
+    and seed but more paths, a denser time grid or a later final time, by extracting the requested subset of its
+    samples.
+    """
+    def __init__(self, directory, max_size=None):
+        """
+        Parameters
+        ----------
+        directory : str
+            Cache directory.
+        max_size : int
+            Maximum total size of cached entries in bytes. Unbounded if None.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.code_version = get_code_version()
+        os.makedirs(directory, exist_ok=True)
+
+    def get_keys(self, simulator):
+        """
+        Compute the exact cache key and the subset family key of a simulator configuration.
+
+        Parameters
+        ----------
+        simulator : Simulator
+            Configured simulator.
+        """
+        params = {key: value for key, value in simulator.get_params().items() if key not in NON_RESULT_PARAMS}
+        params['code_version'] = self.code_version
+        family_params = {key: value for key, value in params.items() if key not in SUBSET_PARAMS}
+        key, family_key = (hashlib.sha256(json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()
+                           for canonical in (params, family_params))
+        return key, family_key
+
+    def fetch(self, simulator, directory):
+        """
+        Populate directory with cached outputs for simulator if available.
+
+        Parameters
+        ----------
+        simulator : Simulator
+            Configured simulator.
+        directory : str
+            Output directory to write to.
+
+        Returns
+        -------
+        bool
+            Whether the request was served from the cache.
+        """
+        if simulator.seed is None:
+            print('Result cache is only used for seeded simulations. Set seed in simulation in config_file.')
+            return False
+        key, family_key = self.get_keys(simulator)
+        entry = os.path.join(self.directory, key)
+        if os.path.isdir(entry):
+            for file_name in simulator.output_file_names():
+                link_or_copy(os.path.join(entry, file_name), os.path.join(directory, file_name))
+            self.touch(entry)
+            print(f'Cache hit {key[:12]}. Outputs linked to {directory}.')
+            return True
+        if (simulator.payoff_engine is not None or simulator.number_of_scenarios is not None
+                or simulator.importance_strikes is not None or simulator.update_leverage is not None):
+            return False  # Payoffs, scenarios, weights and leverage grids are not extracted from a subset
+        for entry_key, metadata in self.entries().items():
+            if metadata['family_key'] != family_key:
+                continue
+            stride = self.get_subset_stride(cached=metadata, requested=simulator)
+            if stride is not None:
+                self.extract_subset(entry=os.path.join(self.directory, entry_key), simulator=simulator,
+                                    stride=stride, directory=directory)
+                self.touch(os.path.join(self.directory, entry_key))
+                print(f'Cache hit {entry_key[:12]} ({metadata["number_of_paths"]} paths, discretisation parameter '
+                      f'{metadata["discretisation_parameter"]}, final time {metadata["final_time"]}). '
+                      f'Requested subset written to {directory}.')
+                return True
+        return False
+
+    def store(self, simulator, directory):
+        """
+        Add the outputs of a completed simulation to the cache and evict old entries.
+
+        Parameters
+        ----------
+        simulator : Simulator
+            Simulator which has completed sim.
+        directory : str
+            Output directory written by sim.
+        """
+        if simulator.seed is None:
+            return
+        key, family_key = self.get_keys(simulator)
+        entry = os.path.join(self.directory, key)
+        if os.path.isdir(entry):
+            return
+        staging_entry = f'{entry}.tmp{os.getpid()}'
+        os.makedirs(staging_entry, exist_ok=True)
+        for file_name in simulator.output_file_names():
+            link_or_copy(os.path.join(directory, file_name), os.path.join(staging_entry, file_name))
+        metadata = {'family_key': family_key} | {key: getattr(simulator, key) for key in SUBSET_PARAMS}
+        write_json(directory=staging_entry, cache=metadata)
+        os.replace(staging_entry, entry)
+        self.touch(entry)
+        self.evict()
+
+    def entries(self):
+        """
+        Metadata of all complete cache entries.
+        """
+        entries = {}
+        for entry_key in os.listdir(self.directory):
+            metadata = read_json(os.path.join(self.directory, entry_key, 'cache.json'))
+            if metadata:
+                entries[entry_key] = metadata
+        return entries
+
+    def touch(self, entry):
+        """
+        Record access time of a cache entry for least recently used eviction.
+
+        Parameters
+        ----------
+        entry : str
+            Path to cache entry.
+        """
+        os.utime(os.path.join(entry, 'cache.json'))
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits in max_size.
+        """
+        if self.max_size is None:
+            return
+        entries = []
+        for entry_key in self.entries():
+            entry = os.path.join(self.directory, entry_key)
+            size = sum(os.path.getsize(os.path.join(root, file_name)) for root, _, file_names in os.walk(entry)
+                       for file_name in file_names)
+            entries.append((os.path.getmtime(os.path.join(entry, 'cache.json')), size, entry))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry)
+            total_size -= size
+            print(f'Evicted cache entry {os.path.basename(entry)[:12]}.')
+
+    @staticmethod
+    def get_subset_stride(cached, requested):
+        """
+        Time stride with which the requested time grid can be read from a cached run, or None if the requested run is
+        not a subset of the cached run.
+
+        Parameters
+        ----------
+        cached : dict
+            Cache entry metadata.
+        requested : Simulator
+            Configured simulator.
+        """
+        if requested.number_of_paths > cached['number_of_paths'] or requested.final_time > cached['final_time']:
+            return None
+        cached_interval = cached['final_time'] / (cached['discretisation_parameter'] - 1)
+        requested_interval = requested.final_time / (requested.discretisation_parameter - 1)
+        stride = int(round(requested_interval / cached_interval))
+        if stride < 1 or not np.isclose(stride * cached_interval, requested_interval):
+            return None
+        return stride
+
+    @staticmethod
+    def extract_subset(entry, simulator, stride, directory):
+        """
+        Write the first number_of_paths paths of a cached run, every stride time points up to final_time, to
+        directory in the output layout of simulator.
+
+        Parameters
+        ----------
+        entry : str
+            Path to cache entry.
+        simulator : Simulator
+            Configured simulator.
+        stride : int
+            Time stride.
+        directory : str
+            Output directory to write to.
+        """
+        samples = read_samples(entry)
+        time_slice = slice(0, (simulator.discretisation_parameter - 1) * stride + 1, stride)
+        time_values = samples['time'][time_slice]
+        if simulator.chunk_size:
+            write_npy(directory=directory, time=time_values)
+            columns = open_sample_columns(directory=directory, state=simulator.output_state,
+                                          shape=(simulator.number_of_paths, simulator.discretisation_parameter))
+            for column, state_component in zip(columns, simulator.output_state):
+                for start in range(0, simulator.number_of_paths, simulator.chunk_size):
+                    stop = min(start + simulator.chunk_size, simulator.number_of_paths)
+                    column[start:stop] = samples[state_component][start:stop, time_slice]
+                column.flush()
+        else:
+            subset = {'time': time_values} | {
+                state_component: np.asarray(samples[state_component][:simulator.number_of_paths, time_slice])
+                for state_component in simulator.output_state}
+            write_npy(directory=directory, samples=subset)
+        simulator.write_params(directory=directory, cache_source=os.path.basename(entry))
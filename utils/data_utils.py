@@ -13,6 +13,7 @@ def write_npy(directory, **data_arrays):
         from numpy import save
         for array_name, array_data in data_arrays.items():
             file_path = join(directory, f"{array_name}.npy")
+            remove_file(file_path)
             save(file_path, array_data)
         print(f"{file_path} saved.")
 
@@ -32,11 +33,68 @@ def write_json(directory, **data_arrays):
         from json import dump
         for array_name, array_data in data_arrays.items():
             file_path = join(directory, f"{array_name}.json")
+            remove_file(file_path)
             with open(file_path, "w") as f:
                   dump(array_data, f, indent=4)
         print(f"{file_path} saved.")
 
 
+def replace_json(file_path, data):
+    """
+    Atomically replace a json file, so that an interrupted write never leaves a partial file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the json file.
+    data : dict
+        JSON serialisable data.
+    """
+    import os
+    from json import dump
+    temporary_path = f'{file_path}.tmp'
+    with open(temporary_path, 'w') as f:
+        dump(data, f)
+    os.replace(temporary_path, file_path)
+
+
+def remove_file(file_path):
+    """
+    Remove a file before it is rewritten, so that outputs are replaced rather than truncated in place and files
+    hard-linked elsewhere e.g. into the result cache are never modified.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to file.
+    """
+    import os
+    if os.path.lexists(file_path):
+        os.remove(file_path)
+
+
+def link_or_copy(source_path, destination_path):
+    """
+    Hard link a file to a new path, falling back to a copy e.g. across file systems. Any existing file at the
+    destination is replaced.
+
+    Parameters
+    ----------
+    source_path : str
+        Path to existing file.
+    destination_path : str
+        Path to link or copy to.
+    """
+    import os
+    import shutil
+    os.makedirs(os.path.dirname(destination_path) or '.', exist_ok=True)
+    remove_file(destination_path)
+    try:
+        os.link(source_path, destination_path)
+    except OSError:
+        shutil.copy2(source_path, destination_path)
+
+
 def read_json(json_path):
     """
     Read data from a json file.
@@ -68,3 +126,373 @@ def get_color_map(num_colors):
                                                       "#F00000", "#FF3333", "#FF6666", "#FF9999"])
     colors = cmap(np.linspace(0, 1, num_colors))
     return colors, cmap
+
+
+def open_sample_columns(directory, state, shape=None, mode='w+'):
+    """
+    Open one memory-mapped npy column per state component e.g. price.npy, volatility.npy.
+
+    Parameters
+    ----------
+    directory : str
+        Path to directory where data will be saved.
+    state : list
+        Components of the state vector.
+    shape : tuple
+        Shape (paths, time) of each column. Required for new columns.
+    mode : str
+        Memory-map mode. 'w+' creates new columns and 'r+' opens existing columns for writing.
+    """
+    from os.path import join
+    from numpy.lib.format import open_memmap
+    if mode == 'w+':
+        for state_component in state:
+            remove_file(join(directory, f"{state_component}.npy"))
+        return [open_memmap(join(directory, f"{state_component}.npy"), mode=mode, dtype='float64', shape=shape)
+                for state_component in state]
+    return [open_memmap(join(directory, f"{state_component}.npy"), mode=mode) for state_component in state]
+
+
+def read_samples(directory, mmap_mode='r', use_manifest=True):
+    """
+    Read simulation samples as a dictionary {'time' : time_values, <state1> : state1_values, ...}. Samples written
+    in one piece are loaded from samples.npy and samples written in chunks are opened as memory-mapped columns.
+    Directories of merged shards or extended runs are read through their manifest.json as columns concatenated from
+    the samples of each part.
+
+    Parameters
+    ----------
+    directory : str
+        Path to directory containing simulation data.
+    mmap_mode : str
+        Memory-map mode used for sample columns.
+    use_manifest : bool
+        Read through manifest.json if present. If False, only the samples written to directory itself are read.
+    """
+    import os
+    import numpy as np
+    manifest = read_json(os.path.join(directory, "manifest.json")) if use_manifest else {}
+    if manifest:
+        return read_manifest_part(directory=directory, part=manifest, output_state=manifest['output_state'],
+                                  mmap_mode=mmap_mode)
+    samples_file_path = os.path.join(directory, "samples.npy")
+    if os.path.exists(samples_file_path):
+        return np.load(samples_file_path, allow_pickle=True).item()
+    params = read_json(os.path.join(directory, "params.json"))
+    if not params:
+        raise FileNotFoundError(f"No samples found in '{directory}'.")
+    samples = {'time': np.load(os.path.join(directory, "time.npy"))}
+    for state_component in params.get('output_state', params['model_params']['state']):
+        samples[state_component] = np.load(os.path.join(directory, f"{state_component}.npy"), mmap_mode=mmap_mode)
+    return samples
+
+
+def read_manifest_part(directory, part, output_state, mmap_mode='r'):
+    """
+    Read the samples of one part of a manifest. A part is either a directory, relative to the manifest directory,
+    or a list of parts concatenated along the path axis, e.g. shards or appended paths, or along the time axis, e.g.
+    a later horizon, if its axis is 'time'. The part '.' is the samples written to the manifest directory itself.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the manifest.
+    part : dict
+        Manifest part, with a directory or parts and optionally an axis.
+    output_state : list
+        Components of the samples.
+    mmap_mode : str
+        Memory-map mode used for sample columns.
+    """
+    import os
+    import numpy as np
+    if 'parts' not in part:
+        return read_samples(os.path.join(directory, part['directory']), mmap_mode=mmap_mode,
+                            use_manifest=part['directory'] != '.')
+    parts = [read_manifest_part(directory=directory, part=subpart, output_state=output_state, mmap_mode=mmap_mode)
+             for subpart in part['parts']]
+    axis = 1 if part.get('axis') == 'time' else 0
+    columns = {state_component: ConcatenatedColumn([part_samples[state_component] for part_samples in parts],
+                                                   axis=axis) for state_component in output_state}
+    time_values = np.concatenate([part_samples['time'] for part_samples in parts]) if axis else parts[0]['time']
+    return {'time': time_values} | columns
+
+
+def read_weights(directory, use_manifest=True):
+    """
+    Read the importance sampling likelihood ratio weights of each path with shape (paths,), or None if the samples
+    were not simulated with importance sampling.
+
+    Parameters
+    ----------
+    directory : str
+        Path to directory containing simulation data.
+    use_manifest : bool
+        Read through manifest.json if present. If False, only the weights written to directory itself are read.
+    """
+    import os
+    import numpy as np
+    manifest = read_json(os.path.join(directory, "manifest.json")) if use_manifest else {}
+    if manifest:
+        return read_manifest_weights(directory=directory, part=manifest)
+    if 'importance_shifts' not in read_json(os.path.join(directory, "params.json")):
+        return None
+    return np.load(os.path.join(directory, "weights.npy"))
+
+
+def read_manifest_weights(directory, part):
+    """
+    Read the likelihood ratio weights of one part of a manifest, or None if any of its paths were not simulated with
+    importance sampling. Parts along the time axis hold the same paths, whose weights are those of the first part.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the manifest.
+    part : dict
+        Manifest part, with a directory or parts and optionally an axis.
+    """
+    import os
+    import numpy as np
+    if 'parts' not in part:
+        return read_weights(os.path.join(directory, part['directory']), use_manifest=part['directory'] != '.')
+    if part.get('axis') == 'time':
+        return read_manifest_weights(directory=directory, part=part['parts'][0])
+    part_weights = [read_manifest_weights(directory=directory, part=subpart) for subpart in part['parts']]
+    return None if any(weights is None for weights in part_weights) else np.concatenate(part_weights)
+
+
+class ConcatenatedColumn:
+    """
+    Read-only sample column with shape (paths, time) formed by concatenating the columns of several parts, e.g.
+    memory-mapped shard outputs, along the path axis, or the time axis for later horizons, without copying. Indexing
+    reads only the parts holding the selected paths or times, and a slice within one part is returned as a view of
+    that part.
+    """
+    def __init__(self, parts, axis=0):
+        """
+        Parameters
+        ----------
+        parts : list
+            Arrays with shape (paths, time) and equal time dimension, or equal path dimension if axis is 1.
+        axis : int
+            Axis along which parts are concatenated, 0 for paths and 1 for time.
+        """
+        import numpy as np
+        self.parts = parts
+        self.axis = axis
+        self.offsets = np.cumsum([0] + [part.shape[axis] for part in parts])
+        self.shape = ((int(self.offsets[-1]),) + tuple(parts[0].shape[1:]) if axis == 0
+                      else (parts[0].shape[0], int(self.offsets[-1])))
+        self.ndim = len(self.shape)
+        self.dtype = parts[0].dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        if self.axis == 1:
+            for path_index in range(len(self)):
+                yield self[path_index]
+            return
+        for part in self.parts:
+            yield from part
+
+    def __array__(self, dtype=None, copy=None):
+        import numpy as np
+        return np.concatenate(self.parts, axis=self.axis).astype(dtype or self.dtype, copy=False)
+
+    def __getitem__(self, key):
+        import numpy as np
+        path_key, other_key = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+        if self.axis == 1:
+            return self.get_times(path_key=path_key, time_key=other_key[0] if other_key else slice(None))
+        if isinstance(path_key, (int, np.integer)):
+            path_index = path_key + len(self) if path_key < 0 else path_key
+            if not 0 <= path_index < len(self):
+                raise IndexError(f'Path index {path_key} out of range for {len(self)} paths.')
+            part_index = np.searchsorted(self.offsets, path_index, side='right') - 1
+            return self.parts[part_index][(path_index - self.offsets[part_index],) + other_key]
+        if isinstance(path_key, slice):
+            start, stop, step = path_key.indices(len(self))
+            if step == 1:
+                pieces = [part[(slice(max(start - offset, 0), max(stop - offset, 0)),) + other_key]
+                          for part, offset in zip(self.parts, self.offsets[:-1])
+                          if start < offset + len(part) and stop > offset]
+                if len(pieces) == 1:
+                    return pieces[0]
+                return np.concatenate(pieces) if pieces else self.parts[0][(slice(0, 0),) + other_key]
+            path_indices = np.arange(start, stop, step)
+        else:
+            path_indices = np.asarray(path_key)
+            if path_indices.dtype == bool:
+                path_indices = np.flatnonzero(path_indices)
+            path_indices = np.where(path_indices < 0, path_indices + len(self), path_indices)
+        # Gather paths part by part, then restore the requested order
+        part_indices = np.searchsorted(self.offsets, path_indices, side='right') - 1
+        order = np.argsort(part_indices, kind='stable')
+        pieces = [self.parts[part_index][(path_indices[part_indices == part_index] - self.offsets[part_index],)
+                                         + other_key] for part_index in np.unique(part_indices)]
+        if not pieces:
+            return self.parts[0][(path_indices,) + other_key]
+        gathered = np.concatenate(pieces)
+        samples = np.empty_like(gathered)
+        samples[order] = gathered
+        return samples
+
+    def get_times(self, path_key, time_key):
+        """
+        Index a column concatenated along the time axis, reading only the parts holding the selected times.
+
+        Parameters
+        ----------
+        path_key : int, slice or np.ndarray
+            Index of paths.
+        time_key : int, slice or np.ndarray
+            Index of times.
+        """
+        import numpy as np
+        if isinstance(time_key, (int, np.integer)):
+            time_index = time_key + self.shape[1] if time_key < 0 else time_key
+            if not 0 <= time_index < self.shape[1]:
+                raise IndexError(f'Time index {time_key} out of range for {self.shape[1]} times.')
+            part_index = np.searchsorted(self.offsets, time_index, side='right') - 1
+            return self.parts[part_index][path_key, time_index - self.offsets[part_index]]
+        if isinstance(time_key, slice) and time_key.indices(self.shape[1])[2] == 1:
+            start, stop, _ = time_key.indices(self.shape[1])
+            pieces = [part[path_key, max(start - offset, 0):max(stop - offset, 0)]
+                      for part, offset in zip(self.parts, self.offsets[:-1])
+                      if start < offset + part.shape[1] and stop > offset]
+            if len(pieces) == 1:
+                return pieces[0]
+            return np.concatenate(pieces, axis=-1) if pieces else self.parts[0][path_key, 0:0]
+        return np.concatenate([part[path_key] for part in self.parts], axis=-1)[..., time_key]
+
+
+def release_pages(column):
+    """
+    Unmap the pages of a flushed memory-mapped column from the process, so that resident memory does not grow with the
+    size of the output file. The data remains in the file and is paged back in if accessed.
+
+    Parameters
+    ----------
+    column : np.memmap
+        Flushed memory-mapped array.
+    """
+    import mmap
+    column_mmap = getattr(column, '_mmap', None)
+    if column_mmap is not None and hasattr(mmap, 'MADV_DONTNEED'):
+        column_mmap.madvise(mmap.MADV_DONTNEED)
+
+
+class BackgroundWriter:
+    """
+    Writes filled chunk buffers to memory-mapped sample columns on a background thread so that simulation of the next
+    chunk overlaps with flushing the previous one to disk. A fixed pool of buffers is recycled between the simulating
+    and writing threads through bounded queues, so no buffers are allocated after construction. An error raised while
+    writing is re-raised in the simulating thread on its next call.
+    """
+    def __init__(self, columns, buffer_shape, number_of_buffers=2, callback=None):
+        """
+        Parameters
+        ----------
+        columns : list
+            Memory-mapped arrays with shape (paths, time), one per state component.
+        buffer_shape : tuple
+            Shape (dim, chunk_size, time) of each chunk buffer.
+        number_of_buffers : int
+            Number of chunk buffers, two for double buffering.
+        callback : callable
+            Called on the writer thread with the checkpoint submitted with each buffer once it has been flushed.
+        """
+        import queue
+        import threading
+        import numpy as np
+        self.columns = columns
+        self.callback = callback
+        self.free_buffers = queue.Queue(maxsize=number_of_buffers)
+        self.filled_buffers = queue.Queue(maxsize=number_of_buffers)
+        for _ in range(number_of_buffers):
+            self.free_buffers.put(np.empty(buffer_shape))
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='BackgroundWriter', daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(raise_error=exc_type is None)
+
+    def run(self):
+        """
+        Writer thread loop. Writes and flushes each filled buffer then returns it to the pool.
+        """
+        while True:
+            item = self.filled_buffers.get()
+            if item is None:
+                break
+            buffer, start, stop, checkpoint = item
+            try:
+                if self.error is None:
+                    for component_index, column in enumerate(self.columns):
+                        column[start:stop] = buffer[component_index, :stop - start]
+                        column.flush()
+                        release_pages(column)
+                    if self.callback is not None and checkpoint is not None:
+                        self.callback(checkpoint)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.free_buffers.put(buffer)
+
+    def check(self):
+        """
+        Re-raise any error raised on the writer thread.
+        """
+        if self.error is not None:
+            raise RuntimeError(f'Background write failed: {self.error}') from self.error
+
+    def acquire(self):
+        """
+        Block until a free buffer is available and return it.
+        """
+        import queue
+        while True:
+            self.check()
+            try:
+                return self.free_buffers.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def submit(self, buffer, start, stop, checkpoint=None):
+        """
+        Queue a filled buffer holding paths start to stop for writing.
+
+        Parameters
+        ----------
+        buffer : np.ndarray
+            Filled chunk buffer obtained from acquire.
+        start : int
+            Index of first path in buffer.
+        stop : int
+            Index after last path in buffer.
+        checkpoint : dict
+            Passed to callback once the buffer has been flushed.
+        """
+        self.check()
+        self.filled_buffers.put((buffer, start, stop, checkpoint))
+
+    def close(self, raise_error=True):
+        """
+        Wait for queued buffers to be written and stop the writer thread.
+
+        Parameters
+        ----------
+        raise_error : bool
+            Re-raise any error raised on the writer thread.
+        """
+        self.filled_buffers.put(None)
+        self.thread.join()
+        if raise_error:
+            self.check()
@@ -0,0 +1,58 @@
+# Compiled path kernels by model, parameters and scheme, so that simulators of the same model share compilations
+PATH_KERNELS = {}
+
+
+def get_path_kernel(model, milstein=False):
+    """
+    Compile with numba a kernel advancing one-dimensional paths through a block of time steps of the Euler or Milstein
+    scheme. Drift, diffusion and the Milstein correction are fused into one scalar update inside a loop over paths run
+    in parallel with prange, so that no temporary arrays are formed per step. The loop order follows the memory layout
+    of the output: paths are advanced through all steps of the block in turn if the steps of each path are contiguous,
+    e.g. when writing to path samples, and all paths are advanced one step at a time otherwise. Returns None if numba
+    is not installed, in which case the NumPy scheme steps are used.
+
+    The kernel is called as kernel(state, increments, discretisation_interval, out), where state with shape (paths,) is
+    advanced in place, increments with shape (steps, paths) are the Brownian increments of the block and out with shape
+    (paths, steps) receives the state after each step.
+
+    Parameters
+    ----------
+    model : StochasticModel
+        One-dimensional model defining get_scalar_coefficients.
+    milstein : bool
+        Add the Milstein correction.
+    """
+    try:
+        import numba
+    except ImportError:
+        return None
+    key = (model.__class__.__name__, repr(sorted(model.model_params.items())), milstein)
+    if key in PATH_KERNELS:
+        return PATH_KERNELS[key]
+    drift, diffusion, diffusion_prime = (numba.njit(coefficient) for coefficient in model.get_scalar_coefficients())
+
+    @numba.njit
+    def advance(value, increment, discretisation_interval):
+        volatility = diffusion(value)
+        next_value = value + drift(value) * discretisation_interval + volatility * increment
+        if milstein:
+            next_value += 0.5 * volatility * diffusion_prime(value) * (increment * increment - discretisation_interval)
+        return next_value
+
+    @numba.njit(parallel=True)
+    def advance_paths(state, increments, discretisation_interval, out):
+        if out.strides[1] <= out.strides[0]:
+            for path in numba.prange(state.shape[0]):
+                value = state[path]
+                for step in range(increments.shape[0]):
+                    value = advance(value, increments[step, path], discretisation_interval)
+                    out[path, step] = value
+                state[path] = value
+        else:
+            for step in range(increments.shape[0]):
+                for path in numba.prange(state.shape[0]):
+                    state[path] = advance(state[path], increments[step, path], discretisation_interval)
+                    out[path, step] = state[path]
+
+    PATH_KERNELS[key] = advance_paths
+    return advance_paths
@@ -0,0 +1,131 @@
+from utils.build_utils import parse_memory_size, format_memory_size
+
+# Number of (dim, paths) arrays alive during a step: state, next state, Brownian increments, drift and temporaries
+STEP_ARRAYS = 8
+# Number of per-path arrays held by each payoff e.g. running averages, extrema and survival probabilities
+PAYOFF_ARRAYS = 4
+# Memory reserved for the interpreter and imported libraries
+RESERVED_MEMORY = 64 * 1024 ** 2
+# Memory additionally reserved for numba and the compilation of path kernels by the numba backend
+NUMBA_RESERVED_MEMORY = 160 * 1024 ** 2
+
+
+def estimate_memory(simulator, number_of_paths):
+    """
+    Estimate peak memory in bytes of simulating number_of_paths paths at once, broken down by use.
+
+    Parameters
+    ----------
+    simulator : Simulator
+        Configured simulator.
+    number_of_paths : int
+        Number of paths simulated at once.
+    """
+    scenarios = simulator.number_of_scenarios or 1
+    dim = simulator.dim
+    # Diffusion tensors formed by the scheme step, unless the model applies its diffusion coefficient directly
+    tensor_size = 0 if simulator.diffusion_dot is not None else 2 * dim ** simulator.diffusion_tensor_rank
+    estimate = {'step_workspace': 8 * scenarios * number_of_paths * (STEP_ARRAYS * dim + tensor_size)}
+    if simulator.path_kernel is not None:
+        # Blocks of Brownian increments and, unless the kernel writes to the samples in place, of states
+        block_arrays = dim + (0 if simulator.store_samples and simulator.payoff_engine is None else 1)
+        estimate['kernel_blocks'] = (8 * number_of_paths * block_arrays
+                                     * min(simulator.kernel_block_steps, simulator.discretisation_parameter - 1))
+    if simulator.history_arrays:
+        estimate['path_history'] = (8 * scenarios * number_of_paths * simulator.history_arrays
+                                    * simulator.discretisation_parameter)
+    if simulator.payoff_engine is not None:
+        estimate['payoffs'] = 8 * scenarios * number_of_paths * PAYOFF_ARRAYS * len(simulator.payoff_engine.payoffs)
+    samples = 8 * len(simulator.output_state) * scenarios * number_of_paths * simulator.discretisation_parameter
+    if simulator.store_samples and simulator.chunk_size:
+        estimate['write_buffers'] = simulator.write_buffers * samples
+    elif simulator.store_samples:
+        estimate['samples'] = samples
+    return estimate
+
+
+def get_reserved_memory(simulator):
+    """
+    Memory in bytes reserved for the interpreter, imported libraries and, for the numba backend, the compilation of
+    path kernels.
+
+    Parameters
+    ----------
+    simulator : Simulator
+        Configured simulator.
+    """
+    return RESERVED_MEMORY + (NUMBA_RESERVED_MEMORY if simulator.path_kernel is not None else 0)
+
+
+def plan_memory(simulator):
+    """
+    Choose the number of paths simulated at once so that peak memory fits in simulator.max_memory, and print the plan.
+    In-memory runs which do not fit are switched to chunked storage, unless write_samples is False, and chunk_size is
+    reduced if too large, to a multiple of number_of_strata for stratified sampling. The Brownian increments are drawn
+    per step for one chunk of paths, so the path chunk also bounds the random number blocks. Raises ValueError if
+    max_memory does not exceed the reserved memory or a single path, or one path per stratum, does not fit.
+
+    Parameters
+    ----------
+    simulator : Simulator
+        Configured simulator. chunk_size is updated in place.
+    """
+    reserved_memory = get_reserved_memory(simulator)
+    budget = parse_memory_size(simulator.max_memory) - reserved_memory
+    if budget <= 0:
+        raise ValueError(f'max_memory = {simulator.max_memory} does not exceed the '
+                         f'{format_memory_size(reserved_memory)} reserved for the interpreter and imported libraries. '
+                         f'Increase max_memory.')
+    number_of_paths = simulator.number_of_paths
+    if simulator.store_samples and not simulator.chunk_size:
+        if sum(estimate_memory(simulator, number_of_paths).values()) <= budget:
+            print_plan(simulator, budget + reserved_memory, number_of_paths)
+            return
+        if not simulator.write_samples:
+            raise ValueError(f'Samples held in memory with write_samples = False cannot fit in max_memory = '
+                             f'{simulator.max_memory}. Set write_samples = True to write chunked samples to disk, '
+                             f'or increase max_memory.')
+        simulator.chunk_size = number_of_paths  # Fall back to chunked storage
+    requested_chunk_size = simulator.chunk_size or number_of_paths
+    bytes_per_path = sum(estimate_memory(simulator, 1).values())
+    chunk_size = min(requested_chunk_size, budget // bytes_per_path)
+    # Stratified chunks must hold the same number of paths in each stratum
+    paths_per_batch = simulator.number_of_strata if simulator.sampling == 'stratified' else 1
+    chunk_size -= chunk_size % paths_per_batch
+    if chunk_size < 1:
+        paths_required = ('a single path requires' if paths_per_batch == 1
+                          else f'one path per stratum, {paths_per_batch} paths, requires')
+        raise ValueError(f'Simulation cannot fit in max_memory = {simulator.max_memory}: {paths_required} '
+                         f'{format_memory_size(paths_per_batch * bytes_per_path)}. Reduce discretisation_parameter, '
+                         f'set store_aggregates = True or store_samples = False, or increase max_memory.')
+    if chunk_size < number_of_paths or simulator.chunk_size:
+        simulator.chunk_size = int(chunk_size)
+    print_plan(simulator, budget + reserved_memory, simulator.chunk_size or number_of_paths)
+
+
+def print_plan(simulator, budget, chunk_size):
+    """
+    Print the memory plan of a simulation.
+
+    Parameters
+    ----------
+    simulator : Simulator
+        Configured simulator.
+    budget : int
+        Memory budget in bytes, including reserved memory.
+    chunk_size : int
+        Number of paths simulated at once.
+    """
+    estimate = estimate_memory(simulator, chunk_size)
+    reserved_memory = get_reserved_memory(simulator)
+    if not simulator.store_samples:
+        storage = 'payoffs only'
+    elif simulator.chunk_size:
+        storage = 'chunked sample columns'
+    else:
+        storage = 'in-memory samples'
+    number_of_chunks = -(-simulator.number_of_paths // chunk_size)
+    breakdown = ', '.join(f"{key.replace('_', ' ')} {format_memory_size(value)}" for key, value in estimate.items())
+    print(f'Memory plan ({storage}): {chunk_size} paths at a time in {number_of_chunks} chunk(s), estimated peak '
+          f'{format_memory_size(sum(estimate.values()) + reserved_memory)} of {format_memory_size(budget)} '
+          f'({breakdown}, reserved {format_memory_size(reserved_memory)}).')
@@ -0,0 +1,84 @@
+def lttb_downsample(x, y, number_of_points):
+    """
+    Downsample a curve with the Largest-Triangle-Three-Buckets algorithm (Steinarsson, 2013). The interior of the
+    curve is split into number_of_points - 2 buckets and from each bucket the point forming the largest triangle with
+    the previously selected point and the mean of the next bucket is kept, which preserves peaks and troughs that
+    uniform decimation would drop.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Monotonic x values.
+    y : np.ndarray
+        y values.
+    number_of_points : int
+        Number of points to keep, including both end points.
+    """
+    import numpy as np
+    x, y = np.asarray(x), np.asarray(y)
+    length = len(x)
+    if number_of_points >= length or number_of_points < 3:
+        return x, y
+    bucket_edges = np.linspace(1, length - 1, number_of_points - 1).astype(int)
+    indices = np.empty(number_of_points, dtype=int)
+    indices[0], indices[-1] = 0, length - 1
+    selected = 0
+    for bucket in range(number_of_points - 2):
+        start, stop = bucket_edges[bucket], bucket_edges[bucket + 1]
+        next_start, next_stop = stop, bucket_edges[bucket + 2] if bucket + 2 < len(bucket_edges) else length
+        next_x, next_y = x[next_start:next_stop].mean(), y[next_start:next_stop].mean()
+        areas = np.abs((x[selected] - next_x) * (y[start:stop] - y[selected])
+                       - (x[selected] - x[start:stop]) * (next_y - y[selected]))
+        selected = start + np.argmax(areas)
+        indices[bucket + 1] = selected
+    return x[indices], y[indices]
+
+
+def streaming_percentile_bands(column, time_indices, percentiles, pilot_rows, chunk_size=None, number_of_bins=1024):
+    """
+    Approximate percentiles across all paths at each of time_indices, reading the sample column one chunk of paths at
+    a time. A pilot set of paths fixes a histogram range per time index, the histograms are accumulated chunk by chunk
+    and percentiles are interpolated from their cumulative counts. Values outside the pilot range are collected in
+    overflow bins, so only percentiles in the extreme tails are clamped to the pilot range.
+
+    Parameters
+    ----------
+    column : np.ndarray
+        Samples with shape (paths, time), typically memory-mapped.
+    time_indices : np.ndarray
+        Time indices at which to compute percentiles.
+    percentiles : list
+        Percentiles in [0, 100].
+    pilot_rows : np.ndarray
+        Samples of a random subset of paths at time_indices with shape (pilot paths, len(time_indices)).
+    chunk_size : int
+        Number of paths read at once. Defaults to roughly 128MB of path data per chunk.
+    number_of_bins : int
+        Number of histogram bins per time index.
+    """
+    import numpy as np
+    number_of_paths, number_of_times = column.shape[0], len(time_indices)
+    if chunk_size is None:
+        chunk_size = max(1, 2 ** 27 // (8 * column.shape[1]))
+    lower, upper = np.percentile(pilot_rows, [0.1, 99.9], axis=0)
+    spread = np.maximum(upper - lower, 1e-12 * np.maximum(np.abs(upper), 1))
+    lower, upper = lower - 0.05 * spread, upper + 0.05 * spread
+    bin_width = (upper - lower) / number_of_bins
+    # Bin 0 and bin number_of_bins + 1 hold values below and above the pilot range
+    counts = np.zeros(number_of_times * (number_of_bins + 2), dtype=np.int64)
+    offsets = np.arange(number_of_times) * (number_of_bins + 2)
+    for start in range(0, number_of_paths, chunk_size):
+        chunk = np.asarray(column[start:start + chunk_size][:, time_indices])
+        bins = np.clip(np.floor((chunk - lower) / bin_width).astype(np.int64) + 1, 0, number_of_bins + 1)
+        counts += np.bincount((bins + offsets).ravel(), minlength=len(counts))
+    counts = counts.reshape(number_of_times, number_of_bins + 2)
+    cumulative_counts = np.cumsum(counts, axis=1)
+    bands = np.empty((len(percentiles), number_of_times))
+    for percentile_index, percentile in enumerate(percentiles):
+        target = percentile / 100 * number_of_paths
+        bin_index = np.clip(np.argmax(cumulative_counts >= target, axis=1), 1, number_of_bins)
+        rows = np.arange(number_of_times)
+        below = cumulative_counts[rows, bin_index - 1]
+        fraction = np.clip((target - below) / np.maximum(counts[rows, bin_index], 1), 0, 1)
+        bands[percentile_index] = lower + (bin_index - 1 + fraction) * bin_width
+    return bands
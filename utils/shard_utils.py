@@ -0,0 +1,122 @@
+import os
+from utils.cache_utils import NON_RESULT_PARAMS
+from utils.data_utils import read_json, write_json, remove_file
+from payoffs.payoff_engine import PayoffEngine
+
+# Parameters which may differ between shards of the same run
+SHARD_PARAMS = ['shard_index', 'shard_start', 'number_of_paths', 'chunk_size', 'rng_state'] + NON_RESULT_PARAMS
+
+
+def get_shard_range(number_of_paths, shard_count, shard_index):
+    """
+    First path and path after the last of a shard when number_of_paths paths are split as evenly as possible between
+    shard_count shards.
+
+    Parameters
+    ----------
+    number_of_paths : int
+        Total number of paths.
+    shard_count : int
+        Number of shards.
+    shard_index : int
+        Index of the shard.
+    """
+    return number_of_paths * shard_index // shard_count, number_of_paths * (shard_index + 1) // shard_count
+
+
+def read_shard_params(shard_directories):
+    """
+    Read and validate the params.json of the shards of one run, returned ordered by shard index. Raises ValueError if
+    shards are missing, incomplete, hold samples in samples.npy rather than memory-mapped columns or were simulated
+    with different configurations.
+
+    Parameters
+    ----------
+    shard_directories : list
+        Shard output directories.
+    """
+    shard_params = []
+    for shard_directory in shard_directories:
+        params = read_json(os.path.join(shard_directory, 'params.json'))
+        if not params:
+            raise FileNotFoundError(f"No simulation found in '{shard_directory}'.")
+        if 'shard_index' not in params:
+            raise ValueError(f"'{shard_directory}' is not a shard output. Set shard_index and shard_count in "
+                             f"simulation in config_file or run with run.py --shard.")
+        if os.path.exists(os.path.join(shard_directory, 'checkpoint.json')):
+            raise ValueError(f"Shard in '{shard_directory}' is incomplete. Complete it with run.py --resume before "
+                             f"merging.")
+        if params.get('store_samples', True) and os.path.exists(os.path.join(shard_directory, 'samples.npy')):
+            raise ValueError(f"Shard in '{shard_directory}' holds its samples in samples.npy, which cannot be read "
+                             f"without loading it into memory. Rerun the shard with chunk_size set in simulation in "
+                             f"config_file.")
+        shard_params.append((params['shard_index'], shard_directory, params))
+    shard_params.sort(key=lambda shard: shard[0])
+    shard_count = shard_params[0][2]['shard_count']
+    if [shard_index for shard_index, _, _ in shard_params] != list(range(shard_count)):
+        raise ValueError(f'Shards 0 to {shard_count - 1} are required exactly once. Provided: '
+                         f'{[shard_index for shard_index, _, _ in shard_params]}')
+    reference = {key: value for key, value in shard_params[0][2].items() if key not in SHARD_PARAMS}
+    for _, shard_directory, params in shard_params[1:]:
+        if {key: value for key, value in params.items() if key not in SHARD_PARAMS} != reference:
+            raise ValueError(f"Shard in '{shard_directory}' was simulated with a different configuration from shard "
+                             f"in '{shard_params[0][1]}'.")
+    return [(shard_directory, params) for _, shard_directory, params in shard_params]
+
+
+def merge_directory(directory, shard_directories):
+    """
+    Merge one output directory of the shards of a run. A manifest.json listing the shard sample directories, read as
+    one dataset by read_samples, is written instead of copying samples, payoff sums are added exactly and params.json
+    is written with the total number of paths. Returns the merged parameters.
+
+    Parameters
+    ----------
+    directory : str
+        Merged output directory.
+    shard_directories : list
+        Corresponding output directories of the shards.
+    """
+    shards = read_shard_params(shard_directories)
+    os.makedirs(directory, exist_ok=True)
+    params = {key: value for key, value in shards[0][1].items()
+              if key not in ['shard_index', 'shard_start', 'total_number_of_paths', 'rng_state']}
+    params['number_of_paths'] = sum(shard_params['number_of_paths'] for _, shard_params in shards)
+    if params['number_of_paths'] != shards[0][1]['total_number_of_paths']:
+        raise ValueError(f"Shards hold {params['number_of_paths']} paths. Expected: "
+                         f"{shards[0][1]['total_number_of_paths']}")
+    # Scenario runs hold samples and payoffs in their scenario subdirectories only
+    if 'scenario_params' not in params or 'scenario_index' in params:
+        if params.get('store_samples', True):
+            parts = [{'directory': os.path.relpath(shard_directory, directory),
+                      'shard_index': shard_params['shard_index'], 'start': shard_params['shard_start'],
+                      'number_of_paths': shard_params['number_of_paths']} for shard_directory, shard_params in shards]
+            remove_file(os.path.join(directory, 'samples.npy'))  # Stale samples would be read before the manifest
+            write_json(directory=directory, manifest={
+                'number_of_paths': params['number_of_paths'],
+                'output_state': params.get('output_state', params['model_params']['state']), 'parts': parts})
+        if 'payoffs' in params:
+            shard_results = [read_json(os.path.join(shard_directory, 'payoffs.json')) for shard_directory, _ in shards]
+            write_json(directory=directory, payoffs=PayoffEngine.merge_results(shard_results))
+    write_json(directory=directory, params=params)
+    return params
+
+
+def merge_shards(directory, shard_directories):
+    """
+    Merge the outputs of the shards of a run into one logical dataset in directory, including every scenario
+    subdirectory of scenario runs.
+
+    Parameters
+    ----------
+    directory : str
+        Merged output directory.
+    shard_directories : list
+        Output directories of all shards of the run.
+    """
+    params = merge_directory(directory=directory, shard_directories=shard_directories)
+    for scenario_index in range(params.get('number_of_scenarios') or 0):
+        merge_directory(directory=os.path.join(directory, f'scenario_{scenario_index}'),
+                        shard_directories=[os.path.join(shard_directory, f'scenario_{scenario_index}')
+                                           for shard_directory in shard_directories])
+    print(f"{len(shard_directories)} shards of {params['number_of_paths']} paths merged into {directory}.")
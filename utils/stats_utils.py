@@ -0,0 +1,173 @@
+import numpy as np
+
+
+def stratified_standard_error(values, number_of_strata):
+    """
+    Monte Carlo standard error of the mean of samples stratified with equal numbers of samples per stratum, sample j
+    in stratum j mod number_of_strata. The variance of the mean only reflects the variance within strata.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Samples with shape (samples,). The number of samples must be a multiple of number_of_strata.
+    number_of_strata : int
+        Number of strata.
+    """
+    stratum_values = np.reshape(values, (-1, number_of_strata))
+    return np.sqrt(np.mean(np.var(stratum_values, axis=0)) / len(values))
+
+
+class StreamingHistogram:
+    """
+    Fixed-size histogram accumulated over chunks of samples. The range is set by the first chunk, padded by 5% of its
+    spread on each side, and doubled, by merging adjacent pairs of bins, whenever a later chunk falls outside of it, so
+    no prior knowledge of the support is needed and memory is independent of the number of samples.
+    """
+    def __init__(self, number_of_bins=4096):
+        """
+        Parameters
+        ----------
+        number_of_bins : int
+            Number of bins. Must be even.
+        """
+        if number_of_bins % 2:
+            raise ValueError(f'number_of_bins must be even. Provided: {number_of_bins}')
+        self.number_of_bins = number_of_bins
+        self.counts = None
+        self.lower = None
+        self.bin_width = None
+        self.count = 0
+        self.sum = 0.0
+        self.sum_of_squares = 0.0
+
+    def update(self, values):
+        """
+        Add a chunk of samples.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Samples. Non-finite values are ignored.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        minimum, maximum = values.min(), values.max()
+        if self.counts is None:
+            spread = max(maximum - minimum, 1e-12 * max(abs(maximum), 1))
+            self.lower = minimum - 0.05 * spread
+            self.bin_width = 1.1 * spread / self.number_of_bins
+            self.counts = np.zeros(self.number_of_bins, dtype=np.int64)
+        while minimum < self.lower or maximum > self.lower + self.bin_width * self.number_of_bins:
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            empty = np.zeros(self.number_of_bins // 2, dtype=np.int64)
+            if minimum < self.lower:
+                self.counts = np.concatenate([empty, merged])
+                self.lower -= self.bin_width * self.number_of_bins
+            else:
+                self.counts = np.concatenate([merged, empty])
+            self.bin_width *= 2
+        bins = np.minimum(((values - self.lower) / self.bin_width).astype(np.int64), self.number_of_bins - 1)
+        self.counts += np.bincount(bins, minlength=self.number_of_bins)
+        self.count += len(values)
+        self.sum += values.sum()
+        self.sum_of_squares += np.dot(values, values)
+
+    @property
+    def edges(self):
+        return self.lower + self.bin_width * np.arange(self.number_of_bins + 1)
+
+    @property
+    def centres(self):
+        return self.lower + self.bin_width * (np.arange(self.number_of_bins) + 0.5)
+
+    @property
+    def std(self):
+        mean = self.sum / self.count
+        return np.sqrt(max(self.sum_of_squares / self.count - mean ** 2, 0))
+
+    def density(self):
+        """
+        Normalised histogram density.
+        """
+        return self.counts / (self.count * self.bin_width)
+
+    def kde(self, bandwidth=None):
+        """
+        Binned Gaussian kernel density estimate, obtained by convolving the bin counts with a discretised Gaussian
+        kernel. Evaluated at the bin centres.
+
+        Parameters
+        ----------
+        bandwidth : float
+            Kernel bandwidth. Defaults to Silverman's rule of thumb.
+        """
+        if bandwidth is None:
+            bandwidth = 1.06 * self.std * self.count ** -0.2
+        half_width = int(np.ceil(4 * bandwidth / self.bin_width))
+        if half_width == 0:
+            return self.density()
+        offsets = np.arange(-half_width, half_width + 1) * self.bin_width
+        kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+        kernel /= kernel.sum()
+        return np.convolve(self.counts, kernel, mode='same') / (self.count * self.bin_width)
+
+
+class StreamingQuantiles:
+    """
+    Approximate quantile sketch in the style of the merging t-digest (Dunning, 2019). Each chunk is merged with the
+    current centroids and adjacent points are grouped so that every centroid spans at most one unit of the arcsine
+    scale function k(q) = δ/(2π) asin(2q - 1), which keeps centroids small, and quantiles accurate, in the tails.
+    """
+    def __init__(self, compression=400):
+        """
+        Parameters
+        ----------
+        compression : float
+            Scale function parameter δ. The sketch holds roughly δ/2 centroids.
+        """
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def update(self, values):
+        """
+        Add a chunk of samples.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Samples. Non-finite values are ignored.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.minimum, self.maximum = min(self.minimum, values.min()), max(self.maximum, values.max())
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        cumulative_weights = np.cumsum(weights)
+        quantiles = (cumulative_weights - 0.5 * weights) / cumulative_weights[-1]
+        clusters = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * quantiles - 1)).astype(np.int64)
+        starts = np.flatnonzero(np.diff(clusters, prepend=clusters[0] - 1))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(weights * means, starts) / self.weights
+
+    def quantile(self, q):
+        """
+        Approximate quantiles.
+
+        Parameters
+        ----------
+        q : float or np.ndarray
+            Quantiles in [0, 1].
+        """
+        cumulative_weights = np.cumsum(self.weights)
+        centres = (cumulative_weights - 0.5 * self.weights) / cumulative_weights[-1]
+        return np.interp(q, np.concatenate([[0], centres, [1]]),
+                         np.concatenate([[self.minimum], self.means, [self.maximum]]))